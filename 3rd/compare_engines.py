@@ -0,0 +1,135 @@
+"""
+在同一批图片上对比两个引擎 (默认 rapid 和 rapid-int8) 的速度和识别结果。
+
+用法:
+    python 3rd/compare_engines.py                        # 用内置的固定合成图 (只看速度和结果一致性)
+    python 3rd/compare_engines.py D:/formulas -o cmp.json
+    python 3rd/compare_engines.py -l paths.txt --engines rapid rapid-int8 --threads 2
+
+准确率以第一个引擎 (FP32) 的输出为参考：统计完全一致的比例和平均字符编辑距离。
+低核数笔记本可以加 --threads 2 模拟。
+"""
+import argparse
+import dataclasses
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from batch import collect_paths  # noqa: E402
+from src.config import AppConfig  # noqa: E402
+from src.core.synthetic import synthetic_formula  # noqa: E402
+
+# 固定语料：没有给图片时使用，尺寸覆盖常见截图，种子固定保证每次一样
+SYNTHETIC_SIZES = [(40, 120), (48, 160), (64, 240), (80, 320), (96, 480), (120, 640), (160, 480), (200, 600)]
+
+
+def fixed_corpus(count):
+    for i in range(count):
+        h, w = SYNTHETIC_SIZES[i % len(SYNTHETIC_SIZES)]
+        yield f"synthetic-{i:03d}-{h}x{w}", synthetic_formula(h, w, seed=i)
+
+
+def file_corpus(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield path, f.read()
+
+
+def edit_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run_engine(engine_type, cfg, corpus, repeat):
+    from src.core.factory import create_engine
+
+    t0 = time.perf_counter()
+    engine = create_engine(engine_type, cfg)
+    load_ms = (time.perf_counter() - t0) * 1000
+    engine.warmup(cfg.WARMUP_SIZES, rounds=1, decode_steps=cfg.WARMUP_DECODE_STEPS)
+
+    outputs, latencies = {}, []
+    for name, image in corpus:
+        best = None
+        for _ in range(repeat):
+            t1 = time.perf_counter()
+            outputs[name] = engine.recognize(image)
+            ms = (time.perf_counter() - t1) * 1000
+            best = ms if best is None else min(best, ms)
+        latencies.append(best)
+    return outputs, {
+        "load_ms": round(load_ms, 1),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比引擎的速度和识别结果")
+    parser.add_argument("sources", nargs="*", help="图片目录、通配符或文件；不给则用固定合成语料")
+    parser.add_argument("-l", "--list", dest="list_files", action="append", default=[], help="路径列表文件")
+    parser.add_argument("--engines", nargs="+", default=["rapid", "rapid-int8"], help="第一个作为参考")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op 线程数，0 为自动")
+    parser.add_argument("--repeat", type=int, default=3, help="每张图跑几次取最快")
+    parser.add_argument("--synthetic", type=int, default=32, help="固定合成语料的图片数")
+    parser.add_argument("-o", "--output", help="把汇总和逐图结果写成 JSON")
+    args = parser.parse_args()
+
+    if args.sources or args.list_files:
+        corpus = list(file_corpus(collect_paths(args.sources, args.list_files)))
+    else:
+        corpus = list(fixed_corpus(args.synthetic))
+    if not corpus:
+        parser.error("没有找到图片")
+
+    cfg = AppConfig()
+    if args.threads:
+        from src.core.engines.ort_session import override_options
+        options = override_options(cfg.ORT_OPTIONS, intra_op_num_threads=args.threads, inter_op_num_threads=1)
+        cfg = dataclasses.replace(cfg, ORT_OPTIONS=options)
+
+    results = {}
+    for engine_type in args.engines:
+        print(f"⏳ {engine_type}: {len(corpus)} 张图...", file=sys.stderr)
+        results[engine_type] = run_engine(engine_type, cfg, corpus, args.repeat)
+
+    reference, (ref_outputs, ref_stats) = args.engines[0], results[args.engines[0]]
+    summary = {"corpus_size": len(corpus), "threads": args.threads, "reference": reference, "engines": {}}
+    print(f"\n{'引擎':<14}{'加载ms':>9}{'平均ms':>9}{'p50ms':>9}{'p95ms':>9}{'加速比':>8}{'一致率':>8}{'平均编辑距离':>12}")
+    for engine_type, (outputs, stats) in results.items():
+        distances = [edit_distance(ref_outputs[name], outputs[name]) for name, _ in corpus]
+        stats = dict(stats,
+                     speedup=round(ref_stats["mean_ms"] / stats["mean_ms"], 2),
+                     exact_match=round(sum(d == 0 for d in distances) / len(distances), 4),
+                     mean_edit_distance=round(statistics.mean(distances), 2))
+        summary["engines"][engine_type] = stats
+        print(f"{engine_type:<14}{stats['load_ms']:>9.0f}{stats['mean_ms']:>9.1f}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['speedup']:>7.2f}x{stats['exact_match']:>8.1%}"
+              f"{stats['mean_edit_distance']:>12.2f}")
+
+    if args.output:
+        summary["outputs"] = {name: {e: results[e][0][name] for e in args.engines} for name, _ in corpus}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n📝 已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
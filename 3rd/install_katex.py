@@ -0,0 +1,29 @@
+import requests
+from pathlib import Path
+
+# 目标路径: assets/templates (字体已经在 assets/templates/fonts 里，katex.min.css 正好按 fonts/ 相对路径引用)
+target_dir = Path(__file__).resolve().parent.parent / "assets" / "templates"
+
+# 结果窗口先用 KaTeX 排版 (比 MathJax 快得多)，KaTeX 不支持的写法才加载 MathJax；
+# 没有这两个文件时结果窗口全部用 MathJax，功能不受影响
+version = "0.16.11"
+files = {
+    "katex.min.js": f"https://unpkg.com/katex@{version}/dist/katex.min.js",
+    "katex.min.css": f"https://unpkg.com/katex@{version}/dist/katex.min.css",
+}
+
+print(f"正在下载 KaTeX {version} 到 {target_dir} ...")
+
+for name, url in files.items():
+    print(f"⬇️ 下载 {name}...")
+    try:
+        r = requests.get(url, timeout=60)
+        r.raise_for_status()
+        with open(target_dir / name, "wb") as f:
+            f.write(r.content)
+        print("✅ 完成")
+    except Exception as e:
+        print(f"❌ 失败: {e}")
+
+print("-" * 30)
+print("KaTeX 已就绪，重启程序后生效。")
@@ -0,0 +1,69 @@
+"""
+把 assets/models 里的 FP32 encoder / decoder 离线量化成 INT8，供 "rapid-int8" 引擎使用。
+
+用法:
+    pip install onnx
+    python 3rd/quantize_models.py
+    python 3rd/quantize_models.py --per-channel --force
+
+生成 encoder.int8.onnx、decoder.int8.onnx (和原模型放在同一目录)。
+量化方式是动态量化：权重离线转 INT8，激活值在推理时按批计算量化参数，不需要校准数据。
+量化完用 3rd/compare_engines.py 检查速度和识别结果的差异。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.config import AppConfig  # noqa: E402
+
+# 只量化 MatMul / Gemm (Transformer 的主要计算量)。
+# encoder 里 ResNet 部分的 Conv 量化后在 CPU 上走 ConvInteger，反而更慢，精度损失也更大
+DEFAULT_OP_TYPES = ["MatMul", "Gemm"]
+
+
+def quantize(src: Path, dst: Path, per_channel: bool, op_types: list):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    t0 = time.perf_counter()
+    quantize_dynamic(
+        model_input=str(src),
+        model_output=str(dst),
+        op_types_to_quantize=op_types,
+        per_channel=per_channel,
+        weight_type=QuantType.QInt8,
+    )
+    elapsed = time.perf_counter() - t0
+    src_mb = src.stat().st_size / 2 ** 20
+    dst_mb = dst.stat().st_size / 2 ** 20
+    print(f"✅ {src.name} -> {dst.name}: {src_mb:.1f}MB -> {dst_mb:.1f}MB ({elapsed:.1f}s)")
+
+
+def main():
+    from src.core.engines.rapid_engine import RapidEngine, RapidInt8Engine
+
+    parser = argparse.ArgumentParser(description="生成 rapid-int8 引擎用的动态量化模型")
+    parser.add_argument("--models-dir", type=Path, default=AppConfig().MODELS_DIR, help="模型目录")
+    parser.add_argument("--per-channel", action="store_true", help="按通道量化权重 (精度略好，模型略大)")
+    parser.add_argument("--op-types", nargs="+", default=DEFAULT_OP_TYPES, help="要量化的算子类型")
+    parser.add_argument("--force", action="store_true", help="已存在的量化模型也重新生成")
+    args = parser.parse_args()
+
+    for name in ("encoder", "decoder"):
+        src = args.models_dir / RapidEngine.MODEL_FILES[name]
+        dst = args.models_dir / RapidInt8Engine.MODEL_FILES[name]
+        if not src.is_file():
+            print(f"❌ 找不到 {src}，请先运行 python 3rd/get_models.py")
+            return 1
+        if dst.is_file() and not args.force:
+            print(f"⏭️ {dst.name} 已存在，跳过 (--force 重新生成)")
+            continue
+        quantize(src, dst, args.per_channel, args.op_types)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
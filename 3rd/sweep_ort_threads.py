@@ -0,0 +1,102 @@
+"""
+在本机上扫一遍 onnxruntime 线程配置，找出 image_resizer / encoder / decoder 各自最快的设置。
+
+用法:
+    python 3rd/sweep_ort_threads.py
+    python 3rd/sweep_ort_threads.py --intra 1 2 4 8 --inter 1 2 --repeat 5
+
+结果最后会打印一段可以直接填进 AppConfig.ORT_OPTIONS 的配置。
+"""
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.config import AppConfig  # noqa: E402
+from src.core.engines.ort_session import override_options  # noqa: E402
+from src.core.engines.rapid_engine import RapidEngine  # noqa: E402
+from src.core.synthetic import synthetic_formula  # noqa: E402
+
+MODELS = ("image_resizer", "encoder", "decoder")
+
+
+def default_intra():
+    cpus = os.cpu_count() or 1
+    counts = {1, cpus}
+    n = 2
+    while n < cpus:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def measure(engine, images, repeat, decode_steps):
+    """分别测 resizer、encoder 和 decoder 单步的中位耗时 (毫秒)"""
+    resize_ms, encode_ms, step_ms = [], [], []
+    for _ in range(repeat):
+        for img in images:
+            t0 = time.perf_counter()
+            x = engine._resize(img)
+            t1 = time.perf_counter()
+            context = engine._encode(x)
+            t2 = time.perf_counter()
+            engine._decode(context, max_steps=decode_steps, stop_at_eos=False)
+            t3 = time.perf_counter()
+            resize_ms.append((t1 - t0) * 1000)
+            encode_ms.append((t2 - t1) * 1000)
+            step_ms.append((t3 - t2) * 1000 / decode_steps)
+    return {
+        "image_resizer": statistics.median(resize_ms),
+        "encoder": statistics.median(encode_ms),
+        "decoder": statistics.median(step_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="onnxruntime 线程数调优")
+    parser.add_argument("--intra", type=int, nargs="+", default=default_intra(), help="intra_op_num_threads 候选")
+    parser.add_argument("--inter", type=int, nargs="+", default=[1], help="inter_op_num_threads 候选")
+    parser.add_argument("--repeat", type=int, default=3, help="每个配置重复次数")
+    parser.add_argument("--decode-steps", type=int, default=32, help="每张图解码器跑多少步")
+    args = parser.parse_args()
+
+    base_cfg = AppConfig()
+    images = [synthetic_formula(h, w, seed=i) for i, (h, w) in enumerate(base_cfg.WARMUP_SIZES)]
+
+    results = []
+    for inter in args.inter:
+        for intra in args.intra:
+            mode = "parallel" if inter > 1 else "sequential"
+            options = override_options(base_cfg.ORT_OPTIONS, intra_op_num_threads=intra,
+                                       inter_op_num_threads=inter, execution_mode=mode)
+            cfg = dataclasses.replace(base_cfg, ORT_OPTIONS=options)
+            engine = RapidEngine(cfg)
+            engine.warmup(cfg.WARMUP_SIZES, rounds=1, decode_steps=4)
+
+            timings = measure(engine, images, args.repeat, args.decode_steps)
+            results.append(((intra, inter, mode), timings))
+            print(f"intra={intra:<3} inter={inter:<2} {mode:<10} "
+                  f"resizer {timings['image_resizer']:7.2f}ms  encoder {timings['encoder']:7.2f}ms  "
+                  f"decoder/step {timings['decoder']:6.2f}ms")
+
+    # 每个模型单独挑最快的配置
+    best = {}
+    print("\n🏆 每个模型最快的配置:")
+    for model in MODELS:
+        (intra, inter, mode), timings = min(results, key=lambda item: item[1][model])
+        best[model] = {"intra_op_num_threads": intra, "inter_op_num_threads": inter, "execution_mode": mode}
+        print(f"  {model:<14} intra={intra} inter={inter} {mode}  ({timings[model]:.2f}ms)")
+
+    print("\n把下面的值合并进 AppConfig.ORT_OPTIONS:")
+    print(json.dumps(best, indent=4))
+
+
+if __name__ == "__main__":
+    main()
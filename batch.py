@@ -0,0 +1,239 @@
+"""
+TeXFE 批量识别入口 (无界面，不启动 Qt)
+
+用法示例:
+    python batch.py D:/scans                       # 识别整个目录 (递归)
+    python batch.py "D:/scans/**/*.png" -o out.jsonl
+    python batch.py -l paths.txt --unordered -j 4  # 从文件读取路径列表 ("-" 表示标准输入)
+
+每张图片输出一行 JSON: {"path", "latex", "timings", "error"}
+加 --detect 时先在整页图片里检测公式区域，每块区域输出一行，多一个 "box": [x, y, w, h]
+"""
+import argparse
+import dataclasses
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+from src.config import AppConfig
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff", ".gif"}
+
+# 每个子进程持有一个常驻的引擎 (模型只加载一次)
+_engine = None
+_preprocessor = None
+_detector = None
+_load_ms = 0.0
+_load_error = None
+
+
+def _init_worker(engine_type, threads, detect=False):
+    """子进程初始化：加载模型"""
+    global _engine, _preprocessor, _detector, _load_ms, _load_error
+    # 引擎的日志 print 改走 stderr，保证 stdout 上只有干净的 JSONL
+    sys.stdout = sys.stderr
+
+    t0 = time.perf_counter()
+    try:
+        from src.core.factory import create_engine
+        from src.core.engines.ort_session import override_options
+
+        # 多进程时限制每个进程的线程数，避免 N 个进程各开满核数的线程互相抢 CPU
+        cfg = AppConfig()
+        options = override_options(cfg.ORT_OPTIONS, intra_op_num_threads=threads, inter_op_num_threads=1)
+        _engine = create_engine(engine_type, dataclasses.replace(cfg, ORT_OPTIONS=options))
+        if cfg.PREPROCESS_ENABLED:
+            from src.core.preprocess import Preprocessor
+            _preprocessor = Preprocessor.from_config(cfg)
+        if detect:
+            from src.core.detection import RegionDetector
+            _detector = RegionDetector.from_config(cfg)
+    except Exception as e:
+        # 不能在 initializer 里抛异常，否则进程池会无限重启子进程
+        _load_error = f"模型加载失败: {e}"
+    _load_ms = (time.perf_counter() - t0) * 1000
+
+
+def _recognize_chunk(paths):
+    """在子进程里识别一组图片 (引擎按尺寸分组批量推理)，返回每张图的结果记录"""
+    records, images = [], []
+    for path in paths:
+        record = {"path": path, "latex": None, "timings": {}, "error": None}
+        path_records = [record]
+        t0 = time.perf_counter()
+        try:
+            if _load_error:
+                raise RuntimeError(_load_error)
+            with open(path, "rb") as f:
+                data = f.read()
+            if _detector is not None:
+                # 整页图片：每块区域一条记录，区域之间 (以及和别的图片的区域) 一起批量推理
+                path_records = _detect_regions(record, data)
+                images.extend((r, r.pop("_pixels")) for r in path_records if "_pixels" in r)
+            else:
+                if _preprocessor is not None:
+                    # 解码成灰度像素后裁空白、缩小，大照片不用整张送进引擎
+                    from src.core.image_utils import decode_gray
+                    data = _preprocessor(decode_gray(data))
+                images.append((record, data))
+        except Exception as e:
+            path_records = [record]
+            record["error"] = f"{type(e).__name__}: {e}"
+        read_ms = round((time.perf_counter() - t0) * 1000, 2)
+        for r in path_records:
+            r["timings"]["read_ms"] = read_ms
+        records.extend(path_records)
+
+    if images:
+        t1 = time.perf_counter()
+        try:
+            results = _engine.recognize_batch([img_bytes for _, img_bytes in images])
+        except Exception as e:
+            results = [f"识别核心错误: {type(e).__name__}: {e}"] * len(images)
+        infer_ms = round((time.perf_counter() - t1) * 1000, 2)
+
+        for (record, _), latex in zip(images, results):
+            # 同一批图片一起推理，infer_ms 是整批的耗时
+            record["timings"]["infer_ms"] = infer_ms
+            record["timings"]["batch_size"] = len(images)
+            # 和 InferenceWorker 一样的结果清洗
+            if not latex:
+                record["error"] = "未能识别出公式"
+            elif "错误" in latex:
+                record["error"] = latex
+            else:
+                record["latex"] = latex
+
+    for record in records:
+        timings = record["timings"]
+        timings["total_ms"] = round(timings["read_ms"] + timings.get("infer_ms", 0.0), 2)
+        timings["worker_pid"] = os.getpid()
+        timings["model_load_ms"] = round(_load_ms, 2)
+    return records
+
+
+def _detect_regions(record, data):
+    """整页图片：检测出的每块区域一条记录 (带 box)，像素先放在 "_pixels" 里；一块都没有时返回带错误的原记录"""
+    from src.core.detection import crop
+    from src.core.image_utils import decode_gray
+
+    gray = decode_gray(data, exif_transpose=True)
+    region_records = []
+    for region in _detector(gray):
+        pixels = crop(gray, region)
+        if _preprocessor is not None:
+            pixels = _preprocessor(pixels)
+        region_records.append({"path": record["path"], "box": list(region), "latex": None, "timings": {},
+                               "error": None, "_pixels": pixels})
+    if not region_records:
+        record["error"] = "未检测到公式区域"
+        return [record]
+    return region_records
+
+
+def _chunks(paths, size):
+    """把路径流切成每 size 个一组 (惰性)"""
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_dir(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if Path(name).suffix.lower() in IMAGE_EXTS:
+                yield os.path.join(root, name)
+
+
+def _iter_list(list_file):
+    stream = sys.stdin if list_file == "-" else open(list_file, "r", encoding="utf-8")
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def collect_paths(sources, list_files=()):
+    """
+    把目录 / 通配符 / 单个文件 / 路径列表文件展开成图片路径 (惰性生成，几万张也不占内存)
+    """
+    for src in sources:
+        if os.path.isdir(src):
+            yield from _iter_dir(src)
+        elif glob.has_magic(src):
+            for path in sorted(glob.iglob(src, recursive=True)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield src
+
+    for list_file in list_files:
+        yield from _iter_list(list_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TeXFE 批量公式识别 (输出 JSONL)")
+    parser.add_argument("sources", nargs="*", help="图片目录、通配符 (如 'scans/**/*.png') 或图片文件")
+    parser.add_argument("-l", "--list", dest="list_files", action="append", default=[],
+                        help="每行一个图片路径的列表文件，'-' 表示标准输入")
+    parser.add_argument("-o", "--output", default="-", help="输出 JSONL 文件，默认标准输出")
+    parser.add_argument("-j", "--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="工作进程数 (每个进程持有一份模型)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="每个进程的 onnxruntime 线程数，默认 CPU 核数 / 进程数")
+    parser.add_argument("--unordered", action="store_true", help="按完成顺序输出，而不是输入顺序")
+    parser.add_argument("--batch-size", type=int, default=AppConfig().BATCH_MAX_SIZE,
+                        help="每个进程一次取多少张图批量推理 (1 为逐张识别)")
+    parser.add_argument("--engine", default="rapid", help="引擎类型，传给 create_engine (rapid / rapid-int8)")
+    parser.add_argument("--detect", action="store_true",
+                        help="整页图片：先检测公式区域，每块区域输出一行 (带 box 坐标)")
+    args = parser.parse_args(argv)
+
+    if not args.sources and not args.list_files:
+        parser.error("至少需要一个图片来源")
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.jobs)
+    paths = collect_paths(args.sources, args.list_files)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    ok = failed = 0
+    t0 = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(args.engine, threads, args.detect)) as pool:
+            mapper = pool.imap_unordered if args.unordered else pool.imap
+            for records in mapper(_recognize_chunk, _chunks(paths, max(1, args.batch_size))):
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if record["error"]:
+                        failed += 1
+                    else:
+                        ok += 1
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    total = ok + failed
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 完成: {total} 张 (成功 {ok}, 失败 {failed})，耗时 {elapsed:.1f}s，{rate:.2f} 张/秒",
+          file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,23 +1,35 @@
 import sys
+
+from src.profiler import StartupProfiler
+
+# ✅ 尽早开始计时：python main.py --profile-startup 会打印各阶段耗时
+PROFILE_FLAG = "--profile-startup"
+profiler = StartupProfiler(
+    enabled=PROFILE_FLAG in sys.argv,
+    expected=("imports", "QApplication", "tray", "hotkeys", "WebEngine page load", "model load"),
+)
+profiler.begin("imports")
+
+# 这里只导入启动托盘必需的轻量模块；
+# QtWebEngine、onnxruntime、pyperclip、qrcode 等重模块都延迟到托盘出来之后再导入
 from PyQt6.QtWidgets import QApplication, QWidget
-from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread
+from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread, QTimer
 from PyQt6.QtGui import QCursor
 
 from src.config import AppConfig
-from src.core.worker import InferenceWorker
-from src.ui.result_window import ResultWindow
 from src.ui.tray import FoxTray
-from src.sources.screen_source import SnipperManager
-from src.sources.mobile_source import MobileSource
 from src.ui.hotkey import GlobalHotKey, MOD_ALT
-import pyperclip
+
+profiler.end("imports")
 
 
 # 信号桥
 class HotkeyBridge(QObject):
     trigger_snipper = pyqtSignal()
     trigger_mobile = pyqtSignal()
-    request_inference = pyqtSignal(bytes)
+    trigger_page = pyqtSignal()
+    trigger_history = pyqtSignal()
+    request_inference = pyqtSignal(int)  # 请求ID，图片本身放在 worker.scheduler 里
 
 
 # ✅ 创建一个上下文类，专门用来持有这些对象，防止被垃圾回收
@@ -26,84 +38,339 @@ class AppContext:
         self.cfg = AppConfig()
         self.bridge = HotkeyBridge()
 
+        # 下面这些都在 load_services() 里延迟创建
         # UI
-        self.result_window = ResultWindow()
+        self.result_window = None
 
         # Sources
-        self.screen_source = SnipperManager()
-        self.mobile_source = MobileSource(self.cfg)
+        self.screen_source = None
+        self.mobile_source = None
+
+        # 连拍 / 整屏识别 (第一次用到时才创建)
+        self.burst_pipeline = None
+        self.result_list = None
+        self.region_detector = None
+
+        # 识别历史 (SQLite)；pending_capture: 最新请求的 (请求ID, 截图, 来源)，出结果时连同缩略图一起存
+        # (只有最新的请求会被采用，被顶掉的旧请求不用留)
+        self.history = None
+        self.history_window = None
+        self.pending_capture = None
 
         # Thread & Worker
-        self.worker_thread = QThread()
-        self.worker = InferenceWorker(self.cfg)
-        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread = None
+        self.worker = None
+
+        # 分阶段耗时：还在路上的请求 (等 UI 渲染完再落盘) + 滚动日志
+        self.traces = {}
+        self.request_log = None
 
-        # Tray (要最后创建)
+        # Tray (最先创建，用户最先看到的就是它)
         self.tray = None
         self.hotkey_manager = None
+        self.hotkey_window = None
 
+    # --- 延迟加载 ---
 
-def main():
-    if hasattr(Qt, 'AA_EnableHighDpiScaling'):
-        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-
-    app = QApplication(sys.argv)
-    app.setQuitOnLastWindowClosed(False)
+    def start_worker(self):
+        """启动后台线程加载模型 (onnxruntime 也是在后台线程里才导入的)"""
+        if self.worker:
+            return
+        from src.core.worker import InferenceWorker
 
-    # ✅ 实例化上下文，所有对象都在这里面活着
-    ctx = AppContext()
+        profiler.begin("model load")
+        self.worker_thread = QThread()
+        self.worker = InferenceWorker(self.cfg)
+        self.worker.moveToThread(self.worker_thread)
 
-    # --- 1. 线程连线 ---
-    ctx.worker_thread.started.connect(ctx.worker.init_engine)
-    ctx.worker_thread.start()  # 启动线程
+        # 桥 -> 工人
+        self.bridge.request_inference.connect(self.worker.do_inference)
+
+        # 工人 -> UI
+        self.worker.traced.connect(self.on_traced)
+        self.worker.partial.connect(self.on_partial)
+        self.worker.finished.connect(self.on_success)
+        self.worker.error.connect(self.on_error)
+
+        # 打印初始化日志
+        self.worker.initialized.connect(self.on_initialized)
+
+        self.worker_thread.started.connect(self.worker.init_engine)
+        self.worker_thread.start()  # 启动线程
+
+    def load_services(self):
+        """托盘出来以后再创建的重对象；热键提前按下时也会同步调用一次，所以要可重入"""
+        if self.result_window:
+            return
+
+        self.start_worker()
+
+        if self.cfg.REQUEST_LOG_ENABLED:
+            from src.core.request_log import RequestLog
+            self.request_log = RequestLog(
+                self.cfg.DATA_DIR / "logs",
+                max_bytes=self.cfg.REQUEST_LOG_MAX_BYTES,
+                backup_count=self.cfg.REQUEST_LOG_BACKUPS,
+                context={"engine": self.cfg.ENGINE_TYPE},
+            )
+
+        if self.cfg.HISTORY_ENABLED:
+            import sqlite3
+            from src.core.history import HistoryStore
+            try:
+                self.history = HistoryStore(
+                    self.cfg.DATA_DIR / "history" / "history.sqlite3",
+                    max_entries=self.cfg.HISTORY_MAX_ENTRIES,
+                    max_thumbnails=self.cfg.HISTORY_MAX_THUMBNAILS,
+                    thumb_height=self.cfg.HISTORY_THUMB_HEIGHT,
+                )
+            except sqlite3.OperationalError as e:
+                # trigram 分词要 SQLite 3.34+；数据库文件坏了、目录没权限也会到这里。识别照常，只是不记历史
+                print(f"⚠️ [History] 识别历史不可用 (SQLite {sqlite3.sqlite_version}): {e}")
+
+        # 图片来源
+        from src.sources.screen_source import SnipperManager
+        from src.sources.mobile_source import MobileSource
+
+        self.screen_source = SnipperManager(self.cfg)
+        self.mobile_source = MobileSource(self.cfg)
+        self.screen_source.captured.connect(self.on_image_captured)
+        self.screen_source.page_captured.connect(self.on_page_captured)
+        self.mobile_source.captured.connect(self.on_image_captured)
+        self.mobile_source.burst_received.connect(self.on_burst_image)
+        self.mobile_source.burst_edited.connect(self.on_burst_edited)
+        if self.cfg.API_ENABLED:
+            from src.core.service import RecognitionService
+            self.mobile_source.enable_api(RecognitionService(
+                self.worker.submit_async,
+                max_concurrency=self.cfg.API_MAX_CONCURRENCY,
+                max_queue=self.cfg.API_MAX_QUEUE,
+                default_deadline_ms=self.cfg.API_DEADLINE_MS,
+                max_deadline_ms=self.cfg.API_MAX_DEADLINE_MS,
+            ), loopback_only=self.cfg.API_LOOPBACK_ONLY)
+
+        # 结果窗口 (导入 QtWebEngine + 加载 index.html，这是启动最重的一块)
+        profiler.begin("WebEngine page load")
+        from src.ui.result_window import ResultWindow
 
-    # --- 2. 业务连线 ---
+        self.result_window = ResultWindow()
+        self.result_window.webview.loadFinished.connect(lambda ok: profiler.end("WebEngine page load"))
+        self.result_window.rendered.connect(self.on_rendered)
+
+    def start_snipper(self):
+        self.load_services()
+        self.screen_source.start()
+
+    def start_mobile(self):
+        self.load_services()
+        self.mobile_source.start()
+
+    def start_page_scan(self):
+        self.load_services()
+        self.screen_source.grab_page()
+
+    def start_history(self):
+        self.load_services()
+        if self.history is None:
+            if self.tray:
+                self.tray.showMessage("TeXFE", "识别历史没有开启 (HISTORY_ENABLED)")
+            return
+        if self.history_window is None:
+            from src.ui.history_window import HistoryWindow
+            self.history_window = HistoryWindow(
+                self.history, page_size=self.cfg.HISTORY_PAGE_SIZE, thumb_height=self.cfg.HISTORY_THUMB_HEIGHT)
+        self.history_window.show()
+        self.history_window.raise_()
+        self.history_window.activateWindow()
+
+    # --- 业务连线 ---
 
     # 图片来源 -> 触发 Loading -> 触发推理
-    def on_image_captured(img_bytes):
-        print("⚡ [Main] 收到图片，显示 Loading 并请求后台...")
+    def on_image_captured(self, image, trace=None):
+        # 登记请求：如果上一个请求还没开始，会被这个新请求直接顶掉
+        request_id = self.worker.submit(image, trace)
+        if self.history:
+            self.pending_capture = (request_id, image, trace.source if trace else "unknown")
+        print(f"⚡ [Main] 收到图片 #{request_id}，显示 Loading 并请求后台...")
         # 立即显示原生 Loading
-        ctx.result_window.show_loading(QCursor.pos())
+        self.result_window.show_loading(QCursor.pos(), request_id)
         # 发送给后台
-        ctx.bridge.request_inference.emit(img_bytes)
-
-    ctx.screen_source.captured.connect(on_image_captured)
-    ctx.mobile_source.captured.connect(on_image_captured)
+        self.bridge.request_inference.emit(request_id)
+
+    # 连拍：照片进流水线 (解码 / 预处理 / 推理交错执行)，结果陆续出现在列表里，不经过 "最新优先" 调度
+    def on_burst_image(self, data):
+        item = self._ensure_burst().add(data)
+        print(f"📚 [Main] 连拍照片 #{item.id} 进入流水线")
+        self.result_list.add_item(item)
+
+    # 整屏识别：截图里检测出的每块区域都进流水线，一起凑批识别，结果带坐标
+    def on_page_captured(self, pixels, trace):
+        from src.core.detection import crop
+
+        if self.region_detector is None:
+            from src.core.detection import RegionDetector
+            self.region_detector = RegionDetector.from_config(self.cfg)
+        with trace.stage("detect"):
+            regions = self.region_detector(pixels)
+        trace.meta["regions"] = len(regions)
+        # 各块区域的识别耗时记在流水线里；这里记的是截屏 + 检测这一段
+        self.write_trace(trace, "ok" if regions else "empty", "整屏识别")
+        if not regions:
+            if self.tray:
+                self.tray.showMessage("TeXFE", "屏幕上没有找到公式")
+            return
+        # 各个区域作为一组送进推理：高度相近的补齐宽度后一次过 encoder / decoder
+        items = self._ensure_burst().add_many([(crop(pixels, region).copy(), tuple(region)) for region in regions])
+        for item in items:
+            self.result_list.add_item(item)
+
+    def _ensure_burst(self):
+        """连拍 / 整屏识别共用的流水线和结果列表，第一次用到时创建"""
+        if self.burst_pipeline is None:
+            from functools import partial
+            from src.core.image_utils import decode_gray
+            from src.core.pipeline import BurstPipeline
+            from src.ui.result_list import ResultListWindow
+
+            self.result_list = ResultListWindow()
+            self.result_list.edit_requested.connect(self.on_burst_edit_requested)
+            self.burst_pipeline = BurstPipeline(
+                decode=partial(decode_gray, exif_transpose=True),
+                prepare=self.worker.preprocessor,
+                infer=self.worker.infer_async,
+                on_update=self.result_list.item_updated.emit,
+                decode_workers=self.cfg.BURST_DECODE_WORKERS,
+                infer_many=self.worker.infer_many,
+            )
+            self.result_list.removed.connect(self.burst_pipeline.remove)
+            self.result_list.item_updated.connect(self.on_burst_updated)
+        return self.burst_pipeline
+
+    def on_burst_edit_requested(self, item_id):
+        item = self.burst_pipeline.items.get(item_id)
+        if item is None:
+            return
+        # 照片是 bytes，整屏识别裁出的区域是灰度像素数组，编辑器都能直接打开
+        self.mobile_source.edit_burst(item_id, item.data)
+
+    def on_burst_edited(self, item_id, pixels):
+        self.burst_pipeline.resubmit(item_id, pixels)
+
+    def on_burst_updated(self, item):
+        from src.core.pipeline import DONE
+        if self.history and item.status == DONE:
+            self.history.add(item.latex, "page" if item.box else "burst", item.pixels)
+
+    def on_partial(self, request_id, latex):
+        # 解码还没结束：先把已经识别出来的部分显示出来，用户不用干等整条公式
+        if self.worker.scheduler.is_latest(request_id):
+            self.result_window.show_partial(latex, request_id)
+
+    def on_success(self, request_id, latex):
+        # 过期结果 (用户已经又截了新图) 不要覆盖剪贴板和窗口
+        if not self.worker.scheduler.is_latest(request_id):
+            print(f"⏭️ [Main] 丢弃过期结果 #{request_id}")
+            self.finish_trace(request_id, "stale")
+            return
+        print(f"✅ [Main] 识别成功 #{request_id}: {latex[:15]}...")
+        import pyperclip
+        pyperclip.copy(latex)
+        self.result_window.set_content(latex, request_id)
+        if self.pending_capture and self.pending_capture[0] == request_id:
+            _, image, source = self.pending_capture
+            self.pending_capture = None
+            self.history.add(latex, source, image)
+
+    def on_error(self, request_id, err_msg):
+        if not self.worker.scheduler.is_latest(request_id):
+            self.finish_trace(request_id, "stale")
+            return
+        print(f"❌ [Main] 识别出错 #{request_id}: {err_msg}")
+        self.result_window.show_error(err_msg, request_id)
+        self.finish_trace(request_id, "error")
+
+    # --- 分阶段耗时 ---
+
+    def on_traced(self, request_id, trace):
+        self.traces[request_id] = trace
+
+    def on_rendered(self, request_id, render_ms):
+        trace = self.traces.get(request_id)
+        if trace is not None and render_ms >= 0:
+            trace.add("ui_render", render_ms)
+        self.finish_trace(request_id, "ok")
+
+    def finish_trace(self, request_id, status):
+        """请求走完 (显示出来 / 出错 / 过期)：写日志，按配置在结果窗口显示耗时"""
+        trace = self.traces.pop(request_id, None)
+        if trace is None:
+            return
+        self.write_trace(trace, status, f"#{request_id}")
+        if self.cfg.SHOW_TIMINGS and status != "stale":
+            self.result_window.show_timings(trace.summary(), request_id)
+
+    def write_trace(self, trace, status, label):
+        trace.finish(status)
+        print(f"⏱️ [Main] {label} {status} {trace}")
+        if self.request_log:
+            self.request_log.write(trace.as_record())
+
+    def on_initialized(self, ok, msg):
+        profiler.end("model load")
+        print(f"🔧 [Worker] 初始化状态: {ok} | {msg}")
+
+    def shutdown(self):
+        if self.burst_pipeline:
+            self.burst_pipeline.close()
+        if self.worker_thread:
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+            self.worker.close()
+        if self.history:
+            self.history.close()
+        if self.request_log:
+            self.request_log.close()
 
-    # 桥 -> 工人
-    ctx.bridge.request_inference.connect(ctx.worker.do_inference)
 
-    # 工人 -> UI
-    def on_success(latex):
-        print(f"✅ [Main] 识别成功: {latex[:15]}...")
-        pyperclip.copy(latex)
-        ctx.result_window.set_content(latex)
+def main():
+    if PROFILE_FLAG in sys.argv:
+        sys.argv.remove(PROFILE_FLAG)
 
-    def on_error(err_msg):
-        print(f"❌ [Main] 识别出错: {err_msg}")
-        ctx.result_window.show_error(err_msg)
+    if hasattr(Qt, 'AA_EnableHighDpiScaling'):
+        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    # QtWebEngine 延迟导入的前提：必须在创建 QApplication 之前设置
+    QApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts, True)
 
-    ctx.worker.finished.connect(on_success)
-    ctx.worker.error.connect(on_error)
+    profiler.begin("QApplication")
+    app = QApplication(sys.argv)
+    app.setQuitOnLastWindowClosed(False)
+    profiler.end("QApplication")
 
-    # 打印初始化日志
-    ctx.worker.initialized.connect(lambda ok, msg: print(f"🔧 [Worker] 初始化状态: {ok} | {msg}"))
+    # ✅ 实例化上下文，所有对象都在这里面活着
+    ctx = AppContext()
 
-    # --- 3. 触发源控制 ---
-    ctx.bridge.trigger_snipper.connect(ctx.screen_source.start)
-    ctx.bridge.trigger_mobile.connect(ctx.mobile_source.start)
+    # --- 1. 触发源控制 ---
+    ctx.bridge.trigger_snipper.connect(ctx.start_snipper)
+    ctx.bridge.trigger_mobile.connect(ctx.start_mobile)
+    ctx.bridge.trigger_page.connect(ctx.start_page_scan)
+    ctx.bridge.trigger_history.connect(ctx.start_history)
 
-    # --- 4. 托盘 ---
+    # --- 2. 托盘 ---
+    profiler.begin("tray")
     ctx.tray = FoxTray(
         on_capture=lambda: ctx.bridge.trigger_snipper.emit(),
-        on_mobile=lambda: ctx.bridge.trigger_mobile.emit()
+        on_mobile=lambda: ctx.bridge.trigger_mobile.emit(),
+        on_page=lambda: ctx.bridge.trigger_page.emit(),
+        on_history=lambda: ctx.bridge.trigger_history.emit()
     )
+    profiler.end("tray")
 
-    # --- 5. 热键 ---
+    # --- 3. 热键 ---
+    profiler.begin("hotkeys")
     try:
         ctx.hotkey_manager = GlobalHotKey(app)
-        dummy = QWidget()
-        hwnd = dummy.winId()
+        ctx.hotkey_window = QWidget()
+        hwnd = ctx.hotkey_window.winId()
         ctx.hotkey_manager.register(hwnd, MOD_ALT, ord('Q'))
         ctx.hotkey_manager.register(hwnd, MOD_ALT, ord('M'))
 
@@ -116,7 +383,7 @@ def main():
         ctx.hotkey_manager.activated.connect(handle_hotkey)
     except Exception as e:
         print(f"❌ 热键失败: {e}")
-
+    profiler.end("hotkeys")
 
     if ctx.tray:
         ctx.tray.showMessage(
@@ -125,14 +392,15 @@ def main():
         )
     print("🚀 程序已启动，请尝试截图...")
 
+    # --- 4. 事件循环跑起来之后，再加载模型、结果窗口等重模块 ---
+    QTimer.singleShot(0, ctx.load_services)
 
     exit_code = app.exec()
 
     # 退出清理
-    ctx.worker_thread.quit()
-    ctx.worker_thread.wait()
+    ctx.shutdown()
     sys.exit(exit_code)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
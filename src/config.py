@@ -1,5 +1,7 @@
 from dataclasses import dataclass, field
 from pathlib import Path
+import copy
+import os
 import sys
 
 
@@ -10,6 +12,35 @@ def get_base_path():
         return Path(__file__).resolve().parents[1]
 
 
+def get_data_path():
+    """用户数据目录 (缓存、日志等可写文件都放这里，打包后 assets 是只读的)"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Application Support"
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(base) / "TeXFE"
+
+
+def default_ort_options():
+    """
+    每个模型一份 onnxruntime 会话配置 (含义见 src/core/engines/ort_session.py)。
+    默认值和 rapid_latex_ocr 自带的一致；可以用 3rd/sweep_ort_threads.py 在本机找最快的线程数。
+    """
+    base = {
+        "intra_op_num_threads": 0,  # 0 = onnxruntime 自动 (通常是物理核数)
+        "inter_op_num_threads": 0,
+        "graph_optimization_level": "all",  # disable / basic / extended / all
+        "execution_mode": "sequential",  # sequential / parallel
+        "enable_cpu_mem_arena": False,
+        "enable_mem_pattern": True,
+        "allow_spinning": True,
+        "providers": [["CPUExecutionProvider", {"arena_extend_strategy": "kSameAsRequested"}]],
+    }
+    return {name: copy.deepcopy(base) for name in ("image_resizer", "encoder", "decoder")}
+
+
 @dataclass(frozen=True)
 class AppConfig:
     # 路径配置
@@ -17,12 +48,122 @@ class AppConfig:
     ASSETS_DIR: Path = ROOT_DIR / "assets"
     MODELS_DIR: Path = ASSETS_DIR / "models"
     TEMPLATES_DIR: Path = ASSETS_DIR / "templates"
+    DATA_DIR: Path = get_data_path()
 
     # ✅ 【补上了这一行】 热键配置
     # 格式参考 keyboard 库： "alt+q", "ctrl+shift+a" 等
     HOTKEY_SNIP: str = "alt+q"
     HOTKEY_MOBILE = "alt+m"
 
+    # 识别结果缓存：相同截图直接返回结果，不再跑模型
+    CACHE_ENABLED: bool = True
+    CACHE_MEMORY_ENTRIES: int = 256  # 内存 LRU 条数
+    CACHE_DISK_ENTRIES: int = 20000  # 磁盘 (SQLite) 最多保留条数
+    CACHE_MAX_AGE_DAYS: int = 30  # 超过这个天数没用过的条目会被清理
+    # 感知哈希：近似相同的截图也算命中 (可能把相似公式认错，默认关闭)
+    CACHE_PERCEPTUAL: bool = False
+    CACHE_PHASH_DISTANCE: int = 3  # 允许的最大汉明距离
+
+    # 识别前预处理 (src/core/preprocess.py)，在缓存查找之前做，裁掉的空白不会影响缓存命中
+    # 可用步骤: grayscale / trim (裁空白) / downscale (大图、HiDPI 截图缩小) / normalize (对比度拉伸) / binarize (二值化)
+    PREPROCESS_ENABLED: bool = True
+    PREPROCESS_STEPS: tuple = ("grayscale", "trim", "downscale", "normalize")
+    PREPROCESS_MAX_DIMS: tuple = (672, 192)  # (宽, 高)，和 RapidEngine.MAX_DIMS 一致；缩小后不会小于它
+    PREPROCESS_TRIM_MARGIN: int = 8  # 裁剪时在笔迹外保留的像素
+    PREPROCESS_DPR_DOWNSCALE: bool = True  # HiDPI 屏幕 (缩放 200% 以上) 的截图按 devicePixelRatio 缩小
+
+    # 手机上传：页面先在手机上缩小并重新编码再上传 (GET /upload-config 下发这些参数)
+    # 长边留得比模型输入大，因为用户还要在电脑上框选公式所在的一小块
+    UPLOAD_MAX_SIDE: int = 2048
+    UPLOAD_QUALITY: float = 0.85
+    UPLOAD_FORMATS: tuple = ("image/webp", "image/jpeg")  # 按优先级，浏览器编码不了的格式会跳过
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024  # 超过的上传请求直接返回 413
+    # 多行公式 (align 等) 按行切开，各行按原尺寸一起识别，再拼成 aligned / gathered 环境
+    SEGMENT_ENABLED: bool = True
+    SEGMENT_LINE_GAP: float = 0.2  # 行间空白至少要有 典型行高 x 这个比例 才切开 (比整屏检测保守)
+    SEGMENT_MAX_ROWS: int = 16  # 切出来的行比这多就不切了 (多半不是公式)
+
+    # 整屏识别 (托盘菜单 / batch.py --detect)：用投影直方图找出一块块公式，批量识别，结果带坐标
+    DETECT_INK_DELTA: int = 48  # 和背景灰度相差多少算笔迹
+    DETECT_LINE_GAP: float = 0.35  # 上下间隔小于 典型行高 x 这个比例 的行合成一块
+    DETECT_COLUMN_GAP: float = 1.0  # 同一行里左右间隔超过 行高 x 这个比例 就切开
+    DETECT_MIN_SIZE: int = 10  # 比这小的块当作噪点
+    DETECT_MARGIN: int = 6  # 裁剪时四周多留的像素
+
+    # 连拍上传 (页面上的 "连拍多张")：照片不弹编辑器，直接 解码 -> 预处理 -> 推理 流水线识别
+    BURST_DECODE_WORKERS: int = 2  # 解码照片的线程数
+
+    # 识别历史：每个结果都存进 DATA_DIR/history/history.sqlite3，托盘 "识别历史" 里可以搜索、重新复制
+    HISTORY_ENABLED: bool = True
+    HISTORY_MAX_ENTRIES: int = 200000  # 超过后删最旧的
+    HISTORY_MAX_THUMBNAILS: int = 5000  # 只给最近这么多条留缩略图 (每张压缩后几 KB)
+    HISTORY_THUMB_HEIGHT: int = 40
+    HISTORY_PAGE_SIZE: int = 50  # 历史窗口每次加载的条数
+
+    # 本机识别接口：POST http://127.0.0.1:8989/api/recognize (请求体是图片原始字节，返回 JSON)
+    # 开启后启动时就会打开手机上传用的服务器，共用已经预热的引擎；默认只接受本机的请求
+    API_ENABLED: bool = False
+    API_LOOPBACK_ONLY: bool = True
+    API_MAX_CONCURRENCY: int = 4  # 同时送进引擎的请求数 (会一起凑批)
+    API_MAX_QUEUE: int = 16  # 再多的请求最多排这么多个，排满返回 429
+    API_DEADLINE_MS: float = 10000.0  # 默认截止时间，超时返回 504；请求可以用 X-Deadline-Ms 头改短
+    API_MAX_DEADLINE_MS: float = 60000.0
+
+    # 推理引擎：rapid (FP32 原版) / rapid-int8 (动态量化，低核数笔记本上更快，先运行 3rd/quantize_models.py 生成模型)
+    ENGINE_TYPE: str = "rapid"
+
+    # 批量推理：多张图 (连拍、页面分块、批处理) 时按尺寸分组，补齐后一起过 encoder / decoder
+    BATCH_MAX_SIZE: int = 8  # 每批最多几张
+    BATCH_MAX_WAIT_MS: float = 5.0  # 请求成串到来时最多等多久凑批 (单张请求不等待)
+    BATCH_PAD_TOLERANCE: int = 64  # 同一批图片的高度最多相差多少像素
+    # 宽度最多相差多少像素；默认是 encoder 输入的最大宽度，即只按高度分组、宽度右侧补白
+    # (多行公式的各行、整屏的各个区域高度接近、宽度差得多，按宽度分组就几乎凑不成批)
+    BATCH_WIDTH_TOLERANCE: int = 672
+    BATCH_WORKERS: int = 4  # 一批里各张图的解码、缩放 (image_resizer) 并行跑的线程数；模型没有动态 batch 维时各张图也并行推理
+
+    # 解码策略：greedy (贪心，和 LaTeXOCR 结果一致) / beam (小 beam 搜索，更稳但更慢，只用于单张图)
+    DECODE_STRATEGY: str = "greedy"
+    DECODE_BEAM_SIZE: int = 3
+    DECODE_LENGTH_PENALTY: float = 0.6  # beam 得分按 长度^系数 归一化，越大越偏向长结果
+    # token 上限按图片尺寸估算：DECODE_MIN_TOKENS + 每 32x32 格子 DECODE_TOKENS_PER_CELL 个 (不超过 512)
+    # 达到上限或检测到循环而截断的结果不写进识别缓存
+    DECODE_MIN_TOKENS: int = 48
+    DECODE_TOKENS_PER_CELL: int = 8
+    DECODE_LOOP_DETECTION: bool = True  # 检测到重复 token 循环时提前结束 (噪点多的照片容易出现)
+
+    # 缩放比例估算：按笔画粗细直接算出缩放比例，估得准时跳过 image_resizer (它可能要来回跑好几次)
+    # 比例靠运行中 image_resizer 的结果标定：至少 SCALE_ESTIMATE_MIN_SAMPLES 次、结果足够一致才开始估算
+    SCALE_ESTIMATE_ENABLED: bool = True
+    SCALE_ESTIMATE_MIN_SAMPLES: int = 4
+    SCALE_ESTIMATE_MAX_SPREAD: float = 0.12  # 标定样本 (缩放后笔画粗细的对数) 的标准差上限
+    SCALE_ESTIMATE_AUDIT_EVERY: int = 25  # 每估算多少次抽查一次 image_resizer，0 为不抽查
+
+    # onnxruntime 会话配置 (按模型区分: image_resizer / encoder / decoder)
+    ORT_OPTIONS: dict = field(default_factory=default_ort_options)
+    # 优化后模型缓存：第一次启动时保存图优化后的模型，以后直接加载 (键: 模型哈希 + onnxruntime 版本)
+    MODEL_CACHE_ENABLED: bool = True
+    MODEL_CACHE_DIR: Path = DATA_DIR / "model_cache"
+    MODEL_CACHE_FORMAT: str = "ort"  # ort / onnx
+
+    # 模型预热：加载完后先用合成公式图跑几遍，让 onnxruntime 提前分配内存、选好算子
+    WARMUP_ENABLED: bool = True
+    WARMUP_SIZES: tuple = ((48, 160), (80, 320), (120, 640))  # (高, 宽)，覆盖常见截图尺寸
+    WARMUP_ROUNDS: int = 2  # 每个尺寸跑几遍
+    WARMUP_DECODE_STEPS: int = 16  # 解码器只跑这么多步，避免预热本身太久
+
+    # 每个请求的分阶段耗时：写入 DATA_DIR/logs/requests.jsonl (滚动日志)，可选在结果窗口里显示
+    REQUEST_LOG_ENABLED: bool = True
+    REQUEST_LOG_MAX_BYTES: int = 2 * 1024 * 1024
+    REQUEST_LOG_BACKUPS: int = 5
+    SHOW_TIMINGS: bool = False
+
+    # 流式显示：解码过程中把已经识别出的部分 LaTeX 推给结果窗口，最多每 STREAM_PARTIAL_INTERVAL_MS 刷新一次
+    STREAM_PARTIAL_ENABLED: bool = True
+    STREAM_PARTIAL_INTERVAL_MS: float = 80.0
+
+    # 调试：把每次截图保存到 DATA_DIR/debug (在后台线程写盘，不影响识别速度)
+    DEBUG_DUMP_CAPTURES: bool = False
+
 
 '''
     # 模型路径字典
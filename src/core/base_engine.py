@@ -2,6 +2,10 @@ from abc import ABC, abstractmethod
 from pathlib import Path
 
 
+class EngineNotReady(RuntimeError):
+    """引擎还没加载好 (或已经关闭)，请求没有送进引擎"""
+
+
 # 这是一个抽象类，它不干活，只定规矩
 class BaseEngine(ABC):
 
@@ -10,7 +14,35 @@ class BaseEngine(ABC):
         """加载模型"""
         pass
 
+    def warmup(self, sizes, rounds=1, decode_steps=16):
+        """
+        可选：加载后预热模型，返回 {"cold_ms", "warm_ms", "total_ms"}；不支持的引擎返回 None
+        """
+        return None
+
     @abstractmethod
-    def recognize(self, image_data) -> str:
-        """核心推理接口"""
+    def recognize(self, image_data, timings=None, on_tokens=None) -> str:
+        """
+        核心推理接口
+        image_data: 灰度 numpy 数组 (H, W) uint8 (首选，零拷贝)，或 PNG/JPEG 等编码后的 bytes (兜底)
+        timings: 可选的 StageTimings，引擎把各阶段耗时记在里面
+        on_tokens: 可选的流式回调，每解码出一个 token 用当前 token 序列调用一次 (配合 tokens_to_latex 使用)
+        """
         pass
+
+    def model_digest(self) -> str:
+        """模型文件的内容哈希，识别缓存按它区分新旧模型的结果；没有模型文件的引擎返回空字符串"""
+        return ""
+
+    def tokens_to_latex(self, tokens) -> str:
+        """把流式回调拿到的 token 序列转成 LaTeX；不支持流式的引擎返回空字符串 (不显示部分结果)"""
+        return ""
+
+    def recognize_batch(self, images, timings=None) -> list:
+        """
+        一次识别多张图片，返回和 images 一一对应的结果列表。
+        timings: 可选的 StageTimings 列表 (和 images 等长)
+        默认逐张调用 recognize；支持批量推理的引擎可以覆盖它
+        """
+        timings = timings or [None] * len(images)
+        return [self.recognize(image, t) for image, t in zip(images, timings)]
@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def group_by_shape(shapes, max_batch_size, tolerance=0, width_tolerance=None):
+    """
+    把尺寸相近的图片分成若干批，返回下标列表的列表。
+    shapes: [(H, W), ...]；同一批里 H 的最大值和最小值之差不超过 tolerance (像素)，
+    W 之差不超过 width_tolerance (None 表示和 tolerance 一样)，
+    这样补齐到同一尺寸时多出来的空白有限，不会明显影响识别结果。
+    """
+    if width_tolerance is None:
+        width_tolerance = tolerance
+    order = sorted(range(len(shapes)), key=lambda i: (shapes[i][0], shapes[i][1]))
+    groups = []
+    for i in order:
+        h, w = shapes[i]
+        for group in groups:
+            if len(group["items"]) >= max_batch_size:
+                continue
+            if (max(group["max_h"], h) - min(group["min_h"], h) <= tolerance
+                    and max(group["max_w"], w) - min(group["min_w"], w) <= width_tolerance):
+                group["items"].append(i)
+                group["min_h"], group["max_h"] = min(group["min_h"], h), max(group["max_h"], h)
+                group["min_w"], group["max_w"] = min(group["min_w"], w), max(group["max_w"], w)
+                break
+        else:
+            groups.append({"items": [i], "min_h": h, "max_h": h, "min_w": w, "max_w": w})
+    return [group["items"] for group in groups]
+
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    把陆续到来的单张识别请求攒成一批，交给 run_batch(items) -> results 一起跑。
+    只有在请求成串到来 (连拍、页面分块、批处理) 时才会等待凑批，最多等 max_wait_ms；
+    队列里只有一个请求时立刻执行，交互式的单次截图不会多等。
+    submit_many 提交的一组请求 (多行公式的各行、整屏识别的各个区域) 保证进同一批，
+    这一组本身可以超过 max_batch_size，怎么拆由 run_batch 决定。
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, name="MicroBatcher"):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items) -> list:
+        """一次提交一组请求，返回对应的 Future 列表；这一组不会被拆到不同批里"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher 已关闭")
+        entry = [(item, Future()) for item in items]
+        if entry:
+            self._queue.put(entry)
+        return [future for _, future in entry]
+
+    def map(self, items, timeout=None):
+        """提交一组请求并按顺序等待全部结果"""
+        futures = self.submit_many(items)
+        return [future.result(timeout) for future in futures]
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self, first):
+        # 队列里每一项是一组 (item, Future)：submit 是一个，submit_many 是一整组
+        batch = list(first)
+        # 先把已经排着的请求拿完
+        while len(batch) < self.max_batch_size:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.extend(entry)
+
+        # 只有一次提交 (一个请求，或者本来就一起到的一组)：说明没有成串的请求，不等了
+        if len(batch) == len(first):
+            return batch, False
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.extend(entry)
+        return batch, False
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stop = self._collect(first)
+
+            items = [item for item, _ in batch]
+            try:
+                results = self._run_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
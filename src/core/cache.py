@@ -0,0 +1,263 @@
+# src/core/cache.py
+
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    exact: str  # 像素内容的精确哈希
+    phash: Optional[int]  # 64 位 dHash，图太小时为 None
+    width: int
+    height: int
+
+
+def _dhash(gray: np.ndarray) -> Optional[int]:
+    """
+    差值哈希 (dHash)：缩到 9x8 后比较相邻像素的明暗，得到 64 位指纹
+    用 reduceat 做分块求平均，纯 numpy，不依赖 PIL
+    """
+    h, w = gray.shape
+    if h < 8 or w < 9:
+        return None
+
+    rows = np.linspace(0, h, 9, dtype=np.int64)
+    cols = np.linspace(0, w, 10, dtype=np.int64)
+    sums = np.add.reduceat(np.add.reduceat(gray.astype(np.float32), rows[:-1], axis=0), cols[:-1], axis=1)
+    small = sums / np.outer(np.diff(rows), np.diff(cols))
+
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _bands(phash: int):
+    """把 64 位哈希切成 4 段 16 位，汉明距离 <= 3 时至少有一段完全相同 (鸽巢原理)"""
+    return [(phash >> shift) & 0xFFFF for shift in (48, 32, 16, 0)]
+
+
+class RecognitionCache:
+    """
+    识别结果缓存：内存 LRU + 磁盘 SQLite 两级。
+    键是解码后像素的精确哈希，可选地用感知哈希匹配近似相同的截图。
+    namespace 区分引擎、模型文件和影响识别结果的配置，精确键和近似匹配都只在同一个 namespace 里查。
+
+    注意：SQLite 连接只能在创建它的线程里用，所以要在工作线程里实例化。
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            namespace TEXT,
+            latex TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            phash TEXT,
+            b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+        CREATE INDEX IF NOT EXISTS idx_entries_b0 ON entries(b0);
+        CREATE INDEX IF NOT EXISTS idx_entries_b1 ON entries(b1);
+        CREATE INDEX IF NOT EXISTS idx_entries_b2 ON entries(b2);
+        CREATE INDEX IF NOT EXISTS idx_entries_b3 ON entries(b3);
+    """
+    # 每写入这么多次做一次淘汰，避免每次 put 都扫表
+    PRUNE_EVERY = 64
+
+    def __init__(self, db_path=None, namespace="", memory_entries=256, disk_entries=20000,
+                 max_age_days=30, perceptual=False, phash_distance=3):
+        self.namespace = namespace
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.max_age = max_age_days * 86400
+        self.perceptual = perceptual
+        self.phash_distance = min(phash_distance, 3)  # 分段索引只能保证 3 以内不漏
+
+        self._memory = OrderedDict()  # exact -> (latex, CacheKey)
+        self._puts_since_prune = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "perceptual_hits": 0, "misses": 0, "puts": 0}
+
+        self.db = None
+        if db_path:
+            self.db = self._open_db(Path(db_path))
+
+    # ---------------- 公共接口 ----------------
+
+    def make_key(self, gray: np.ndarray) -> CacheKey:
+        h, w = gray.shape[:2]
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(self.namespace.encode("utf-8"))
+        hasher.update(np.asarray(gray.shape, dtype=np.int64).tobytes())
+        hasher.update(np.ascontiguousarray(gray).tobytes())
+        phash = _dhash(gray) if self.perceptual and gray.ndim == 2 else None
+        return CacheKey(hasher.hexdigest(), phash, w, h)
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        # 1. 内存
+        hit = self._memory.get(key.exact)
+        if hit is not None:
+            self._memory.move_to_end(key.exact)
+            self._stats["memory_hits"] += 1
+            return hit[0]
+
+        # 2. 磁盘 (精确匹配)
+        latex = self._disk_get_exact(key)
+        if latex is not None:
+            self._stats["disk_hits"] += 1
+            self._remember(key, latex)
+            return latex
+
+        # 3. 感知哈希 (近似匹配)
+        if self.perceptual and key.phash is not None:
+            latex = self._find_similar(key)
+            if latex is not None:
+                self._stats["perceptual_hits"] += 1
+                self._remember(key, latex)
+                return latex
+
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, key: CacheKey, latex: str):
+        self._stats["puts"] += 1
+        self._remember(key, latex)
+
+        if self.db is None:
+            return
+
+        now = time.time()
+        bands = _bands(key.phash) if key.phash is not None else [None] * 4
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, namespace, latex, width, height, phash, b0, b1, b2, b3, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key.exact, self.namespace, latex, key.width, key.height,
+                 None if key.phash is None else f"{key.phash:016x}", *bands, now, now)
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ [Cache] 写入失败: {e}")
+            return
+
+        self._puts_since_prune += 1
+        if self._puts_since_prune >= self.PRUNE_EVERY:
+            self.prune()
+
+    def prune(self):
+        """按年龄和条数淘汰磁盘上的旧条目"""
+        self._puts_since_prune = 0
+        if self.db is None:
+            return
+        try:
+            self.db.execute("DELETE FROM entries WHERE last_used < ?", (time.time() - self.max_age,))
+            count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            overflow = count - self.disk_entries
+            if overflow > 0:
+                self.db.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ [Cache] 清理失败: {e}")
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["perceptual_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["memory_size"] = len(self._memory)
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    # ---------------- 内部实现 ----------------
+
+    def _open_db(self, db_path: Path):
+        try:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(db_path))
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(self._SCHEMA)
+            # 旧版本建的表没有 namespace 列：补上，旧条目的 namespace 是 NULL，近似查询不会再命中它们
+            columns = {row[1] for row in db.execute("PRAGMA table_info(entries)")}
+            if "namespace" not in columns:
+                db.execute("ALTER TABLE entries ADD COLUMN namespace TEXT")
+                db.commit()
+        except sqlite3.Error as e:
+            # 数据库损坏就退化成纯内存缓存，不影响识别
+            print(f"⚠️ [Cache] 磁盘缓存不可用，只使用内存缓存: {e}")
+            return None
+
+        self.db = db
+        self.prune()
+        return db
+
+    def _remember(self, key: CacheKey, latex: str):
+        self._memory[key.exact] = (latex, key)
+        self._memory.move_to_end(key.exact)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get_exact(self, key: CacheKey) -> Optional[str]:
+        if self.db is None:
+            return None
+        try:
+            row = self.db.execute("SELECT latex FROM entries WHERE key = ?", (key.exact,)).fetchone()
+            if row is None:
+                return None
+            self._touch(key.exact)
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ [Cache] 读取失败: {e}")
+            return None
+
+    def _touch(self, exact: str):
+        self.db.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), exact))
+        self.db.commit()
+
+    def _is_similar(self, key: CacheKey, phash: int, width: int, height: int) -> bool:
+        if bin(key.phash ^ phash).count("1") > self.phash_distance:
+            return False
+        # 长宽比差太多就不算同一张图 (dHash 对拉伸不敏感)
+        ratio = (key.width / key.height) / (width / height)
+        return 0.95 <= ratio <= 1.05
+
+    def _find_similar(self, key: CacheKey) -> Optional[str]:
+        # 先查内存
+        for latex, other in reversed(self._memory.values()):
+            if other.phash is not None and self._is_similar(key, other.phash, other.width, other.height):
+                return latex
+
+        if self.db is None:
+            return None
+
+        try:
+            b0, b1, b2, b3 = _bands(key.phash)
+            rows = self.db.execute(
+                "SELECT key, latex, phash, width, height FROM entries "
+                "WHERE (b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?) AND namespace = ? ORDER BY last_used DESC LIMIT 256",
+                (b0, b1, b2, b3, self.namespace)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ [Cache] 近似查询失败: {e}")
+            return None
+
+        for exact, latex, phash_hex, width, height in rows:
+            if self._is_similar(key, int(phash_hex, 16), width, height):
+                self._touch(exact)
+                return latex
+        return None
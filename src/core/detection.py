@@ -0,0 +1,119 @@
+"""
+整页公式区域检测 (纯 numpy)：整屏截图、幻灯片、扫描页里找出一块块公式，各自裁出来批量识别。
+
+用投影直方图 (projection profile) 切块:
+    1. 按直方图的峰估计背景色，和背景相差超过 ink_delta 的像素算笔迹 (深色背景也适用)
+    2. 横向投影：有笔迹的行连成一段段的行带；间隔小于 line_gap x 典型行高的合并，
+       分数线这样很细的段和上下的段间隔放宽到 0.6 个行高 (分子、分数线、分母合成一块)
+    3. 每个行带内纵向投影：间隔超过 column_gap x 行带高度的地方切开 (并排的两个公式)
+    4. 太小 (噪点、分割线) 或太满 (照片、色块) 的块丢掉
+
+不区分公式和普通文字：有笔迹的块都是候选区域，识别结果带坐标，由用户挑选。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Region = namedtuple("Region", "x y w h")
+
+
+def ink_mask(gray, ink_delta=48):
+    """
+    灰度图 -> 笔迹掩码 (bool)，背景取直方图的峰。
+    直方图只用隔 4 行 4 列抽样的像素 (背景占大多数，抽样足够)；掩码用两次比较，比查表快好几倍
+    """
+    hist = np.bincount(gray[::4, ::4].ravel(), minlength=256)
+    background = int(np.argmax(hist))
+    mask = np.zeros(gray.shape, dtype=bool)
+    if background - ink_delta > 0:
+        mask |= gray < background - ink_delta
+    if background + ink_delta < 255:
+        mask |= gray > background + ink_delta
+    return mask
+
+
+def _runs(profile):
+    """一维 bool 数组里连续 True 的段：返回 (起点数组, 终点数组)，终点不含"""
+    padded = np.concatenate(([False], profile, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def _merge_runs(starts, ends, max_gap):
+    """间隔不超过 max_gap 的相邻段合并 (max_gap 可以是每个间隔各自的上限)"""
+    if len(starts) < 2:
+        return starts, ends
+    breaks = np.flatnonzero(starts[1:] - ends[:-1] > max_gap)
+    return starts[np.r_[0, breaks + 1]], ends[np.r_[breaks, len(ends) - 1]]
+
+
+def line_bands(mask, line_gap, min_height):
+    """
+    笔迹掩码的横向投影切成行带，返回 (起点数组, 终点数组)。
+    间隔小于 line_gap x 典型行高的相邻段合并；很细的段 (分数线、上划线) 和上下相邻的段间隔放宽到 0.6 个行高
+    """
+    starts, ends = _runs(mask.any(axis=1))
+    if not len(starts):
+        return starts, ends
+    # 典型行高：只看够高的行，噪点和细线不算
+    heights = ends - starts
+    tall = heights[heights >= min_height]
+    line_height = float(np.median(tall)) if tall.size else float(np.median(heights))
+    thin = heights < min_height
+    max_gap = np.where(thin[:-1] | thin[1:], 0.6 * line_height, max(1.0, line_gap * line_height))
+    return _merge_runs(starts, ends, max_gap)
+
+
+class RegionDetector:
+    """在灰度图上找候选公式区域，按阅读顺序 (从上到下、从左到右) 返回 Region 列表"""
+
+    def __init__(self, ink_delta=48, line_gap=0.35, column_gap=1.0, min_height=10, min_width=10,
+                 max_fill=0.6, margin=6):
+        self.ink_delta = ink_delta
+        self.line_gap = line_gap
+        self.column_gap = column_gap
+        self.min_height = min_height
+        self.min_width = min_width
+        self.max_fill = max_fill
+        self.margin = margin
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            ink_delta=cfg.DETECT_INK_DELTA,
+            line_gap=cfg.DETECT_LINE_GAP,
+            column_gap=cfg.DETECT_COLUMN_GAP,
+            min_height=cfg.DETECT_MIN_SIZE,
+            min_width=cfg.DETECT_MIN_SIZE,
+            margin=cfg.DETECT_MARGIN,
+        )
+
+    def __call__(self, gray: np.ndarray) -> list:
+        mask = ink_mask(gray, self.ink_delta)
+        starts, ends = line_bands(mask, self.line_gap, self.min_height)
+
+        height, width = mask.shape
+        regions = []
+        for top, bottom in zip(starts, ends):
+            band = mask[top:bottom]
+            col_starts, col_ends = _runs(band.any(axis=0))
+            col_starts, col_ends = _merge_runs(col_starts, col_ends,
+                                               max(2, int(self.column_gap * (bottom - top))))
+            for left, right in zip(col_starts, col_ends):
+                block = band[:, left:right]
+                rows = np.flatnonzero(block.any(axis=1))
+                block_top, block_bottom = top + rows[0], top + rows[-1] + 1
+                h, w = block_bottom - block_top, right - left
+                if h < self.min_height or w < self.min_width:
+                    continue
+                if np.count_nonzero(block) > self.max_fill * h * w:
+                    continue
+                m = self.margin
+                x0, y0 = max(0, left - m), max(0, block_top - m)
+                x1, y1 = min(width, right + m), min(height, block_bottom + m)
+                regions.append(Region(int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+        return regions
+
+
+def crop(gray, region: Region) -> np.ndarray:
+    return gray[region.y:region.y + region.h, region.x:region.x + region.w]
@@ -0,0 +1,185 @@
+"""
+自回归解码循环 (和具体模型无关，方便单独测试)。
+
+step_fn(x, mask, context) -> logits (b, t, V)：跑一次 decoder，x 是 int64 token (b, t)，mask 是 bool (b, t)
+on_step(tokens): 可选的流式回调，每步解码后用当前 (最好的) 序列调用一次 (只在单张图时调用)，
+    tokens 是不含 BOS 的一维数组视图，回调里不要修改、也不要长期持有
+所有函数都返回不含 BOS 的 token 数组 (b, n)，结束后的位置补 PAD，以及每行的结束原因:
+    "eos"    模型输出了 EOS
+    "budget" 达到 token 上限 (根据图片尺寸估算)
+    "loop"   检测到重复 token 循环，已截掉重复部分
+"""
+import numpy as np
+
+STOP_EOS = "eos"
+STOP_BUDGET = "budget"
+STOP_LOOP = "loop"
+
+
+def token_budget(height, width, min_tokens=48, tokens_per_cell=8, max_tokens=512):
+    """
+    根据送进 encoder 的图片尺寸估算最多需要多少 token：每 32x32 的格子 (不满一格按一格算) 给 tokens_per_cell 个。
+    公式越长越高，图就越大；噪点很多的手机照片也不会因此无限解码下去。
+    压测语料里最密的公式每格要 5.6 个 token，默认的 8 个留了余量 (上限只是防失控，不该截断正常公式)
+    """
+    cells = max(1, -(-height // 32) * -(-width // 32))
+    return int(min(max_tokens, max(min_tokens, min_tokens + tokens_per_cell * cells)))
+
+
+def find_loop(seq, max_period=8, min_span=24, min_repeats=3):
+    """
+    检查 seq 的结尾是不是一段周期 <= max_period 的重复 (至少 min_repeats 次、总长至少 min_span)。
+    是的话返回应该保留的长度 (保留循环开始前的内容 + 一个周期)，否则返回 None。
+    """
+    n = len(seq)
+    for period in range(1, max_period + 1):
+        span = max(min_span, period * min_repeats)
+        if n < span:
+            continue
+        tail = seq[n - span:]
+        if np.array_equal(tail[period:], tail[:-period]):
+            # 继续往前找循环真正开始的位置
+            start = n - span
+            while start > 0 and seq[start - 1] == seq[start - 1 + period]:
+                start -= 1
+            return start + period
+    return None
+
+
+class LoopGuard:
+    """解码时的重复循环检测参数；enabled=False 时不检测"""
+
+    def __init__(self, enabled=True, max_period=8, min_span=24, min_repeats=3):
+        self.enabled = enabled
+        self.max_period = max_period
+        self.min_span = min_span
+        self.min_repeats = min_repeats
+
+    def check(self, seq):
+        if not self.enabled:
+            return None
+        return find_loop(seq, self.max_period, self.min_span, self.min_repeats)
+
+
+def greedy_decode(step_fn, context, budget, bos, eos, pad, max_seq_len=512, stop_at_eos=True, loop_guard=None,
+                  on_step=None):
+    """
+    贪心解码，支持一批 context。budget 可以是整数，也可以是每行一个上限。
+    已经结束的行不再送进 decoder；token 缓冲区和 mask 一次分配好，每步只写新的一列。
+    """
+    batch = len(context)
+    budgets = np.broadcast_to(np.asarray(budget, dtype=np.int64), (batch,))
+    max_steps = int(budgets.max())
+
+    out = np.full((batch, max_steps + 1), pad, dtype=np.int64)
+    out[:, 0] = bos
+    mask = np.ones((batch, min(max_steps + 1, max_seq_len)), dtype=bool)
+    lengths = np.full(batch, max_steps, dtype=np.int64)  # 每行最终的 token 数 (不含 BOS)
+    reasons = [STOP_BUDGET] * batch
+
+    active = np.arange(batch)
+    active_context = context
+    for step in range(1, max_steps + 1):
+        lo = max(0, step - max_seq_len)
+        x = out[:, lo:step] if len(active) == batch else out[active, lo:step]
+        logits = step_fn(x, mask[:len(active), :step - lo], active_context)
+        next_token = logits[:, -1, :].argmax(axis=-1)
+        out[active, step] = next_token
+        if on_step is not None and batch == 1:
+            on_step(out[0, 1:step + 1])
+        if not stop_at_eos:
+            continue
+
+        running = np.ones(len(active), dtype=bool)
+        for j, row in enumerate(active):
+            if next_token[j] == eos:
+                lengths[row], reasons[row] = step, STOP_EOS
+                running[j] = False
+            elif step >= budgets[row]:
+                lengths[row] = step
+                running[j] = False
+            elif loop_guard is not None:
+                keep = loop_guard.check(out[row, 1:step + 1])
+                if keep is not None:
+                    out[row, keep + 1:step + 1] = pad
+                    lengths[row], reasons[row] = keep, STOP_LOOP
+                    running[j] = False
+        if not running.all():
+            active, active_context = active[running], active_context[running]
+            if not len(active):
+                break
+
+    n = int(lengths.max()) if stop_at_eos else max_steps
+    return out[:, 1:n + 1], reasons
+
+
+def _log_softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=-1, keepdims=True))
+
+
+def beam_decode(step_fn, context, budget, beam_size, bos, eos, pad, max_seq_len=512,
+                length_penalty=0.6, loop_guard=None, on_step=None):
+    """
+    小 beam 搜索 (单张图，context 形状 (1, ...))。
+    每步把 beam 个假设作为一批送进 decoder；得分按 长度^length_penalty 归一化，
+    当最好的已完成假设不可能再被超过时提前结束。
+    """
+    budget = int(np.asarray(budget).max())
+    beams = np.full((1, 1), bos, dtype=np.int64)
+    scores = np.zeros(1, dtype=np.float64)
+    mask = np.ones((beam_size, min(budget + 1, max_seq_len)), dtype=bool)
+    finished = []  # (归一化得分, token 列表, 结束原因)
+
+    def normalized(score, length):
+        return score / (max(1, length) ** length_penalty)
+
+    for step in range(1, budget + 1):
+        lo = max(0, step - max_seq_len)
+        ctx = np.repeat(context, len(beams), axis=0)
+        logits = step_fn(beams[:, lo:], mask[:len(beams), :step - lo], ctx)
+        log_probs = _log_softmax(logits[:, -1, :].astype(np.float64))
+
+        # 每个假设取 top-k，再在 beam*k 个候选里取前 beam_size 个
+        candidates = scores[:, None] + log_probs
+        flat = candidates.ravel()
+        top = np.argpartition(-flat, min(beam_size * 2, flat.size) - 1)[:beam_size * 2]
+        top = top[np.argsort(-flat[top])]
+
+        next_beams, next_scores = [], []
+        for idx in top:
+            src, token = divmod(int(idx), log_probs.shape[1])
+            seq = np.append(beams[src], token)
+            if token == eos:
+                finished.append((normalized(flat[idx], step), seq[1:-1], STOP_EOS))
+                continue
+            keep = loop_guard.check(seq[1:]) if loop_guard is not None else None
+            if keep is not None:
+                finished.append((normalized(flat[idx], step), seq[1:keep + 1], STOP_LOOP))
+                continue
+            next_beams.append(seq)
+            next_scores.append(flat[idx])
+            if len(next_beams) == beam_size:
+                break
+
+        if not next_beams:
+            break
+        beams, scores = np.stack(next_beams), np.array(next_scores)
+        if on_step is not None:
+            on_step(beams[int(np.argmax(scores)), 1:])
+
+        # 活着的假设得分只会越来越低 (log 概率 <= 0)，归一化后的上界按最长长度估计
+        if len(finished) >= beam_size:
+            best_done = max(f[0] for f in finished)
+            best_alive = scores.max() / (budget ** length_penalty)
+            if best_done >= best_alive:
+                break
+
+    if not finished:
+        best = int(np.argmax(scores))
+        finished.append((normalized(scores[best], beams.shape[1] - 1), beams[best, 1:], STOP_BUDGET))
+
+    _, tokens, reason = max(finished, key=lambda f: f[0])
+    out = np.full((1, max(1, len(tokens))), pad, dtype=np.int64)
+    out[0, :len(tokens)] = tokens
+    return out, [reason]
@@ -0,0 +1,225 @@
+import copy
+import functools
+import hashlib
+import json
+import os
+import platform
+from pathlib import Path
+
+import onnxruntime as ort
+
+GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def make_session_options(options: dict) -> ort.SessionOptions:
+    """
+    把 AppConfig.ORT_OPTIONS 里某个模型的字典转成 onnxruntime.SessionOptions
+    线程数为 0 表示交给 onnxruntime 自己决定
+    """
+    so = ort.SessionOptions()
+    so.log_severity_level = options.get("log_severity_level", 3)
+    so.intra_op_num_threads = options.get("intra_op_num_threads", 0)
+    so.inter_op_num_threads = options.get("inter_op_num_threads", 0)
+    so.graph_optimization_level = GRAPH_OPT_LEVELS[options.get("graph_optimization_level", "all")]
+    so.execution_mode = EXECUTION_MODES[options.get("execution_mode", "sequential")]
+    so.enable_cpu_mem_arena = options.get("enable_cpu_mem_arena", True)
+    so.enable_mem_pattern = options.get("enable_mem_pattern", True)
+    if not options.get("allow_spinning", True):
+        # 线程空转能降低延迟，但会吃满 CPU；托盘常驻程序可以关掉
+        so.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        so.add_session_config_entry("session.inter_op.allow_spinning", "0")
+    return so
+
+
+def resolve_providers(options: dict) -> list:
+    """
+    providers 配置可以写名字，也可以写 [名字, {provider 参数}]。
+    本机没有的 provider 自动跳过，最后总会保底一个 CPUExecutionProvider。
+    """
+    available = set(ort.get_available_providers())
+    providers = []
+    for item in options.get("providers", ["CPUExecutionProvider"]):
+        name, provider_options = (item, {}) if isinstance(item, str) else (item[0], dict(item[1]))
+        if name not in available:
+            print(f"⚠️ [ORT] 本机不支持 {name}，已跳过")
+            continue
+        providers.append((name, provider_options))
+
+    if not any(name == "CPUExecutionProvider" for name, _ in providers):
+        providers.append(("CPUExecutionProvider", {}))
+    return providers
+
+
+def override_options(ort_options: dict, **changes) -> dict:
+    """复制一份配置，把 changes 应用到所有模型上 (比如批量识别时限制每个进程的线程数)"""
+    new_options = copy.deepcopy(ort_options)
+    for model_options in new_options.values():
+        model_options.update(changes)
+    return new_options
+
+
+@functools.lru_cache(maxsize=1)
+def cpu_fingerprint() -> str:
+    """
+    CPU 架构 + 指令集的指纹。"all" 级别的优化 (NCHWc 布局、按 AVX2/AVX-512 选的算子) 是按本机 CPU 生成的，
+    数据目录同步到另一台电脑上时不能复用。
+    Linux 读 /proc/cpuinfo 的 flags，其它系统用 platform.processor() (Windows 上是 "Intel64 Family 6 Model 158 ..." 这种型号串)
+    """
+    machine = platform.machine().lower() or "cpu"
+    parts = [machine, platform.processor()]
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    parts.append(" ".join(sorted(line.split(":", 1)[1].split())))
+                    break
+    except OSError:
+        pass
+    return f"{machine}_{hashlib.blake2b('|'.join(parts).encode(), digest_size=4).hexdigest()}"
+
+
+class OptimizedModelCache:
+    """
+    优化后模型的磁盘缓存。
+    第一次加载时让 onnxruntime 把图优化后的模型 (默认 ORT 格式) 存下来，之后启动直接加载，省掉解析和图优化。
+    文件名里带上 模型内容哈希 + onnxruntime 版本 + 优化级别 + CPU 指令集指纹，任何一项变了都会自动失效。
+    """
+
+    def __init__(self, cache_dir, fmt="ort"):
+        self.cache_dir = Path(cache_dir)
+        self.fmt = fmt
+        self._hash_index_path = self.cache_dir / "hashes.json"
+
+    def cached_path(self, model_path: Path, options: dict) -> Path:
+        key = "-".join([
+            model_path.stem,
+            self.model_hash(model_path),
+            f"ort{ort.__version__}",
+            options.get("graph_optimization_level", "all"),
+            cpu_fingerprint(),
+        ])
+        return self.cache_dir / f"{key}.{self.fmt}"
+
+    def prune(self, model_path: Path, keep: Path):
+        """删掉同一个模型的旧缓存 (模型或 onnxruntime 升级之后留下的)"""
+        for old in self.cache_dir.glob(f"{model_path.stem}-*.{self.fmt}"):
+            if old != keep:
+                old.unlink(missing_ok=True)
+
+    def model_hash(self, model_path: Path) -> str:
+        """
+        模型文件的内容哈希。几百 MB 的模型每次启动都算一遍也要零点几秒，
+        所以按 (路径, 大小, 修改时间) 记一份索引，文件没动过就直接用上次的结果
+        """
+        stat = model_path.stat()
+        stamp = f"{model_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = self._load_hash_index()
+        if stamp in index:
+            return index[stamp]
+
+        hasher = hashlib.blake2b(digest_size=8)
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        index[stamp] = digest
+        self._save_hash_index(index)
+        return digest
+
+    def _load_hash_index(self) -> dict:
+        try:
+            with open(self._hash_index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hash_index(self, index: dict):
+        tmp = self._hash_index_path.with_name(f"hashes.{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp, self._hash_index_path)
+        except OSError as e:
+            print(f"⚠️ [ORT] 模型哈希索引写入失败: {e}")
+
+
+class OrtSession:
+    """
+    一个 ONNX 模型的推理会话。调用方式和 rapid_latex_ocr 的 OrtInferSession 一样：
+    传入按模型输入顺序排列的数组列表，返回输出列表。
+    传入 model_cache 时优先从优化缓存加载，缓存过期或损坏就回退到原模型并重建缓存。
+    """
+
+    def __init__(self, model_path, options: dict, model_cache: OptimizedModelCache = None):
+        model_path = Path(model_path)
+        if not model_path.is_file():
+            raise FileNotFoundError(f"{model_path} does not exist!")
+
+        self.model_path = model_path
+        self.options = options
+        self.loaded_from_cache = False
+        self.session = None
+
+        if model_cache is not None:
+            try:
+                self.session = self._load_with_cache(model_cache)
+            except Exception as e:
+                # 缓存目录不可写之类的问题，不能影响模型加载
+                print(f"⚠️ [ORT] 优化模型缓存不可用 ({model_path.name}): {e}")
+
+        if self.session is None:
+            self.session = self._create(model_path, make_session_options(options))
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _create(self, path, sess_options):
+        return ort.InferenceSession(str(path), sess_options=sess_options, providers=resolve_providers(self.options))
+
+    def _load_with_cache(self, cache: OptimizedModelCache):
+        cached = cache.cached_path(self.model_path, self.options)
+
+        if cached.exists():
+            so = make_session_options(self.options)
+            # 缓存里的图已经优化过了，不用再跑一遍
+            so.graph_optimization_level = GRAPH_OPT_LEVELS["disable"]
+            try:
+                session = self._create(cached, so)
+                self.loaded_from_cache = True
+                return session
+            except Exception as e:
+                print(f"⚠️ [ORT] 优化缓存已损坏，重新生成 ({cached.name}): {e}")
+                cached.unlink(missing_ok=True)
+
+        # 没有缓存：正常加载原模型，顺便让 onnxruntime 把优化后的模型写到临时文件，成功后再原子替换
+        cache.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_name(f"{cached.stem}.{os.getpid()}.tmp")
+        so = make_session_options(self.options)
+        so.optimized_model_filepath = str(tmp)
+        if cache.fmt == "ort":
+            so.add_session_config_entry("session.save_model_format", "ORT")
+        session = self._create(self.model_path, so)
+
+        if tmp.exists():
+            os.replace(tmp, cached)
+            cache.prune(self.model_path, keep=cached)
+            print(f"💾 [ORT] 已缓存优化后的模型: {cached.name}")
+        return session
+
+    @property
+    def dynamic_batch(self) -> bool:
+        """所有输入的第 0 维都是动态的，才能一次喂多张图"""
+        return all(not isinstance(i.shape[0], int) for i in self.session.get_inputs())
+
+    def __call__(self, inputs: list) -> list:
+        return self.session.run(None, dict(zip(self.input_names, inputs)))
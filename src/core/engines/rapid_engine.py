@@ -1,36 +1,359 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
 from ..base_engine import BaseEngine
+from ..batching import group_by_shape
+from ..image_utils import is_empty_image
+from ..synthetic import synthetic_formula
+from ..timing import StageTimings
+from .decoding import LoopGuard, beam_decode, greedy_decode, token_budget
+from .ort_session import OrtSession, OptimizedModelCache
+from .scale_estimate import MODE_AUDIT, MODE_ESTIMATE, ScaleEstimator
 from rapid_latex_ocr import LaTeXOCR
+from rapid_latex_ocr.utils import PreProcess, TokenizerCls
+from rapid_latex_ocr.utils_load import LoadImage
 
 
 class RapidEngine(BaseEngine):
+    """
+    基于 RapidLaTeXOCR 模型的引擎。
+    推理流程照搬 LaTeXOCR.__call__，但三个 onnxruntime 会话由我们自己按 AppConfig.ORT_OPTIONS 创建，
+    这样线程数、图优化级别、执行模式、内存池、provider 都可以按模型单独配置。
+    """
+    # 和 rapid_latex_ocr/config.yaml 保持一致
+    MAX_DIMS = [672, 192]
+    MIN_DIMS = [32, 32]
+    PAD_TOKEN = 0
+    BOS_TOKEN = 1
+    EOS_TOKEN = 2
+    MAX_SEQ_LEN = 512
+    # 各模型的文件名 (相对 MODELS_DIR)，量化版子类会替换 encoder / decoder
+    MODEL_FILES = {
+        "image_resizer": "image_resizer.onnx",
+        "encoder": "encoder.onnx",
+        "decoder": "decoder.onnx",
+    }
+
     def __init__(self, config):
-        self.model = None
+        self.cfg = config
+        self.image_resizer = None
+        self.encoder = None
+        self.decoder = None
+        self.tokenizer = None
+        self._model_digest = ""
+        self._pool = None  # recognize_batch 并行缩放 / 推理用的线程池，第一次用到时才建
         # 我们可以选择在初始化时自动加载
         # 也可以留给外部显式调用。为了 MVP 简单，我们这里直接调用。
         self.load_model(config.MODELS_DIR)
 
     def load_model(self, models_dir):
         print(f"正在加载模型，路径: {models_dir}")
-        self.model = LaTeXOCR(
-            image_resizer_path=str(models_dir / 'image_resizer.onnx'),
-            encoder_path=str(models_dir / 'encoder.onnx'),
-            decoder_path=str(models_dir / 'decoder.onnx'),
-            tokenizer_json=str(models_dir / 'tokenizer.json')
-        )
-
-    def recognize(self, image_data: bytes) -> str:
-        if self.model is None:
+        options = self.cfg.ORT_OPTIONS
+        model_cache = OptimizedModelCache(self.cfg.MODEL_CACHE_DIR, self.cfg.MODEL_CACHE_FORMAT)
+        cache = model_cache if self.cfg.MODEL_CACHE_ENABLED else None
+        files = self.MODEL_FILES
+        self.image_resizer = OrtSession(models_dir / files['image_resizer'], options['image_resizer'], cache)
+        self.encoder = OrtSession(models_dir / files['encoder'], options['encoder'], cache)
+        self.decoder = OrtSession(models_dir / files['decoder'], options['decoder'], cache)
+        self.tokenizer = TokenizerCls(models_dir / 'tokenizer.json')
+        # 三个模型加上词表的内容哈希 (有哈希索引，文件没动过不会重新读)
+        paths = [models_dir / name for name in files.values()] + [models_dir / 'tokenizer.json']
+        self._model_digest = "".join(model_cache.model_hash(path) for path in paths)
+        self.pre_pro = PreProcess(max_dims=self.MAX_DIMS, min_dims=self.MIN_DIMS)
+        self.load_img = LoadImage()
+        # 批量推理时用白色补齐 (和 PreProcess.pad 一致)，这里是白色归一化之后的值
+        self._pad_value = float(self.pre_pro.normalize(np.full(3, 255.0))[0])
+        self.loop_guard = LoopGuard(enabled=self.cfg.DECODE_LOOP_DETECTION)
+        self.scale_estimator = None
+        if self.cfg.SCALE_ESTIMATE_ENABLED:
+            self.scale_estimator = ScaleEstimator(
+                min_samples=self.cfg.SCALE_ESTIMATE_MIN_SAMPLES,
+                max_spread=self.cfg.SCALE_ESTIMATE_MAX_SPREAD,
+                audit_every=self.cfg.SCALE_ESTIMATE_AUDIT_EVERY,
+            )
+
+    def warmup(self, sizes, rounds=1, decode_steps=16):
+        """
+        用合成公式图把 resizer / encoder / decoder 各跑一遍。
+        onnxruntime 第一次 run 时才分配内存池、挑选 kernel，提前做掉，第一次 Alt+Q 就不会特别慢。
+        解码器只跑固定步数，预热耗时可控。
+        """
+        if self.decoder is None:
+            return None
+
+        passes = []
+        t_start = time.perf_counter()
+        for _ in range(rounds):
+            for i, (h, w) in enumerate(sizes):
+                img = synthetic_formula(h, w, seed=i)
+                t0 = time.perf_counter()
+                self._run_stages(img, decode_steps)
+                passes.append(((h, w), (time.perf_counter() - t0) * 1000))
+        total_ms = (time.perf_counter() - t_start) * 1000
+
+        # 冷/热对比：同一尺寸第一次和最后一次的耗时
+        first_size = passes[0][0]
+        same_size = [ms for size, ms in passes if size == first_size]
+        return {"cold_ms": same_size[0], "warm_ms": same_size[-1], "total_ms": total_ms}
+
+    def _run_stages(self, img, decode_steps):
+        """跑一遍 resizer -> encoder -> 若干步 decoder，预热和调参工具用"""
+        # 合成图不参与缩放比例的标定，而且预热要的就是把 image_resizer 跑一遍
+        context = self._encode(self._resize(img, estimate=False))
+        self._decode(context, max_steps=decode_steps, stop_at_eos=False)
+
+    # ---------------- 推理流程 ----------------
+
+    def _load(self, image_data) -> np.ndarray:
+        # 灰度数组 (截图的零拷贝路径) 直接用，其它 (bytes/路径/彩色数组) 交给 LoadImage
+        if isinstance(image_data, np.ndarray) and image_data.ndim == 2:
+            return image_data
+        return self.load_img(image_data)
+
+    def _resize(self, img: np.ndarray, timings: StageTimings = None, estimate=True) -> np.ndarray:
+        """
+        缩放到模型训练时的字号，返回可以直接喂给 encoder 的 (1, 1, H, W) float32。
+        先用 ScaleEstimator 按笔画粗细估算缩放比例，估不准时才跑 image_resizer；
+        决策 (resize_mode) 和省下的时间 (resize_saved_ms) 记在 timings.meta 里
+        """
+        gray_image = self.pre_pro.minmax_size(self.pre_pro.pad(Image.fromarray(img)))
+        input_image = gray_image.convert("RGB")
+        estimator = self.scale_estimator if estimate else None
+        if estimator is None:
+            return self._resize_with_model(input_image)[0]
+
+        t0 = time.perf_counter()
+        mode, scale, stroke = estimator.decide(np.asarray(gray_image))
+        estimate_ms = (time.perf_counter() - t0) * 1000
+        meta = timings.meta if timings is not None else {}
+        meta["resize_mode"] = mode
+        meta["scale_estimate_ms"] = round(estimate_ms, 3)
+
+        if mode == MODE_ESTIMATE:
+            w = max(1, round(input_image.size[0] * scale))
+            h = max(1, round(input_image.size[1] * scale))
+            final_img, _ = self._pre_process(input_image, scale, w, h)
+            meta["resize_saved_ms"] = round(max(0.0, estimator.expected_resizer_ms - estimate_ms), 3)
+            return final_img
+
+        t1 = time.perf_counter()
+        final_img, model_scale, passes = self._resize_with_model(input_image)
+        estimator.observe(stroke, model_scale, (time.perf_counter() - t1) * 1000)
+        meta["resizer_passes"] = passes
+        if mode == MODE_AUDIT:
+            meta["scale_audit_error"] = round(scale / model_scale - 1, 4)
+        return final_img
+
+    def _resize_with_model(self, input_image):
+        """
+        LaTeXOCR.loop_image_resizer：反复让 image_resizer 模型预测合适的宽度，直到宽度不再变化
+        返回 (encoder 输入, 最终的缩放比例, image_resizer 跑了几次)
+        """
+        r, w, h = 1, input_image.size[0], input_image.size[1]
+        passes = 0
+        for _ in range(10):
+            h = int(h * r)
+            final_img, pad_img = self._pre_process(input_image, r, w, h)
+
+            resizer_res = self.image_resizer([final_img.astype(np.float32)])[0]
+            passes += 1
+
+            argmax_idx = int(np.argmax(resizer_res, axis=-1))
+            w = (argmax_idx + 1) * 32
+            if w == pad_img.size[0]:
+                break
+
+            r = w / pad_img.size[0]
+        return final_img, h / input_image.size[1], passes
+
+    def _pre_process(self, input_image, r, w, h):
+        resize_func = Image.Resampling.BILINEAR if r > 1 else Image.Resampling.LANCZOS
+        resize_img = input_image.resize((w, h), resize_func)
+        pad_img = self.pre_pro.pad(self.pre_pro.minmax_size(resize_img))
+        cvt_img = np.array(pad_img.convert("RGB"))
+
+        gray_img = self.pre_pro.to_gray(cvt_img)
+        normal_img = self.pre_pro.normalize(gray_img)
+        final_img = self.pre_pro.transpose_and_four_dim(normal_img)
+        return final_img, pad_img
+
+    def _encode(self, x: np.ndarray) -> np.ndarray:
+        return self.encoder([x.astype(np.float32)])[0]
+
+    def _decode(self, context: np.ndarray, max_steps=None, stop_at_eos=True, on_step=None):
+        """
+        自回归解码 (循环在 decoding.py)。LaTeXOCR 用 temperature=1e-5 的采样，等价于每步取 argmax，默认贪心；
+        DECODE_STRATEGY = "beam" 时单张图走小 beam 搜索。
+        max_steps: token 上限，可以是每行一个；context 可以是一批 (b, ...)
+        on_step: 流式回调，单张图时每解码一步用当前 token 序列调用一次
+        返回 (不含 BOS 的 token 序列 (b, n)，每行的结束原因)
+        """
+        budget = self.MAX_SEQ_LEN if max_steps is None else max_steps
+        loop_guard = self.loop_guard if stop_at_eos else None
+        if stop_at_eos and len(context) == 1 and self.cfg.DECODE_STRATEGY == "beam" and self.cfg.DECODE_BEAM_SIZE > 1:
+            return beam_decode(self._decoder_step, context, budget, self.cfg.DECODE_BEAM_SIZE,
+                               self.BOS_TOKEN, self.EOS_TOKEN, self.PAD_TOKEN, self.MAX_SEQ_LEN,
+                               length_penalty=self.cfg.DECODE_LENGTH_PENALTY, loop_guard=loop_guard, on_step=on_step)
+        return greedy_decode(self._decoder_step, context, budget, self.BOS_TOKEN, self.EOS_TOKEN, self.PAD_TOKEN,
+                             self.MAX_SEQ_LEN, stop_at_eos=stop_at_eos, loop_guard=loop_guard, on_step=on_step)
+
+    def _decoder_step(self, x, mask, context):
+        return self.decoder([x, mask, context])[0]
+
+    def model_digest(self) -> str:
+        return self._model_digest
+
+    def _token_budget(self, x: np.ndarray) -> int:
+        """按送进 encoder 的图片尺寸 (1, 1, H, W) 给出 token 上限"""
+        return token_budget(x.shape[2], x.shape[3], self.cfg.DECODE_MIN_TOKENS,
+                            self.cfg.DECODE_TOKENS_PER_CELL, self.MAX_SEQ_LEN)
+
+    def _post_process(self, tokens: np.ndarray) -> str:
+        return self._post_process_batch(tokens)[0]
+
+    def tokens_to_latex(self, tokens) -> str:
+        """流式回调里拿到的 token 序列 -> (可能还不完整的) LaTeX"""
+        return self._post_process(np.asarray(tokens)[None, :])
+
+    def _post_process_batch(self, tokens: np.ndarray) -> list:
+        return [LaTeXOCR.post_process(text) for text in self.tokenizer.token2str(tokens)]
+
+    def _pad_stack(self, xs) -> np.ndarray:
+        """把若干 (1, 1, H, W) 补齐到同一尺寸 (右侧、下方补白) 并拼成一批"""
+        h = max(x.shape[2] for x in xs)
+        w = max(x.shape[3] for x in xs)
+        batch = np.full((len(xs), 1, h, w), self._pad_value, dtype=np.float32)
+        for i, x in enumerate(xs):
+            batch[i, :, :x.shape[2], :x.shape[3]] = x[0]
+        return batch
+
+    def _map(self, fn, items) -> list:
+        """
+        并行执行 fn(item)，按顺序返回结果；onnxruntime 的 run 会释放 GIL，
+        一批里各张图的 image_resizer、各组的 encoder / decoder 可以同时跑
+        """
+        workers = max(1, self.cfg.BATCH_WORKERS)
+        if len(items) <= 1 or workers == 1:
+            return [fn(item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(workers, thread_name_prefix="rapid-batch")
+        return list(self._pool.map(fn, items))
+
+    def recognize_batch(self, images, timings=None) -> list:
+        """
+        批量识别：每张图先各自跑 image_resizer (缩放比例因图而异，各张图并行)，
+        再按缩放后的高度分组，宽度右侧补白后 encoder / decoder 一批一起跑。
+        模型没有动态 batch 维时每组只有一张，各组并行跑。
+        """
+        if self.decoder is None:
+            return ["模型未加载"] * len(images)
+
+        timings = timings or [StageTimings() for _ in images]
+        results = [None] * len(images)
+
+        def prepare(i):
+            image_data, t = images[i], timings[i]
+            if is_empty_image(image_data):
+                results[i] = "错误：接收到的图片数据为空"
+                return None
+            try:
+                with t.stage("image_decode"):
+                    img = self._load(image_data)
+                with t.stage("resize"):
+                    return self._resize(img, t).astype(np.float32)
+            except Exception as e:
+                results[i] = f"识别核心错误: {str(e)}"
+                return None
+
+        prepared = self._map(prepare, range(len(images)))
+        inputs = {i: x for i, x in enumerate(prepared) if x is not None}
+
+        # 模型导出时 batch 维是固定的就只能一张一张跑
+        max_batch = self.cfg.BATCH_MAX_SIZE if self.encoder.dynamic_batch and self.decoder.dynamic_batch else 1
+        indices = list(inputs)
+        shapes = [inputs[i].shape[2:] for i in indices]
+        groups = group_by_shape(shapes, max_batch, self.cfg.BATCH_PAD_TOLERANCE, self.cfg.BATCH_WIDTH_TOLERANCE)
+
+        def run(group):
+            members = [indices[g] for g in group]
+            try:
+                texts = self._run_group([inputs[i] for i in members], [timings[i] for i in members])
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                texts = [f"识别核心错误: {str(e)}"] * len(members)
+            for i, text in zip(members, texts):
+                results[i] = text
+
+        self._map(run, groups)
+        return results
+
+    def _run_group(self, xs, group_timings) -> list:
+        """一批尺寸相近的图：耗时记到组里每张图上"""
+        t0 = time.perf_counter()
+        context = self._encode(self._pad_stack(xs) if len(xs) > 1 else xs[0])
+        t1 = time.perf_counter()
+        tokens, reasons = self._decode(context, max_steps=[self._token_budget(x) for x in xs])
+        t2 = time.perf_counter()
+        texts = self._post_process_batch(tokens)
+        t3 = time.perf_counter()
+
+        for t, row, reason in zip(group_timings, tokens, reasons):
+            t.meta["stop_reason"] = reason
+            t.add("encode", (t1 - t0) * 1000)
+            t.add("decode", (t2 - t1) * 1000)
+            t.add("post_process", (t3 - t2) * 1000)
+            t.meta["batch_size"] = len(xs)
+            t.meta["decode_steps"] = int(np.count_nonzero(row != self.PAD_TOKEN))
+        return texts
+
+    def recognize(self, image_data, timings: StageTimings = None, on_tokens=None) -> str:
+        if self.decoder is None:
             return "模型未加载"
 
         # ✅ 新增：空数据检查
-        if not image_data or len(image_data) == 0:
+        if is_empty_image(image_data):
             return "错误：接收到的图片数据为空"
 
+        timings = timings if timings is not None else StageTimings()
         try:
-            result, _ = self.model(image_data)
-            return result
+            with timings.stage("image_decode"):
+                img = self._load(image_data)
+            with timings.stage("resize"):
+                x = self._resize(img, timings)
+            with timings.stage("encode"):
+                context = self._encode(x)
+            with timings.stage("decode"):
+                tokens, reasons = self._decode(context, max_steps=self._token_budget(x), on_step=on_tokens)
+            timings.meta["decode_steps"] = int(tokens.shape[1])
+            timings.meta["stop_reason"] = reasons[0]
+            with timings.stage("post_process"):
+                return self._post_process(tokens)
         except Exception as e:
             # 打印详细错误栈，防止直接闪退
             import traceback
             traceback.print_exc()
             return f"识别核心错误: {str(e)}"
+
+
+class RapidInt8Engine(RapidEngine):
+    """
+    encoder / decoder 换成动态 INT8 量化模型 (由 3rd/quantize_models.py 从 FP32 模型生成)。
+    MatMul 权重量化后，低核数 CPU 上推理大约快一倍，识别结果偶尔会有细微差别，可以用 3rd/compare_engines.py 对比。
+    image_resizer 很小，而且它的 argmax 决定了缩放尺寸，保持 FP32。
+    """
+    MODEL_FILES = {
+        "image_resizer": "image_resizer.onnx",
+        "encoder": "encoder.int8.onnx",
+        "decoder": "decoder.int8.onnx",
+    }
+
+    def load_model(self, models_dir):
+        missing = [name for name in self.MODEL_FILES.values() if not (models_dir / name).is_file()]
+        if missing:
+            raise FileNotFoundError(
+                f"缺少量化模型 {', '.join(missing)}，请先运行 python 3rd/quantize_models.py")
+        super().load_model(models_dir)
@@ -0,0 +1,109 @@
+"""
+image_resizer 的快速替代：直接量出图里的笔画粗细，按之前 image_resizer 给出的结果换算出缩放比例。
+
+image_resizer 的作用是把公式缩放到模型训练时的字号，所以 "缩放后的笔画粗细" 基本是个常数。
+每次真正跑 image_resizer 时记下 (笔画粗细, 缩放比例)，样本足够多、又足够一致之后，
+新图片只要量一下笔画粗细就能算出缩放比例，省掉一到几次 image_resizer。
+量不准 (笔画太少、粗细不一) 或者样本还不够时返回 None，调用方退回 image_resizer。
+"""
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+MODE_ESTIMATE = "estimate"  # 用估算的比例，没跑 image_resizer
+MODE_MODEL = "model"  # 跑了 image_resizer
+MODE_AUDIT = "audit"  # 估算可信，但按 audit_every 定期抽查，仍然跑 image_resizer 并对比
+
+
+def _run_masses(dark, ink):
+    """
+    每一列里连续 ink 像素段的 "墨量" (darkness 之和)。
+    抗锯齿的灰色边缘按灰度算一部分，所以结果是亚像素精度的笔画粗细。
+    """
+    h, w = ink.shape
+    mask = np.zeros((w, h + 2), dtype=np.int8)
+    mask[:, 1:-1] = ink.T
+    values = np.zeros((w, h + 2), dtype=np.float64)
+    values[:, 1:-1] = dark.T
+
+    # 每列上下各补一个空白像素，展平后每段都有成对的起点和终点
+    edges = np.diff(mask.ravel())
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+    cumsum = np.concatenate(([0.0], np.cumsum(values.ravel())))
+    return cumsum[ends] - cumsum[starts]
+
+
+def stroke_width(gray, ink_level=224, min_runs=30, min_share=0.35):
+    """
+    估计白底黑字灰度图 (H, W) uint8 的笔画粗细 (像素)。
+    横竖两个方向的连续墨迹段里，横穿笔画的段最多，它们的长度集中在笔画粗细附近，取这个峰。
+    段太少，或者峰附近的段占比不到 min_share (字体粗细不一、照片噪点多) 时返回 None。
+    """
+    gray = np.asarray(gray)
+    dark = (255.0 - gray) / 255.0
+    ink = gray < ink_level
+    masses = np.concatenate((_run_masses(dark, ink), _run_masses(dark.T, ink.T)))
+    masses = masses[masses >= 0.5]  # 单个浅灰像素是噪点
+    if len(masses) < min_runs:
+        return None
+
+    # 0.25 像素一格的直方图，平滑后取峰
+    hist = np.bincount(np.round(masses * 4).astype(np.int64))
+    smooth = np.convolve(hist, [1, 2, 3, 2, 1], mode="same")
+    peak = int(np.argmax(smooth)) / 4
+    near = masses[np.abs(masses - peak) <= max(0.5, 0.3 * peak)]
+    if len(near) < min_share * len(masses):
+        return None
+    return float(np.median(near))
+
+
+class ScaleEstimator:
+    """
+    在线标定的缩放比例估计器 (线程安全，单张识别和批量识别可以同时用)。
+    min_samples: 至少观察到几次 image_resizer 的结果才开始估算
+    max_spread: 标定样本 log(缩放后笔画粗细) 的标准差上限，超过说明这台机器上的截图不适合估算
+    audit_every: 每估算这么多次就抽查一次 image_resizer，0 为不抽查
+    """
+
+    def __init__(self, min_samples=4, max_spread=0.12, audit_every=25, max_samples=64):
+        self.min_samples = min_samples
+        self.max_spread = max_spread
+        self.audit_every = audit_every
+        self._lock = threading.Lock()
+        self._targets = deque(maxlen=max_samples)  # log(笔画粗细 * 缩放比例)
+        self._resizer_ms = None  # image_resizer 整个循环耗时的滑动平均
+        self._since_audit = 0
+
+    def decide(self, gray):
+        """返回 (模式, 估算的缩放比例或 None, 笔画粗细或 None)"""
+        stroke = stroke_width(gray)
+        with self._lock:
+            if stroke is None or len(self._targets) < self.min_samples:
+                return MODE_MODEL, None, stroke
+            targets = np.array(self._targets)
+            if targets.std() > self.max_spread:
+                return MODE_MODEL, None, stroke
+            scale = math.exp(float(np.median(targets))) / stroke
+            self._since_audit += 1
+            if self.audit_every and self._since_audit >= self.audit_every:
+                self._since_audit = 0
+                return MODE_AUDIT, scale, stroke
+            return MODE_ESTIMATE, scale, stroke
+
+    def observe(self, stroke, scale, resizer_ms):
+        """记录一次 image_resizer 的结果"""
+        with self._lock:
+            if stroke is not None and scale > 0:
+                self._targets.append(math.log(stroke * scale))
+            if self._resizer_ms is None:
+                self._resizer_ms = resizer_ms
+            else:
+                self._resizer_ms = 0.8 * self._resizer_ms + 0.2 * resizer_ms
+
+    @property
+    def expected_resizer_ms(self):
+        with self._lock:
+            return self._resizer_ms or 0.0
@@ -1,8 +1,10 @@
-from .engines.rapid_engine import RapidEngine
-
-
 def create_engine(engine_type: str, config):
+    # 延迟导入：rapid_latex_ocr / onnxruntime 很重，只在真正创建引擎时 (后台线程里) 才加载
     if engine_type == "rapid":
+        from .engines.rapid_engine import RapidEngine
         return RapidEngine(config)
+    elif engine_type == "rapid-int8":
+        from .engines.rapid_engine import RapidInt8Engine
+        return RapidInt8Engine(config)
     else:
         raise ValueError("Unknown engine type")
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+识别历史：每个识别结果都存进 SQLite (DATA_DIR/history/history.sqlite3)，托盘里的 "识别历史" 可以搜索、重新复制。
+
+- LaTeX 建 FTS5 trigram 全文索引：任意 3 个字符以上的片段 (包括 \\frac 这种命令) 都走索引；更短的查询退回 LIKE
+- 分页用 keyset (id < 上一页最后一条)，翻到第几万条也只读一页
+- 缩略图在写入线程里生成 (灰度、缩到固定高度、zlib 压缩)，只保留最近 max_thumbnails 张
+- add() 只是入队，写盘在后台线程里批量提交；查询用单独的只读连接 (WAL 模式下读写互不阻塞)
+"""
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.core.image_utils import to_gray_pixels
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    id: int
+    created: float
+    source: str
+    latex: str
+    thumbnail: Optional[tuple] = None  # (宽, 高, 灰度像素 bytes)
+
+
+def make_thumbnail(gray: np.ndarray, height=40, max_width=400):
+    """灰度像素 -> (宽, 高, zlib 压缩的像素)；按整数倍块平均缩小，太宽的从右边截掉"""
+    h, w = gray.shape
+    factor = max(1, -(-h // height))
+    h2, w2 = h // factor * factor, w // factor * factor
+    if h2 == 0 or w2 == 0:
+        return None
+    small = gray[:h2, :w2].reshape(h2 // factor, factor, w2 // factor, factor).mean(axis=(1, 3))
+    small = np.ascontiguousarray(small[:, :max_width].round().astype(np.uint8))
+    return small.shape[1], small.shape[0], zlib.compress(small.tobytes(), 6)
+
+
+def _fts_query(text):
+    """用户输入 -> FTS5 查询：按空白切词，每个词加引号 (里面的引号转义)，词之间是 AND"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+class HistoryStore:
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY,
+            created REAL NOT NULL,
+            source TEXT NOT NULL,
+            latex TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            id INTEGER PRIMARY KEY,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+            latex, content='history', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts(rowid, latex) VALUES (new.id, new.latex);
+        END;
+        CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, latex) VALUES ('delete', old.id, old.latex);
+            DELETE FROM thumbnails WHERE id = old.id;
+        END;
+    """
+    # 每写入这么多条做一次淘汰
+    PRUNE_EVERY = 256
+
+    def __init__(self, db_path, max_entries=200000, max_thumbnails=5000, thumb_height=40):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.max_thumbnails = max_thumbnails
+        self.thumb_height = thumb_height
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 建表在构造时同步做一次，之后写入线程和查询各用各的连接
+        db = self._connect()
+        db.executescript(self._SCHEMA)
+        db.close()
+
+        self._reader = self._connect(check_same_thread=False)
+        self._reader_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._writes_since_prune = 0
+        self._thread = threading.Thread(target=self._write_loop, name="HistoryWriter", daemon=True)
+        self._thread.start()
+
+    def _connect(self, check_same_thread=True):
+        db = sqlite3.connect(str(self.db_path), check_same_thread=check_same_thread)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # ---------------- 写入 (任意线程，只是入队) ----------------
+
+    def add(self, latex, source="unknown", image=None, created=None):
+        """image: 灰度像素数组或编码后的图片 bytes，用来生成缩略图 (可以不传)"""
+        self._queue.put((created or time.time(), source, latex, image))
+
+    def flush(self, timeout=5.0):
+        """等队列里已有的写入全部落盘 (测试、退出前用)"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        with self._reader_lock:
+            self._reader.close()
+
+    def _write_loop(self):
+        db = self._connect()
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            # 一次把排着的都拿完，一个事务提交
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows, events = [], []
+            for entry in batch:
+                if entry is _STOP:
+                    stop = True
+                elif isinstance(entry, threading.Event):
+                    events.append(entry)
+                else:
+                    rows.append(entry)
+            if rows:
+                self._write(db, rows)
+            for event in events:
+                event.set()
+        db.close()
+
+    def _write(self, db, rows):
+        # 缩略图在事务外面生成，写锁只在真正写入时持有
+        thumbnails = [self._thumbnail(image) for _, _, _, image in rows]
+        try:
+            with db:
+                for (created, source, latex, _), thumbnail in zip(rows, thumbnails):
+                    cursor = db.execute("INSERT INTO history (created, source, latex) VALUES (?, ?, ?)",
+                                        (created, source, latex))
+                    if thumbnail is not None:
+                        db.execute("INSERT INTO thumbnails (id, width, height, data) VALUES (?, ?, ?, ?)",
+                                   (cursor.lastrowid, *thumbnail))
+        except sqlite3.Error as e:
+            print(f"⚠️ [History] 写入失败: {e}")
+            return
+        self._writes_since_prune += len(rows)
+        if self._writes_since_prune >= self.PRUNE_EVERY:
+            self._prune(db)
+
+    def _thumbnail(self, image):
+        if image is None or self.max_thumbnails <= 0:
+            return None
+        try:
+            return make_thumbnail(to_gray_pixels(image), self.thumb_height)
+        except Exception as e:
+            print(f"⚠️ [History] 生成缩略图失败: {e}")
+            return None
+
+    def _prune(self, db):
+        """
+        条数和缩略图数量都有上限，按 id 删掉最旧的。
+        历史的 id 是连续的 (只追加、只删最旧的)，直接按 id 范围删；缩略图不是每条都有，按主键索引数到第 N 张
+        """
+        self._writes_since_prune = 0
+        try:
+            with db:
+                db.execute("DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?",
+                           (self.max_entries,))
+                db.execute("DELETE FROM thumbnails WHERE id <= "
+                           "(SELECT id FROM thumbnails ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                           (self.max_thumbnails,))
+        except sqlite3.Error as e:
+            print(f"⚠️ [History] 清理失败: {e}")
+
+    # ---------------- 查询 ----------------
+
+    def page(self, query="", before_id=None, limit=50) -> list:
+        """
+        最新的在前；before_id 是上一页最后一条的 id (keyset 分页)。
+        query 非空时全文搜索：每个词至少 3 个字符走 trigram 索引，否则退回 LIKE
+        """
+        before_id = before_id if before_id is not None else 1 << 62
+        terms = query.split()
+        if not terms:
+            sql = ("SELECT h.id, h.created, h.source, h.latex, t.width, t.height, t.data FROM history h "
+                   "LEFT JOIN thumbnails t ON t.id = h.id WHERE h.id < ? ORDER BY h.id DESC LIMIT ?")
+            params = (before_id, limit)
+        elif all(len(term) >= 3 for term in terms):
+            sql = ("SELECT h.id, h.created, h.source, h.latex, t.width, t.height, t.data "
+                   "FROM (SELECT rowid FROM history_fts WHERE history_fts MATCH ? AND rowid < ? "
+                   "ORDER BY rowid DESC LIMIT ?) m "
+                   "JOIN history h ON h.id = m.rowid LEFT JOIN thumbnails t ON t.id = h.id ORDER BY h.id DESC")
+            params = (_fts_query(query), before_id, limit)
+        else:
+            like = " AND ".join("h.latex LIKE ? ESCAPE '\\'" for _ in terms)
+            sql = ("SELECT h.id, h.created, h.source, h.latex, t.width, t.height, t.data FROM history h "
+                   f"LEFT JOIN thumbnails t ON t.id = h.id WHERE h.id < ? AND {like} ORDER BY h.id DESC LIMIT ?")
+            escaped = ["%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for t in terms]
+            params = (before_id, *escaped, limit)
+
+        with self._reader_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        return [HistoryEntry(id_, created, source, latex,
+                             (w, h, zlib.decompress(data)) if data is not None else None)
+                for id_, created, source, latex, w, h, data in rows]
+
+    def count(self) -> int:
+        """总条数 (id 连续，不用 COUNT(*) 扫表)"""
+        with self._reader_lock:
+            return self._reader.execute("SELECT MAX(id) - MIN(id) + 1 FROM history").fetchone()[0] or 0
@@ -0,0 +1,203 @@
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+
+def decode_gray(img_bytes: bytes, exif_transpose=False) -> np.ndarray:
+    """
+    把 PNG/JPEG 等编码后的图片解码成灰度 numpy 数组 (H, W) uint8
+    带透明通道的图片先铺到白底上，否则透明区域会变成黑色
+    exif_transpose: 按 EXIF 方向转正 (手机照片)
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(BytesIO(img_bytes))
+    if exif_transpose:
+        img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    return np.asarray(img.convert("L"))
+
+
+def is_empty_image(image_data) -> bool:
+    """bytes 和 numpy 数组都能用的空数据检查"""
+    if image_data is None:
+        return True
+    if isinstance(image_data, np.ndarray):
+        return image_data.size == 0
+    return len(image_data) == 0
+
+
+def to_gray_pixels(image_data) -> np.ndarray:
+    """
+    统一成灰度像素数组：numpy 数组直接用 (彩色的转一次灰度)，bytes 才需要解码
+    """
+    if isinstance(image_data, np.ndarray):
+        if image_data.ndim == 2:
+            return image_data
+        rgb = image_data[..., :3].astype(np.float32)
+        return (rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).astype(np.uint8)
+    return decode_gray(image_data)
+
+
+# ==========================================
+# Qt 相关 (只在界面进程里用，批量命令行不会走到这里)
+# ==========================================
+class _QImageBuffer:
+    """
+    让 numpy 直接引用 QImage 的像素内存 (零拷贝)。
+    数组的 base 是这个对象，它持有 QImage，所以数组活着 QImage 就不会被释放。
+    """
+
+    def __init__(self, image):
+        self.image = image
+        ptr = image.constBits()
+        ptr.setsize(image.sizeInBytes())
+        self.__array_interface__ = {
+            "shape": (image.height(), image.width()),
+            "strides": (image.bytesPerLine(), 1),
+            "typestr": "|u1",
+            "data": (int(ptr), True),
+            "version": 3,
+        }
+
+
+def qimage_to_gray(image) -> np.ndarray:
+    """
+    QImage -> 灰度 numpy 视图 (H, W) uint8，只做一次灰度转换，不经过 PNG 编解码
+    """
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QImage, QPainter
+
+    if image.hasAlphaChannel():
+        # 透明区域铺白底，和 decode_gray 的行为保持一致
+        flat = QImage(image.size(), QImage.Format.Format_RGB32)
+        flat.fill(Qt.GlobalColor.white)
+        painter = QPainter(flat)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = flat
+
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    return np.asarray(_QImageBuffer(gray))
+
+
+def gray_to_qimage(pixels: np.ndarray):
+    """灰度 numpy 数组 (H, W) uint8 -> QImage (复制一份，不引用数组的内存)"""
+    from PyQt6.QtGui import QImage
+
+    pixels = np.ascontiguousarray(pixels)
+    height, width = pixels.shape
+    return QImage(pixels.data, width, height, pixels.strides[0], QImage.Format.Format_Grayscale8).copy()
+
+
+def dump_debug_image(image, path):
+    """
+    调试用：在线程池里保存图片，不阻塞截图 -> 识别的主流程
+    """
+    from PyQt6.QtCore import QThreadPool
+
+    def save():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if image.save(str(path)):
+            print(f"【调试】图片已保存: {path}")
+
+    QThreadPool.globalInstance().start(save)
+
+
+def read_qimage(data, max_side=None):
+    """
+    用 QImageReader 解码图片 (可以在任意线程调用)，按 EXIF 方向自动转正。
+    data 也可以是灰度像素数组 (整屏识别裁出的区域)，直接转成 QImage，不用先编码成 PNG。
+    max_side: 预览用，解码时就缩小到长边不超过这个值 (JPEG 在解码阶段按 DCT 缩小，比解完再缩快得多)
+    返回 QImage，解码失败时返回 None
+    """
+    from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    from PyQt6.QtGui import QImageReader
+
+    if isinstance(data, np.ndarray):
+        image = gray_to_qimage(data)
+        if max_side and max(image.width(), image.height()) > max_side:
+            image = image.scaled(max_side, max_side, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        return image
+
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+
+    size = reader.size()
+    if max_side and size.isValid() and max(size.width(), size.height()) > max_side:
+        # 等比缩放，和 EXIF 旋转的先后顺序无关
+        scale = max_side / max(size.width(), size.height())
+        reader.setScaledSize(size * scale)
+
+    image = reader.read()
+    return None if image.isNull() else image
+
+
+def _unrotate(rect, turns):
+    """把逆时针转过 turns 次 90° 之后的图片里的比例矩形 (x, y, w, h)，映射回旋转前的比例坐标"""
+    x, y, w, h = rect
+    for _ in range(turns % 4):
+        # 逆时针 90°: (x, y) -> (y, 1 - x)；反过来 (x', y') -> (1 - y', x')
+        x, y, w, h = 1 - y - h, x, h, w
+    return x, y, w, h
+
+
+class ImageEdits:
+    """
+    非破坏性的编辑列表：只记录操作，预览图和原图各自在需要时套用一次。
+    裁剪区域用比例坐标 (0~1，相对当时方向的整张图)，所以同一份记录对预览图和原图都适用。
+    """
+
+    def __init__(self):
+        self.edits = []  # ("rotate", None) 逆时针 90° / ("crop", (x, y, w, h))
+
+    def rotate(self):
+        self.edits.append(("rotate", None))
+
+    def crop(self, rect):
+        self.edits.append(("crop", rect))
+
+    def clear(self):
+        self.edits.clear()
+
+    def copy(self):
+        other = ImageEdits()
+        other.edits = list(self.edits)
+        return other
+
+    def net_effect(self):
+        """
+        把整个编辑列表合并成 "先在原图上裁剪 (比例坐标)，再逆时针转 turns 次"，
+        这样原图只需要裁一次、转一次，而且是先裁小再转
+        """
+        crop, turns = (0.0, 0.0, 1.0, 1.0), 0
+        for op, value in self.edits:
+            if op == "rotate":
+                turns += 1
+                continue
+            x, y, w, h = _unrotate(value, turns)
+            cx, cy, cw, ch = crop
+            crop = (cx + x * cw, cy + y * ch, w * cw, h * ch)
+        return crop, turns % 4
+
+    def apply(self, image):
+        """对 QImage 套用全部编辑，返回新的 QImage"""
+        from PyQt6.QtCore import QRect
+        from PyQt6.QtGui import QTransform
+
+        (x, y, w, h), turns = self.net_effect()
+        if (x, y, w, h) != (0.0, 0.0, 1.0, 1.0):
+            iw, ih = image.width(), image.height()
+            rect = QRect(round(x * iw), round(y * ih), max(1, round(w * iw)), max(1, round(h * ih)))
+            image = image.copy(rect.intersected(image.rect()))
+        if turns:
+            image = image.transformed(QTransform().rotate(-90 * turns))
+        return image
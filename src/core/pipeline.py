@@ -0,0 +1,178 @@
+"""
+连拍识别流水线：手机一次传来好几张照片时，解码、预处理、推理三段各用各的线程，前后照片交错执行
+(第 2 张在解码时第 1 张已经在推理)，推理段交给 MicroBatcher，同时到达的照片还能凑批。
+每张照片的状态变化通过 on_update(item) 回调通知 (在流水线的线程里调用)。
+"""
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from src.core.timing import StageTimings
+
+# 照片的状态
+DECODING = "decoding"
+PREPROCESSING = "preprocessing"
+RECOGNIZING = "recognizing"
+DONE = "done"
+FAILED = "failed"
+
+
+class BurstItem:
+    """
+    连拍里的一张照片；data 是原始编码字节 (按需编辑时再用) 或者已经解码的灰度像素 (整屏识别裁出的区域)，
+    pixels 是预处理后的灰度图，box 是区域在整张截图里的坐标 (x, y, w, h)
+    """
+
+    def __init__(self, item_id, data, box=None):
+        self.id = item_id
+        self.data = data
+        self.box = box
+        self.status = DECODING
+        self.pixels = None
+        self.latex = None
+        self.error = None
+        self.timings = StageTimings()
+        self.generation = 0  # 每次重新识别 +1，丢弃旧一轮迟到的结果
+
+
+class BurstPipeline:
+    """
+    decode(data) -> 灰度像素；prepare(pixels, meta) -> 像素 (None 表示不预处理)；
+    infer(pixels, timings) -> Future[str] (InferenceWorker.infer_async)；
+    infer_many(pixels_list, timings_list) -> [Future[str]] (InferenceWorker.infer_many，可选)：
+    add_many 的一组区域一起送进推理，保证凑成一批
+    """
+
+    def __init__(self, decode, prepare, infer, on_update=None, decode_workers=2, infer_many=None):
+        self._decode = decode
+        self._prepare = prepare
+        self._infer = infer
+        self._infer_many = infer_many
+        self._on_update = on_update or (lambda item: None)
+        # 解码最慢 (手机照片几 MB)，多给几个线程；预处理很快，一个线程按顺序做
+        self._decode_pool = ThreadPoolExecutor(max(1, decode_workers), thread_name_prefix="burst-decode")
+        self._prepare_pool = ThreadPoolExecutor(1, thread_name_prefix="burst-prepare")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.items = {}
+
+    def add(self, data, box=None) -> BurstItem:
+        """任意线程调用：收到一张照片 (bytes) 或一块灰度像素，立即返回 (状态是 decoding)"""
+        item = BurstItem(next(self._ids), data, box)
+        with self._lock:
+            self.items[item.id] = item
+        self._decode_pool.submit(self._run_decode, item, item.generation)
+        return item
+
+    def add_many(self, regions) -> list:
+        """
+        任意线程调用：一组已经解码的灰度像素 [(pixels, box), ...] (整屏识别裁出的各个区域)，
+        不用解码，预处理完一起送进推理，立即返回 BurstItem 列表 (状态是 preprocessing)
+        """
+        items = [BurstItem(next(self._ids), pixels, box) for pixels, box in regions]
+        with self._lock:
+            for item in items:
+                self.items[item.id] = item
+        for item in items:
+            self._update(item, item.generation, PREPROCESSING)
+        self._prepare_pool.submit(self._run_prepare_many, items, [item.generation for item in items])
+        return items
+
+    def resubmit(self, item_id, pixels):
+        """用户编辑过 (裁剪/旋转) 以后用新的像素重新识别"""
+        with self._lock:
+            item = self.items.get(item_id)
+            if item is None:
+                return None
+            item.generation += 1
+            generation = item.generation
+            item.timings = StageTimings()
+            item.latex = item.error = None
+        self._update(item, generation, PREPROCESSING)
+        self._prepare_pool.submit(self._run_prepare, item, generation, pixels)
+        return item
+
+    def remove(self, item_id):
+        with self._lock:
+            item = self.items.pop(item_id, None)
+            if item is not None:
+                item.generation += 1  # 还在路上的结果直接丢掉
+
+    def close(self):
+        self._decode_pool.shutdown(wait=False, cancel_futures=True)
+        self._prepare_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _current(self, item, generation):
+        return item.generation == generation and item.id in self.items
+
+    def _update(self, item, generation, status, **fields):
+        with self._lock:
+            if not self._current(item, generation):
+                return
+            item.status = status
+            for key, value in fields.items():
+                setattr(item, key, value)
+        self._on_update(item)
+
+    def _run_decode(self, item, generation):
+        try:
+            with item.timings.stage("image_decode"):
+                pixels = item.data if isinstance(item.data, np.ndarray) else self._decode(item.data)
+        except Exception as e:
+            self._update(item, generation, FAILED, error=f"无法解码图片: {e}")
+            return
+        self._update(item, generation, PREPROCESSING)
+        self._prepare_pool.submit(self._run_prepare, item, generation, pixels)
+
+    def _run_prepare(self, item, generation, pixels):
+        self._run_prepare_many([item], [generation], [pixels])
+
+    def _run_prepare_many(self, items, generations, pixels_list=None):
+        """预处理一组照片，然后一起送去推理 (pixels_list 为 None 时用 item.data)"""
+        if pixels_list is None:
+            pixels_list = [item.data for item in items]
+        ready = []
+        for item, generation, pixels in zip(items, generations, pixels_list):
+            if not self._current(item, generation):
+                continue
+            try:
+                if self._prepare is not None:
+                    with item.timings.stage("preprocess"):
+                        pixels = self._prepare(pixels, meta=item.timings.meta)
+            except Exception as e:
+                self._update(item, generation, FAILED, error=str(e))
+                continue
+            # 先改状态再送去推理：结果可能在 infer 返回之前就出来了
+            self._update(item, generation, RECOGNIZING, pixels=pixels)
+            ready.append((item, generation, pixels))
+        if not ready:
+            return
+
+        try:
+            if self._infer_many is not None and len(ready) > 1:
+                futures = self._infer_many([p for _, _, p in ready], [item.timings for item, _, _ in ready])
+            else:
+                futures = [self._infer(p, item.timings) for item, _, p in ready]
+        except Exception as e:
+            for item, generation, _ in ready:
+                self._update(item, generation, FAILED, error=str(e))
+            return
+        for (item, generation, _), future in zip(ready, futures):
+            future.add_done_callback(partial(self._finish, item, generation))
+
+    def _finish(self, item, generation, future):
+        try:
+            latex = future.result()
+        except Exception as e:
+            self._update(item, generation, FAILED, error=f"推理过程异常: {e}")
+            return
+        # 和 InferenceWorker 一样的结果清洗
+        if not latex:
+            self._update(item, generation, FAILED, error="未能识别出公式")
+        elif "错误" in latex:
+            self._update(item, generation, FAILED, error=latex)
+        else:
+            self._update(item, generation, DONE, latex=latex)
@@ -0,0 +1,215 @@
+"""
+识别前的图片预处理 (纯 numpy，不依赖 Qt / PIL)：灰度化、裁掉空白边、对比度拉伸、可选二值化、按需缩小。
+手机照片动辄上千万像素，HiDPI 截图四周还有大片空白，这些像素模型用不上，越早去掉越省事。
+
+步骤按名字注册，AppConfig.PREPROCESS_STEPS 决定用哪些、按什么顺序。有两种步骤:
+    图像步骤 fn(img, ctx) -> img         改变尺寸 / 通道 (grayscale, trim, downscale)
+    查表步骤 fn(hist, ctx) -> lut 或 None 只按灰度值逐像素映射 (normalize, binarize)，
+                                          只需要直方图；相邻的查表步骤先合成一张表，最后对像素只查一次
+"""
+import numpy as np
+
+STEPS = {}  # 名字 -> (类型, 函数)
+
+IMAGE_STEP = "image"
+LUT_STEP = "lut"
+
+DEFAULT_STEPS = ("grayscale", "trim", "downscale", "normalize")
+
+_LEVELS = np.arange(256, dtype=np.float32)
+
+
+def register_step(name, kind=IMAGE_STEP):
+    """注册一个预处理步骤 (装饰器)"""
+
+    def decorator(fn):
+        STEPS[name] = (kind, fn)
+        return fn
+
+    return decorator
+
+
+class PreprocessContext:
+    """一次预处理的参数和中间状态；meta 里记录做了什么 (写进 RequestTrace)"""
+
+    def __init__(self, dpr=1.0, max_dims=(672, 192), min_dims=(32, 32), trim_margin=8, ink_delta=32,
+                 dpr_downscale=True, meta=None):
+        self.dpr = dpr
+        self.max_dims = max_dims  # (宽, 高)，和 RapidEngine.MAX_DIMS 一致
+        self.min_dims = min_dims
+        self.trim_margin = trim_margin
+        self.ink_delta = ink_delta  # 和背景灰度相差多少算作笔迹
+        self.dpr_downscale = dpr_downscale
+        self.meta = meta if meta is not None else {}
+
+
+# ---------------- 图像步骤 ----------------
+
+@register_step("grayscale")
+def grayscale(img, ctx):
+    """彩色 (H, W, 3/4) -> 灰度 uint8；带透明通道的铺到白底上"""
+    if img.ndim == 2:
+        return img
+    if img.shape[-1] == 4 and img[..., 3].min() < 255:
+        rgb = img[..., :3].astype(np.float32)
+        alpha = img[..., 3:4].astype(np.float32) / 255
+        rgb = rgb * alpha + 255 * (1 - alpha)
+        return (rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).astype(np.uint8)
+    # 不透明的图走整数运算 (系数 x256)，千万像素的照片比浮点矩阵乘快好几倍
+    gray = img[..., 0].astype(np.uint16)
+    gray *= 77
+    gray += img[..., 1].astype(np.uint16) * 150
+    gray += img[..., 2].astype(np.uint16) * 29
+    gray >>= 8
+    return gray.astype(np.uint8)
+
+
+@register_step("trim")
+def trim(img, ctx):
+    """
+    裁掉四周的空白：背景灰度取四条边的中位数，和背景相差超过 ink_delta 的算笔迹，
+    只保留笔迹外接矩形 (外加 trim_margin 像素)。整张都是空白时原样返回
+    """
+    border = np.concatenate((img[0], img[-1], img[:, 0], img[:, -1]))
+    background = int(np.median(border))
+    is_ink = np.abs(_LEVELS - background) > ctx.ink_delta
+    ink = is_ink[img]
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    if not rows.size:
+        ctx.meta["blank"] = True
+        return img
+    cols = np.flatnonzero(ink.any(axis=0))
+
+    m = ctx.trim_margin
+    top, bottom = max(0, rows[0] - m), min(img.shape[0], rows[-1] + 1 + m)
+    left, right = max(0, cols[0] - m), min(img.shape[1], cols[-1] + 1 + m)
+    ctx.meta["crop"] = [int(top), int(left), int(bottom - top), int(right - left)]
+    return img[top:bottom, left:right]
+
+
+@register_step("downscale")
+def downscale(img, ctx):
+    """
+    按整数倍块平均缩小：
+    - 比模型最大输入还大好几倍的图 (手机照片)，缩到仍然不小于最大输入，之后引擎自己的缩放结果不变
+    - HiDPI 截图按 devicePixelRatio 缩回逻辑像素 (短边不小于模型最小输入)
+    """
+    h, w = img.shape
+    factor = int(max(w / ctx.max_dims[0], h / ctx.max_dims[1]))
+    if ctx.dpr_downscale and ctx.dpr >= 2:
+        factor = max(factor, min(int(ctx.dpr), h // ctx.min_dims[1], w // ctx.min_dims[0]))
+    if factor <= 1:
+        return img
+
+    h2, w2 = h // factor * factor, w // factor * factor
+    blocks = img[:h2, :w2].reshape(h2 // factor, factor, w2 // factor, factor)
+    area = factor * factor
+    sums = blocks.sum(axis=(1, 3), dtype=np.uint32)
+    ctx.meta["downscale"] = factor
+    return ((sums + area // 2) // area).astype(np.uint8)
+
+
+# ---------------- 查表步骤 ----------------
+
+@register_step("normalize", kind=LUT_STEP)
+def normalize(hist, ctx):
+    """
+    对比度拉伸：背景 (直方图的峰) 拉到 255，最深的笔迹 (去掉 0.1% 的离群点) 拉到 0。
+    深色背景 (暗色主题截图) 顺便反色成白底黑字；对比度太低 (基本是空白) 时不处理
+    """
+    total = hist.sum()
+    background = int(np.argmax(hist))
+    inverted = background < 128
+    if inverted:
+        hist = hist[::-1]
+        background = 255 - background
+
+    cdf = np.cumsum(hist)
+    ink = int(np.searchsorted(cdf, max(1, total * 0.001)))
+    if background - ink < 16:
+        return None
+
+    lut = np.clip((_LEVELS - ink) * (255 / (background - ink)), 0, 255).astype(np.uint8)
+    if inverted:
+        ctx.meta["inverted"] = True
+        lut = lut[::-1]
+    return lut
+
+
+@register_step("binarize", kind=LUT_STEP)
+def binarize(hist, ctx):
+    """Otsu 阈值二值化 (只用直方图)；纯色图返回 None"""
+    total = hist.sum()
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * _LEVELS)
+    background = total - weights
+    valid = (weights > 0) & (background > 0)
+    if not valid.any():
+        return None
+    between = np.zeros(256, dtype=np.float64)
+    w0, w1 = weights[valid], background[valid]
+    mu0 = means[valid] / w0
+    mu1 = (means[-1] - means[valid]) / w1
+    between[valid] = w0 * w1 * (mu0 - mu1) ** 2
+    threshold = int(np.argmax(between))
+    ctx.meta["binarize_threshold"] = threshold
+    return np.where(_LEVELS > threshold, 255, 0).astype(np.uint8)
+
+
+class Preprocessor:
+    """按 steps 的顺序跑预处理步骤"""
+
+    def __init__(self, steps=DEFAULT_STEPS, max_dims=(672, 192), min_dims=(32, 32), trim_margin=8,
+                 dpr_downscale=True):
+        unknown = [name for name in steps if name not in STEPS]
+        if unknown:
+            raise ValueError(f"未知的预处理步骤: {unknown}")
+        self.steps = tuple(steps)
+        self.max_dims = max_dims
+        self.min_dims = min_dims
+        self.trim_margin = trim_margin
+        self.dpr_downscale = dpr_downscale
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            steps=cfg.PREPROCESS_STEPS,
+            max_dims=cfg.PREPROCESS_MAX_DIMS,
+            trim_margin=cfg.PREPROCESS_TRIM_MARGIN,
+            dpr_downscale=cfg.PREPROCESS_DPR_DOWNSCALE,
+        )
+
+    def __call__(self, img: np.ndarray, dpr=1.0, meta=None) -> np.ndarray:
+        """
+        img: 灰度 (H, W) 或彩色 (H, W, 3/4) uint8；dpr: 截图所在屏幕的 devicePixelRatio
+        meta: 可选的字典，记录输入输出尺寸和各步骤做了什么
+        """
+        ctx = PreprocessContext(dpr, self.max_dims, self.min_dims, self.trim_margin,
+                                dpr_downscale=self.dpr_downscale)
+        in_shape = img.shape[:2]
+        lut, hist = None, None
+        for name in self.steps:
+            kind, fn = STEPS[name]
+            if kind == LUT_STEP:
+                if hist is None:
+                    hist = np.bincount(img.ravel(), minlength=256)
+                step_lut = fn(hist, ctx)
+                if step_lut is None:
+                    continue
+                lut = step_lut if lut is None else step_lut[lut]
+                # 映射之后的直方图，给下一个查表步骤用
+                hist = np.bincount(step_lut, weights=hist, minlength=256)
+            else:
+                if lut is not None:
+                    img, lut = lut[img], None
+                img = fn(img, ctx)
+                hist = None
+        if lut is not None:
+            img = lut[img]
+
+        ctx.meta["in"] = [int(in_shape[0]), int(in_shape[1])]
+        ctx.meta["out"] = [int(img.shape[0]), int(img.shape[1])]
+        if meta is not None:
+            meta["preprocess"] = ctx.meta
+        return np.ascontiguousarray(img)
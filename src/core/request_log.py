@@ -0,0 +1,70 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """原样把 record 放进队列：JSON 序列化留给后台线程做，调用方 (GUI 线程) 只付一次入队的开销"""
+
+    def prepare(self, record):
+        return record
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, separators=(",", ":"))
+
+
+def machine_id():
+    """匿名的机器标识 (主机名哈希)，多台机器的日志汇总时用来区分来源"""
+    return hashlib.sha1(platform.node().encode("utf-8")).hexdigest()[:12]
+
+
+class RequestLog:
+    """
+    每个识别请求一行 JSON 的滚动日志 (DATA_DIR/logs/requests.jsonl)。
+    write() 只是入队，写盘在 QueueListener 的后台线程里完成；文件超过 max_bytes 自动滚动，保留 backup_count 份。
+    每行都带上机器标识、系统、引擎类型，方便把多台机器的日志拼在一起分析。
+    """
+
+    def __init__(self, log_dir, max_bytes=2 * 1024 * 1024, backup_count=5, context=None):
+        os.makedirs(log_dir, exist_ok=True)
+        self.path = os.path.join(log_dir, "requests.jsonl")
+        self.context = {
+            "machine": machine_id(),
+            "os": platform.system(),
+            "cpu_count": os.cpu_count(),
+            **(context or {}),
+        }
+
+        file_handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding="utf-8", delay=True)
+        file_handler.setFormatter(_JsonLineFormatter())
+
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+
+        # 每个实例一个独立的 logger，不往根 logger 传播
+        self._logger = logging.getLogger(f"texfe.requests.{id(self)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(_DeferredQueueHandler(self._queue))
+
+    def write(self, record: dict):
+        self._logger.info({**self.context, **record})
+
+    def close(self):
+        """刷完队列里剩下的记录再返回"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._listener = None
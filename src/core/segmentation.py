@@ -0,0 +1,83 @@
+"""
+多行公式切行：align 这类很高的截图整张送进引擎会被 image_resizer 整体缩小，每一行都变得很小，
+又慢又容易认错。按行间的空白把截图切成一行一行，各行按原尺寸识别 (一起凑批并发)，
+再把结果拼回 aligned (每行都有 = 之类的关系符) 或 gathered 环境。
+"""
+import re
+
+import numpy as np
+
+from src.core.detection import Region, ink_mask, line_bands
+
+# 对齐点：第一个不在花括号里的关系符
+_RELATION = re.compile(r"\\(?:leq|geq|le|ge|neq|ne|approx|equiv|sim|simeq|cong|propto|Rightarrow|Leftrightarrow)"
+                       r"(?![a-zA-Z])|<|>|=")
+
+
+class RowSegmenter:
+    """把灰度截图切成行，返回每行的 Region (左右也裁到笔迹范围)；只有一行时返回空列表"""
+
+    def __init__(self, line_gap=0.2, min_height=10, max_rows=16, ink_delta=48, margin=4):
+        self.line_gap = line_gap
+        self.min_height = min_height
+        self.max_rows = max_rows
+        self.ink_delta = ink_delta
+        self.margin = margin
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            line_gap=cfg.SEGMENT_LINE_GAP,
+            max_rows=cfg.SEGMENT_MAX_ROWS,
+            ink_delta=cfg.DETECT_INK_DELTA,
+        )
+
+    def __call__(self, gray: np.ndarray) -> list:
+        mask = ink_mask(gray, self.ink_delta)
+        starts, ends = line_bands(mask, self.line_gap, self.min_height)
+        # 行数太多 (多半是一段文字) 或者有的 "行" 太矮 (没切干净的上下标)，都整张识别
+        if not 2 <= len(starts) <= self.max_rows or (ends - starts).min() < self.min_height:
+            return []
+
+        height, width = mask.shape
+        m = self.margin
+        rows = []
+        for top, bottom in zip(starts, ends):
+            cols = np.flatnonzero(mask[top:bottom].any(axis=0))
+            x0, y0 = max(0, cols[0] - m), max(0, top - m)
+            x1, y1 = min(width, cols[-1] + 1 + m), min(height, bottom + m)
+            rows.append(Region(int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+        return rows
+
+
+def _align_point(latex):
+    """第一个顶层关系符的位置，没有时返回 -1"""
+    depth = 0
+    i = 0
+    for match in _RELATION.finditer(latex):
+        # 数到这个位置为止的花括号深度 (\{ \} 不算)
+        while i < match.start():
+            if latex[i] == "\\":
+                i += 2
+                continue
+            if latex[i] == "{":
+                depth += 1
+            elif latex[i] == "}":
+                depth -= 1
+            i += 1
+        if depth == 0 and i == match.start():
+            return match.start()
+    return -1
+
+
+def join_rows(rows) -> str:
+    """
+    每行都有顶层的关系符：在第一个关系符前加 & 拼成 aligned (续行以 = 开头也能对齐)；
+    否则拼成 gathered (居中)
+    """
+    rows = [row.strip() for row in rows]
+    points = [_align_point(row) for row in rows]
+    if all(p >= 0 for p in points):
+        body = r" \\ ".join(f"{row[:p].rstrip()} & {row[p:]}".lstrip() for row, p in zip(rows, points))
+        return r"\begin{aligned} " + body + r" \end{aligned}"
+    return r"\begin{gathered} " + r" \\ ".join(rows) + r" \end{gathered}"
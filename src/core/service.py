@@ -0,0 +1,116 @@
+"""
+本机识别服务：让别的程序通过 HTTP (BridgeServer 的 POST /api/recognize) 共用已经预热好的引擎，
+不用每个脚本各自加载一份模型。
+
+准入控制:
+    - 同时在跑的请求最多 max_concurrency 个 (交给 MicroBatcher 凑批)
+    - 再多的请求最多排 max_queue 个，排满了直接拒绝 (HTTP 429)
+    - 每个请求有截止时间，排队或识别超时返回 504；已经送进引擎的图片跑完后结果丢弃
+"""
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from src.core.base_engine import EngineNotReady
+from src.core.timing import StageTimings
+
+
+class ServiceBusy(Exception):
+    """并发和队列都满了"""
+
+
+class ServiceTimeout(Exception):
+    """超过截止时间"""
+
+
+class ServiceUnavailable(Exception):
+    """引擎还没加载好"""
+
+
+class InvalidImage(Exception):
+    """请求体不是能解码的图片"""
+
+
+class RecognitionService:
+    """
+    submit(image_data, timings) -> Future[str]：把一张图交给引擎 (InferenceWorker.submit_async)
+    recognize() 在调用方线程里阻塞等待 (BridgeServer 每个连接一个线程)
+    """
+
+    def __init__(self, submit, max_concurrency=4, max_queue=16, default_deadline_ms=10000.0,
+                 max_deadline_ms=60000.0):
+        self._submit = submit
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.default_deadline_ms = default_deadline_ms
+        self.max_deadline_ms = max_deadline_ms
+        self._admission = threading.BoundedSemaphore(self.max_concurrency + self.max_queue)
+        self._running = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._stats = {"completed": 0, "rejected": 0, "timed_out": 0, "failed": 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def recognize(self, image_data, deadline_ms=None) -> dict:
+        """
+        返回 {"latex", "timings", "meta"}，识别失败时没有 latex、有 error
+        排满抛 ServiceBusy，超时抛 ServiceTimeout，引擎没准备好抛 ServiceUnavailable，图片解码失败抛 InvalidImage
+        """
+        deadline_ms = min(deadline_ms or self.default_deadline_ms, self.max_deadline_ms)
+        t0 = time.perf_counter()
+        deadline = t0 + deadline_ms / 1000
+
+        if not self._admission.acquire(blocking=False):
+            self._count("rejected")
+            raise ServiceBusy("识别服务繁忙")
+        try:
+            if not self._running.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+                self._count("timed_out")
+                raise ServiceTimeout("排队超时")
+            timings = StageTimings()
+            timings.add("queue_wait", (time.perf_counter() - t0) * 1000)
+            try:
+                future = self._submit(image_data, timings)
+            except EngineNotReady as e:
+                self._running.release()
+                raise ServiceUnavailable(str(e))
+            except (OSError, ValueError) as e:
+                # submit 在调用方线程里解码图片：PIL.UnidentifiedImageError 是 OSError 的子类
+                self._running.release()
+                self._count("failed")
+                raise InvalidImage(f"图片无法解码 ({type(e).__name__})")
+            except Exception:
+                self._running.release()
+                self._count("failed")
+                raise
+            # 并发名额在引擎真正跑完时才归还，超时的请求也不会让引擎同时跑更多的图
+            future.add_done_callback(lambda _: self._running.release())
+
+            try:
+                latex = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeout:
+                self._count("timed_out")
+                raise ServiceTimeout("识别超时")
+            except Exception:
+                self._count("failed")
+                raise
+        finally:
+            self._admission.release()
+
+        result = {"timings": {**timings.as_dict(), "total_ms": round((time.perf_counter() - t0) * 1000, 3)},
+                  "meta": timings.meta}
+        # 和 InferenceWorker 一样的结果清洗
+        if not latex:
+            result["error"] = "未能识别出公式"
+        elif "错误" in latex:
+            result["error"] = latex
+        else:
+            result["latex"] = latex
+        self._count("failed" if "error" in result else "completed")
+        return result
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def synthetic_formula(height: int, width: int, seed: int = 0) -> np.ndarray:
+    """
+    生成一张 "像公式" 的灰度图 (白底黑色笔画)：一行符号 + 一条分数线 + 分母。
+    不追求可识别，只用来预热 / 压测，让各个模型跑到和真实截图差不多的尺寸和计算量。
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 255, dtype=np.uint8)
+
+    glyph_h = max(6, height // 4)
+    stroke = max(1, glyph_h // 8)
+    bar_y = height // 2
+
+    # 分数线
+    margin = width // 10
+    img[bar_y - stroke // 2: bar_y + stroke - stroke // 2, margin: width - margin] = 0
+
+    # 分子、分母两行 "字符"：竖笔画 + 横笔画的随机组合
+    for top in (bar_y - glyph_h - 2 * stroke, bar_y + 2 * stroke):
+        x = margin
+        while x + glyph_h < width - margin:
+            glyph_w = int(rng.integers(glyph_h // 2, glyph_h + 1))
+            img[top: top + glyph_h, x: x + stroke] = 0
+            if rng.random() < 0.6:
+                y = top + int(rng.integers(0, glyph_h - stroke + 1))
+                img[y: y + stroke, x: x + glyph_w] = 0
+            if rng.random() < 0.5:
+                img[top: top + glyph_h, x + glyph_w - stroke: x + glyph_w] = 0
+            x += glyph_w + int(rng.integers(stroke * 2, glyph_h // 2 + stroke * 2 + 1))
+    return img
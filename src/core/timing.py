@@ -0,0 +1,96 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class StageTimings:
+    """
+    一次识别各阶段的耗时 (毫秒)，按阶段第一次出现的顺序保存。
+    引擎、工作线程、压测脚本共用：传进 recognize(image, timings) 就会被填上 resize / encode / decode 等阶段。
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.meta = {}  # 非耗时的附加信息，比如解码步数
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - t0) * 1000)
+
+    def add(self, name, ms):
+        """同名阶段累加 (比如 resizer 循环多次)"""
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def total_ms(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return {name: round(ms, 3) for name, ms in self.stages.items()}
+
+    def __repr__(self):
+        parts = ", ".join(f"{name}={ms:.1f}ms" for name, ms in self.stages.items())
+        return f"StageTimings({parts})"
+
+
+class RequestTrace(StageTimings):
+    """
+    一次识别请求从截图到显示的完整耗时记录，跟着请求在 截图 -> 主线程 -> 工作线程 -> 结果窗口 之间传递。
+    阶段: capture, serialize, queue_wait, image_decode, resize, encode, decode, post_process, ui_render
+    同一时刻只有一个线程在写它，不需要加锁。
+    """
+
+    def __init__(self, source, elapsed_ms=0.0):
+        """elapsed_ms: 创建记录之前已经花掉的时间 (比如截图本身)，算进总耗时"""
+        super().__init__()
+        self.source = source
+        self.request_id = None
+        self.created = time.time() - elapsed_ms / 1000
+        self._t0 = time.perf_counter() - elapsed_ms / 1000
+        self._submitted = None
+        self._t_end = None
+
+    def mark_submitted(self, request_id):
+        """主线程登记请求时调用，从这里开始算排队时间"""
+        self.request_id = request_id
+        self._submitted = time.perf_counter()
+
+    def mark_claimed(self):
+        """工作线程开始处理时调用"""
+        if self._submitted is not None:
+            self.add("queue_wait", (time.perf_counter() - self._submitted) * 1000)
+
+    def finish(self, status):
+        self.meta["status"] = status
+        self._t_end = time.perf_counter()
+
+    def span_ms(self):
+        """从创建到 finish 的实际经过时间 (包含各阶段之间线程切换、信号传递的间隙)"""
+        end = self._t_end if self._t_end is not None else time.perf_counter()
+        return (end - self._t0) * 1000
+
+    def summary(self):
+        """给界面显示的一行简要说明"""
+        labels = {"queue_wait": "排队", "preprocess": "预处理", "rows": "分行识别", "resize": "缩放",
+                  "encode": "编码", "decode": "解码", "ui_render": "渲染"}
+        if self.meta.get("resize_mode") == "estimate":
+            labels["resize"] = "缩放(估算)"
+        parts = [f"{label} {self.stages[name]:.0f}" for name, label in labels.items() if name in self.stages]
+        head = f"⏱️ 总 {self.span_ms():.0f}ms"
+        if "first_partial_ms" in self.meta:
+            head += f" (首字 {self.meta['first_partial_ms']:.0f}ms)"
+        return head + " | " + " · ".join(parts)
+
+    def as_record(self):
+        """写日志用的纯 JSON 字典"""
+        return {
+            "ts": datetime.fromtimestamp(self.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "request_id": self.request_id,
+            "source": self.source,
+            "total_ms": round(self.span_ms(), 3),
+            "stages_ms": self.as_dict(),
+            **self.meta,
+        }
@@ -1,7 +1,68 @@
 # src/core/worker.py
 
+import threading
+import time
+from concurrent.futures import Future
 from PyQt6.QtCore import QObject, pyqtSignal, QThread
+from src.core.base_engine import EngineNotReady
 from src.core.factory import create_engine
+from src.core.cache import RecognitionCache
+from src.core.engines.decoding import STOP_EOS
+from src.core.batching import MicroBatcher
+from src.core.image_utils import to_gray_pixels
+from src.core.preprocess import Preprocessor
+from src.core.segmentation import RowSegmenter, join_rows
+from src.core.timing import RequestTrace, StageTimings
+
+# 会改变识别结果的配置：识别缓存按它们的取值分开，改了配置不会再拿到按旧配置识别的结果
+# (预处理在算缓存键之前做，已经体现在像素里了)
+CACHE_KEY_FIELDS = (
+    "DECODE_STRATEGY", "DECODE_BEAM_SIZE", "DECODE_LENGTH_PENALTY", "DECODE_MIN_TOKENS",
+    "DECODE_TOKENS_PER_CELL", "DECODE_LOOP_DETECTION",
+    "SEGMENT_ENABLED", "SEGMENT_LINE_GAP", "SEGMENT_MAX_ROWS",
+    "SCALE_ESTIMATE_ENABLED", "SCALE_ESTIMATE_MIN_SAMPLES", "SCALE_ESTIMATE_MAX_SPREAD",
+    "BATCH_PAD_TOLERANCE", "BATCH_WIDTH_TOLERANCE",
+)
+
+
+class RequestScheduler:
+    """
+    "最新优先" 的请求调度器 (线程安全)。
+    GUI 线程 submit 图片拿到请求 ID，工作线程按 ID claim。
+    只有一个待处理槽位：还没开始的旧请求会被新请求直接顶掉，不再推理。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest_id = 0
+        self._pending = None  # (request_id, payload)
+        self.dropped = 0  # 被顶掉的请求数
+
+    def submit(self, payload) -> int:
+        with self._lock:
+            self._latest_id += 1
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (self._latest_id, payload)
+            return self._latest_id
+
+    def claim(self, request_id):
+        """工作线程开始处理前调用：请求已被顶掉则返回 None"""
+        with self._lock:
+            if self._pending is None or self._pending[0] != request_id:
+                return None
+            payload = self._pending[1]
+            self._pending = None
+            return payload
+
+    def is_latest(self, request_id) -> bool:
+        with self._lock:
+            return request_id == self._latest_id
+
+    @property
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._latest_id
 
 
 class InferenceWorker(QObject):
@@ -11,13 +72,20 @@ class InferenceWorker(QObject):
     """
     # 信号定义
     initialized = pyqtSignal(bool, str)  # 模型加载完毕 (成功/失败, 消息)
-    finished = pyqtSignal(str)  # 推理成功 (LaTeX结果)
-    error = pyqtSignal(str)  # 推理出错 (错误信息)
+    finished = pyqtSignal(int, str)  # 推理成功 (请求ID, LaTeX结果)
+    error = pyqtSignal(int, str)  # 推理出错 (请求ID, 错误信息)
+    traced = pyqtSignal(int, object)  # 分阶段耗时 (请求ID, RequestTrace)，在 finished / error 之前发出
+    partial = pyqtSignal(int, str)  # 解码中的部分结果 (请求ID, 还不完整的 LaTeX)，已节流
 
     def __init__(self, config):
         super().__init__()
         self.cfg = config
         self.engine = None
+        self.cache = None
+        self.batcher = None
+        self.preprocessor = Preprocessor.from_config(config) if config.PREPROCESS_ENABLED else None
+        self.segmenter = RowSegmenter.from_config(config) if config.SEGMENT_ENABLED else None
+        self.scheduler = RequestScheduler()
 
     def init_engine(self):
         """
@@ -26,35 +94,232 @@ class InferenceWorker(QObject):
         print("⚙️ [Worker] 正在后台加载模型...")
         try:
             # 耗时操作：加载 ONNX 模型
-            self.engine = create_engine("rapid", self.cfg)
+            self.engine = create_engine(self.cfg.ENGINE_TYPE, self.cfg)
+            self.cache = self._create_cache()
+            # 多图请求 (连拍、页面分块等) 走批量推理；单张截图仍然走 do_inference
+            self.batcher = MicroBatcher(
+                self._run_batch,
+                max_batch_size=self.cfg.BATCH_MAX_SIZE,
+                max_wait_ms=self.cfg.BATCH_MAX_WAIT_MS,
+            )
             print("✅ [Worker] 模型加载完毕")
-            self.initialized.emit(True, "模型加载成功")
+            self.initialized.emit(True, "模型加载成功" + self._warmup())
         except Exception as e:
             print(f"❌ [Worker] 模型加载失败: {e}")
             self.initialized.emit(False, str(e))
 
-    def do_inference(self, img_bytes):
+    def _warmup(self):
+        """在工作线程里预热模型，返回附加到 initialized 消息里的冷/热耗时说明"""
+        if not self.cfg.WARMUP_ENABLED:
+            return ""
+        try:
+            stats = self.engine.warmup(
+                self.cfg.WARMUP_SIZES,
+                rounds=self.cfg.WARMUP_ROUNDS,
+                decode_steps=self.cfg.WARMUP_DECODE_STEPS,
+            )
+        except Exception as e:
+            # 预热失败不影响正常使用
+            print(f"⚠️ [Worker] 预热失败: {e}")
+            return ""
+        if not stats:
+            return ""
+        print(f"🔥 [Worker] 预热完成: {stats}")
+        return (f" | 预热 {stats['total_ms']:.0f}ms，"
+                f"冷启动 {stats['cold_ms']:.0f}ms → 预热后 {stats['warm_ms']:.0f}ms")
+
+    def _create_cache(self):
+        """缓存的 SQLite 连接要在工作线程里创建"""
+        if not self.cfg.CACHE_ENABLED:
+            return None
+        return RecognitionCache(
+            db_path=self.cfg.DATA_DIR / "cache" / "recognition.sqlite3",
+            namespace=self._cache_namespace(),
+            memory_entries=self.cfg.CACHE_MEMORY_ENTRIES,
+            disk_entries=self.cfg.CACHE_DISK_ENTRIES,
+            max_age_days=self.cfg.CACHE_MAX_AGE_DAYS,
+            perceptual=self.cfg.CACHE_PERCEPTUAL,
+            phash_distance=self.cfg.CACHE_PHASH_DISTANCE,
+        )
+
+    def _cache_namespace(self) -> str:
+        """引擎类型 + 模型文件哈希 + 影响结果的配置：任何一项变了，旧的缓存结果都不会再命中"""
+        settings = ",".join(f"{name}={getattr(self.cfg, name)!r}" for name in CACHE_KEY_FIELDS)
+        return f"{self.cfg.ENGINE_TYPE}|{self.engine.model_digest()}|{settings}"
+
+    def recognize_many(self, images) -> list:
+        """
+        任意线程调用：一次识别多张图片 (阻塞，直到全部完成)，和其它并发的多图请求一起凑批。
+        注意不要在 GUI 线程里调用
+        """
+        futures = [self.submit_async(image) for image in images]
+        return [future.result() for future in futures]
+
+    def submit_async(self, image, timings: StageTimings = None) -> Future:
+        """
+        任意线程调用：把一张图交给批处理线程，返回 Future[str] (不走 "最新优先" 调度，也不查缓存)。
+        解码和预处理在调用方线程里做，timings 会被填上各阶段耗时
+        """
+        if not self.batcher:
+            raise EngineNotReady("引擎尚未初始化")
+        timings = timings if timings is not None else StageTimings()
+        with timings.stage("image_decode"):
+            pixels = to_gray_pixels(image)
+        with timings.stage("preprocess"):
+            pixels = self._prepare(pixels, meta=timings.meta)
+        return self.infer_async(pixels, timings)
+
+    def infer_async(self, pixels, timings: StageTimings = None) -> Future:
+        """任意线程调用：已经解码、预处理好的灰度像素直接交给批处理线程"""
+        if not self.batcher:
+            raise EngineNotReady("引擎尚未初始化")
+        return self.batcher.submit((pixels, timings if timings is not None else StageTimings()))
+
+    def infer_many(self, pixels_list, timings_list=None) -> list:
+        """
+        任意线程调用：一组灰度像素 (多行公式的各行、整屏识别的各个区域) 一起交给批处理线程，
+        保证进同一批 (高度相近的补齐后一次过 encoder / decoder)，返回 Future[str] 列表
+        """
+        if not self.batcher:
+            raise EngineNotReady("引擎尚未初始化")
+        timings_list = timings_list or [StageTimings() for _ in pixels_list]
+        return self.batcher.submit_many(list(zip(pixels_list, timings_list)))
+
+    def _run_batch(self, items):
+        """MicroBatcher 的 run_batch：items 是 (像素, StageTimings)"""
+        return self.engine.recognize_batch([pixels for pixels, _ in items], [t for _, t in items])
+
+    def _prepare(self, pixels, dpr=1.0, meta=None):
+        if self.preprocessor is None:
+            return pixels
+        return self.preprocessor(pixels, dpr=dpr, meta=meta)
+
+    def close(self):
+        if self.batcher:
+            self.batcher.close()
+            self.batcher = None
+
+    def submit(self, image, trace: RequestTrace = None) -> int:
+        """GUI 线程调用：登记一个新请求，返回请求 ID (之后用 ID 触发 do_inference)"""
+        trace = trace or RequestTrace("unknown")
+        request_id = self.scheduler.submit((image, trace))
+        trace.mark_submitted(request_id)
+        return request_id
+
+    def do_inference(self, request_id):
         """
         耗时操作：执行推理
         """
+        payload = self.scheduler.claim(request_id)
+        if payload is None:
+            print(f"⏭️ [Worker] 请求 #{request_id} 已被更新的请求取代，跳过")
+            return
+        image, trace = payload
+        trace.mark_claimed()
+
         if not self.engine:
-            self.error.emit("引擎尚未初始化")
+            self._fail(request_id, trace, "引擎尚未初始化")
             return
 
-        print("⚙️ [Worker] 开始推理...")
+        print(f"⚙️ [Worker] 开始推理 #{request_id}...")
         try:
-            # 这里的 recognize 是阻塞的，但因为我们在子线程，所以主界面不会卡
-            latex = self.engine.recognize(img_bytes)
+            # 截图传来的已经是灰度像素；只有 bytes 才需要解码，缓存和引擎共用同一份像素
+            with trace.stage("image_decode"):
+                pixels = to_gray_pixels(image)
+            trace.meta["width"], trace.meta["height"] = int(pixels.shape[1]), int(pixels.shape[0])
+            trace.meta["engine"] = self.cfg.ENGINE_TYPE
+            # 裁空白、缩小等预处理放在缓存之前：同一个公式截得宽一点窄一点也能命中
+            with trace.stage("preprocess"):
+                pixels = self._prepare(pixels, trace.meta.get("dpr", 1.0), trace.meta)
+
+            key = None
+            if self.cache:
+                with trace.stage("cache_lookup"):
+                    key = self.cache.make_key(pixels)
+                    cached = self.cache.get(key)
+                if cached is not None:
+                    print(f"⚡ [Worker] 命中缓存，跳过推理 | {self.cache.stats()}")
+                    trace.meta["cache_hit"] = True
+                    self.traced.emit(request_id, trace)
+                    self.finished.emit(request_id, cached)
+                    return
+
+            latex = None
+            if self.segmenter:
+                with trace.stage("segment"):
+                    rows = self.segmenter(pixels)
+                if rows:
+                    latex = self._recognize_rows(pixels, rows, trace)
+
+            if latex is None:
+                # 这里的 recognize 是阻塞的，但因为我们在子线程，所以主界面不会卡
+                on_tokens = self._partial_emitter(request_id, trace) if self.cfg.STREAM_PARTIAL_ENABLED else None
+                latex = self.engine.recognize(pixels, trace, on_tokens=on_tokens)
 
             # 简单的结果清洗
             if not latex:
-                self.error.emit("未能识别出公式")
+                self._fail(request_id, trace, "未能识别出公式")
             elif "错误" in latex:
-                self.error.emit(latex)
+                self._fail(request_id, trace, latex)
             else:
-                self.finished.emit(latex)
+                # 被 token 上限 / 循环检测截断的结果不进缓存，不然同一张图以后永远是这个残缺的结果
+                if self.cache and trace.meta.get("stop_reason") == STOP_EOS:
+                    self.cache.put(key, latex)
+                self.traced.emit(request_id, trace)
+                self.finished.emit(request_id, latex)
 
         except Exception as e:
             import traceback
             traceback.print_exc()
-            self.error.emit(f"推理过程异常: {str(e)}")
\ No newline at end of file
+            self._fail(request_id, trace, f"推理过程异常: {str(e)}")
+
+    def _recognize_rows(self, pixels, rows, trace):
+        """
+        多行公式：各行按原尺寸作为一组送进批处理线程，高度相近的行补齐宽度后一次过 encoder / decoder，
+        结果拼成 aligned / gathered。
+        有一行识别失败就返回 None，改为整张识别
+        """
+        row_timings = [StageTimings() for _ in rows]
+        with trace.stage("rows"):
+            futures = self.infer_many([pixels[r.y:r.y + r.h, r.x:r.x + r.w] for r in rows], row_timings)
+            texts = [future.result() for future in futures]
+        trace.meta["rows"] = len(rows)
+        # 有一行被截断，整条结果就算截断
+        reasons = [t.meta.get("stop_reason") for t in row_timings]
+        trace.meta["stop_reason"] = next((r for r in reasons if r != STOP_EOS), STOP_EOS)
+        if any(not text or "错误" in text for text in texts):
+            print(f"⚠️ [Worker] 分行识别失败，改为整张识别: {texts}")
+            trace.meta["rows_fallback"] = True
+            return None
+        return join_rows(texts)
+
+    def _partial_emitter(self, request_id, trace):
+        """
+        生成传给引擎的 on_tokens 回调：每解码一步都会被调用，
+        但只有距离上次发出超过 STREAM_PARTIAL_INTERVAL_MS 时才转成文字并发 partial 信号 (第一个 token 立刻发)
+        """
+        interval = self.cfg.STREAM_PARTIAL_INTERVAL_MS / 1000
+        last_emit = -interval
+
+        def on_tokens(tokens):
+            nonlocal last_emit
+            now = time.perf_counter()
+            if now - last_emit < interval:
+                return
+            # 已经有更新的请求了，旧请求的中间结果没必要再显示
+            if not self.scheduler.is_latest(request_id):
+                return
+            text = self.engine.tokens_to_latex(tokens)
+            if not text:
+                return
+            last_emit = now
+            if "first_partial_ms" not in trace.meta:
+                trace.meta["first_partial_ms"] = round(trace.span_ms(), 1)
+            self.partial.emit(request_id, text)
+
+        return on_tokens
+
+    def _fail(self, request_id, trace, message):
+        trace.meta["error"] = message
+        self.traced.emit(request_id, trace)
+        self.error.emit(request_id, message)
\ No newline at end of file
@@ -0,0 +1,50 @@
+import time
+
+
+class StartupProfiler:
+    """
+    启动阶段计时器。
+    用 `python main.py --profile-startup` 启动时，等所有阶段 (包括异步的网页加载、模型加载) 结束后打印耗时表。
+    不开启时 begin/end 只记一下时间戳，几乎没有开销。
+    """
+
+    def __init__(self, enabled=False, expected=()):
+        self.enabled = enabled
+        self.t0 = time.perf_counter()
+        self._start = {}
+        self._end = {}
+        self._order = []
+        # 这些阶段都结束后才打印 (异步阶段结束的先后顺序不确定)
+        self._expected = set(expected)
+        self._reported = False
+
+    def begin(self, name):
+        if name not in self._start:
+            self._order.append(name)
+        self._start[name] = time.perf_counter()
+
+    def end(self, name):
+        if name not in self._start or name in self._end:
+            return
+        self._end[name] = time.perf_counter()
+        if self.enabled and not self._reported and self._expected.issubset(self._end):
+            self.report()
+
+    def elapsed_ms(self, name):
+        if name not in self._end:
+            return None
+        return (self._end[name] - self._start[name]) * 1000
+
+    def report(self):
+        self._reported = True
+        print("")
+        print("⏱️ 启动耗时 (从 main.py 开始执行时计时)")
+        print(f"  {'阶段':<26}{'开始(ms)':>10}{'耗时(ms)':>10}{'结束(ms)':>10}")
+        for name in self._order:
+            start = (self._start[name] - self.t0) * 1000
+            if name in self._end:
+                end = (self._end[name] - self.t0) * 1000
+                print(f"  {name:<26}{start:>10.1f}{end - start:>10.1f}{end:>10.1f}")
+            else:
+                print(f"  {name:<26}{start:>10.1f}{'-':>10}{'-':>10}")
+        print("")
@@ -1,20 +1,27 @@
 from PyQt6.QtCore import QObject, pyqtSignal, QTimer
 from src.sources.server import BridgeServer
-from src.ui.qr_window import QRWindow
 from src.ui.image_editor import ImageEditor
 
 
 class MobileSource(QObject):
-    # 对外唯一的信号：产出最终图片
-    captured = pyqtSignal(bytes)
+    # 对外唯一的信号：产出最终图片 (灰度像素数组, RequestTrace)
+    captured = pyqtSignal(object, object)
+    # 连拍：照片原始字节直接交给识别流水线；按需编辑后的结果 (照片 ID, 灰度像素数组)
+    burst_received = pyqtSignal(bytes)
+    burst_edited = pyqtSignal(int, object)
 
     def __init__(self, config):
         super().__init__()
         self.cfg = config
 
         # 1. 内部组件：服务器
-        self.server = BridgeServer(self.cfg.TEMPLATES_DIR, port=8989)
+        self.server = BridgeServer(self.cfg.TEMPLATES_DIR, port=8989, upload_config={
+            "max_side": self.cfg.UPLOAD_MAX_SIDE,
+            "quality": self.cfg.UPLOAD_QUALITY,
+            "formats": list(self.cfg.UPLOAD_FORMATS),
+        }, max_upload_bytes=self.cfg.UPLOAD_MAX_BYTES)
         self.server.signals.image_received.connect(self._on_raw_image_received)
+        self.server.signals.burst_received.connect(self._on_burst_image_received)
 
         # 2. 内部组件：编辑器
         self.editor = ImageEditor()
@@ -22,6 +29,8 @@ class MobileSource(QObject):
 
         # 3. 内部状态：二维码窗口引用
         self.qr_window = None
+        # 编辑器正在编辑的连拍照片 ID (None 表示普通的单张上传)
+        self._editing_item = None
 
     def start(self):
         """外部调用此方法，启动手机流程"""
@@ -33,13 +42,21 @@ class MobileSource(QObject):
             self.editor.activateWindow()
             return
 
-        # 弹出二维码
+        # 弹出二维码 (qrcode 库只在第一次用到时才导入)
+        from src.ui.qr_window import QRWindow
         if self.qr_window:
             self.qr_window.close()
 
         self.qr_window = QRWindow(url)
         self.qr_window.show()
 
+    def enable_api(self, service, loopback_only=True):
+        """打开 POST /api/recognize (src/core/service.py)，服务器随之启动"""
+        self.server.enable_api(service, loopback_only)
+        url = self.server.start()
+        scope = "仅本机" if loopback_only else "局域网"
+        print(f"🔌 [API] 识别接口已开启 ({scope}): POST {url}/api/recognize")
+
     def _on_raw_image_received(self, raw_bytes):
         """内部逻辑：收到手机传来的原始图片"""
         print("📱 MobileSource: 收到原始图片，启动编辑器...")
@@ -50,10 +67,27 @@ class MobileSource(QObject):
             self.qr_window = None
 
         # 2. 打开编辑器让用户修图
+        self._editing_item = None
         self.editor.set_image(raw_bytes)
 
-    def _on_editor_confirmed(self, final_bytes):
+    def _on_burst_image_received(self, raw_bytes):
+        """连拍模式：不弹编辑器，二维码也关掉"""
+        if self.qr_window:
+            self.qr_window.close()
+            self.qr_window = None
+        self.burst_received.emit(raw_bytes)
+
+    def edit_burst(self, item_id, image):
+        """结果列表里点了 "编辑"：用同一个编辑器，确认后发 burst_edited (image 是照片 bytes 或整屏识别裁出的像素)"""
+        self._editing_item = item_id
+        self.editor.set_image(image)
+
+    def _on_editor_confirmed(self, pixels, trace):
         """内部逻辑：用户编辑完成"""
+        if self._editing_item is not None:
+            item_id, self._editing_item = self._editing_item, None
+            self.burst_edited.emit(item_id, pixels)
+            return
         print("✅ MobileSource: 图片编辑完成，对外发射信号")
         # 3. 发射最终信号
-        self.captured.emit(final_bytes)
\ No newline at end of file
+        self.captured.emit(pixels, trace)
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+流式 multipart/form-data 解析 (替代 Python 3.13 里已经删掉的 cgi 模块)。
+请求体按块读取，不会整个读进内存：文件部分写进 SpooledTemporaryFile (小的留在内存，大的自动落盘)，
+普通字段有单独的大小上限。
+"""
+import tempfile
+from email.message import Message
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024  # 每个部分的头最多这么大
+MAX_FIELD_SIZE = 64 * 1024  # 非文件字段最多这么大
+
+
+class MultipartError(ValueError):
+    """请求体格式不对"""
+
+
+class UploadTooLarge(MultipartError):
+    """请求体超过大小上限"""
+
+
+def parse_header(value):
+    """
+    'multipart/form-data; boundary=xyz' -> ('multipart/form-data', {'boundary': 'xyz'})
+    (cgi.parse_header 的替代)
+    """
+    msg = Message()
+    msg["content-type"] = value or ""
+    params = msg.get_params() or []
+    main = params[0][0].lower() if params else ""
+    return main, {k.lower(): v for k, v in params[1:]}
+
+
+class Part:
+    """multipart 里的一个部分；文件部分的内容在 file 里，普通字段在 value 里"""
+
+    def __init__(self, headers, spool_size):
+        self.headers = headers
+        disposition, params = parse_header(headers.get("content-disposition", ""))
+        self.name = params.get("name")
+        self.filename = params.get("filename")
+        self.content_type = headers.get("content-type", "text/plain")
+        self.size = 0
+        if self.filename is not None:
+            self.file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+            self._chunks = None
+        else:
+            self.file = None
+            self._chunks = []
+
+    def _write(self, data):
+        if not data:
+            return
+        self.size += len(data)
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            if self.size > MAX_FIELD_SIZE:
+                raise UploadTooLarge(f"字段 {self.name} 超过 {MAX_FIELD_SIZE} 字节")
+            self._chunks.append(data)
+
+    def _finish(self):
+        if self.file is not None:
+            self.file.seek(0)
+
+    @property
+    def value(self) -> bytes:
+        return b"".join(self._chunks) if self._chunks is not None else self.read()
+
+    def text(self, encoding="utf-8") -> str:
+        return self.value.decode(encoding, errors="replace")
+
+    def read(self) -> bytes:
+        if self.file is None:
+            return self.value
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class MultipartForm:
+    """解析结果：按字段名取 Part；用完 close() 释放临时文件 (也可以用 with)"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def get(self, name):
+        for part in self.parts:
+            if part.name == name:
+                return part
+        return None
+
+    def value(self, name, default=None):
+        part = self.get(name)
+        return part.text() if part is not None else default
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _parse_part_headers(raw):
+    headers = {}
+    for line in raw.split(b"\r\n"):
+        if not line:
+            continue
+        key, sep, value = line.partition(b":")
+        if not sep:
+            raise MultipartError("部分头格式错误")
+        headers[key.strip().decode("latin-1").lower()] = value.strip().decode("utf-8", errors="replace")
+    return headers
+
+
+def parse_multipart(stream, content_type, content_length, max_size, spool_size=1024 * 1024,
+                    chunk_size=CHUNK_SIZE) -> MultipartForm:
+    """
+    从 stream (比如 BaseHTTPRequestHandler.rfile) 读取恰好 content_length 字节并解析。
+    content_length 超过 max_size 时直接抛 UploadTooLarge，一个字节都不读。
+    """
+    ctype, params = parse_header(content_type)
+    boundary = params.get("boundary")
+    if ctype != "multipart/form-data" or not boundary:
+        raise MultipartError("不是 multipart/form-data 请求")
+    if content_length is None or content_length < 0:
+        raise MultipartError("缺少 Content-Length")
+    if content_length > max_size:
+        raise UploadTooLarge(f"请求体 {content_length} 字节，超过上限 {max_size}")
+
+    # 在开头补一个 CRLF，第一个分隔符就和后面的一样都是 CRLF--boundary
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    remaining = content_length
+    buffer = b"\r\n"
+    parts, part = [], None
+    state = "preamble"  # preamble -> after_delimiter -> headers -> body -> after_delimiter ... -> done
+
+    def fill():
+        nonlocal buffer, remaining
+        if remaining <= 0:
+            return False
+        data = stream.read(min(chunk_size, remaining))
+        if not data:
+            raise MultipartError("请求体提前结束")
+        remaining -= len(data)
+        buffer += data
+        return True
+
+    try:
+        while state != "done":
+            if state in ("preamble", "body"):
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    if part is not None:
+                        part._write(buffer[:index])
+                        part._finish()
+                        part = None
+                    buffer = buffer[index + len(delimiter):]
+                    state = "after_delimiter"
+                    continue
+                # 没找到分隔符：末尾可能是半个分隔符，留着等下一块
+                keep = len(delimiter) - 1
+                if part is not None and len(buffer) > keep:
+                    part._write(buffer[:-keep])
+                    buffer = buffer[-keep:]
+                elif part is None:
+                    buffer = buffer[-keep:]
+                if not fill():
+                    raise MultipartError("找不到结束分隔符")
+            elif state == "after_delimiter":
+                if len(buffer) < 2 and not fill():
+                    raise MultipartError("请求体提前结束")
+                if len(buffer) < 2:
+                    continue
+                if buffer.startswith(b"--"):
+                    state = "done"
+                elif buffer.startswith(b"\r\n"):
+                    buffer = buffer[2:]
+                    state = "headers"
+                else:
+                    raise MultipartError("分隔符后面的格式错误")
+            elif state == "headers":
+                index = buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise MultipartError("部分头太长")
+                    if not fill():
+                        raise MultipartError("请求体提前结束")
+                    continue
+                part = Part(_parse_part_headers(buffer[:index]), spool_size)
+                parts.append(part)
+                buffer = buffer[index + 4:]
+                state = "body"
+
+        # 结束分隔符后面的内容 (epilogue) 读掉丢弃，保持 keep-alive 连接上的数据对齐
+        while remaining > 0:
+            data = stream.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+    except Exception:
+        for p in parts:
+            p.close()
+        raise
+    return MultipartForm(parts)
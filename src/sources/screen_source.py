@@ -1,6 +1,10 @@
+import time
+
 from PyQt6.QtWidgets import QWidget, QApplication
-from PyQt6.QtCore import Qt, pyqtSignal, QRect, QBuffer, QIODevice, QPoint, QObject
-from PyQt6.QtGui import QPainter, QColor, QPen, QPixmap
+from PyQt6.QtCore import Qt, pyqtSignal, QRect, QBuffer, QIODevice, QPoint, QObject, QTimer
+from PyQt6.QtGui import QPainter, QColor, QPen, QPixmap, QCursor
+from src.core.image_utils import qimage_to_gray, dump_debug_image
+from src.core.timing import RequestTrace
 
 
 class SnipperOverlay(QWidget):
@@ -8,8 +12,8 @@ class SnipperOverlay(QWidget):
     单个屏幕的遮罩层。
     有多少个屏幕，就实例化多少个这个类。
     """
-    # 内部信号，通知管理器截图完成了
-    finished = pyqtSignal(QPixmap)
+    # 内部信号，通知管理器截图完成了 (截图, grabWindow 耗时 ms)
+    finished = pyqtSignal(QPixmap, float)
 
     def __init__(self, screen):
         super().__init__()
@@ -50,7 +54,7 @@ class SnipperOverlay(QWidget):
     def keyPressEvent(self, event):
         # 按 Esc 取消 (发送一个空图作为取消信号)
         if event.key() == Qt.Key.Key_Escape:
-            self.finished.emit(QPixmap())
+            self.finished.emit(QPixmap(), 0.0)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -60,7 +64,7 @@ class SnipperOverlay(QWidget):
             self.is_selecting = True
             self.update()
         elif event.button() == Qt.MouseButton.RightButton:
-            self.finished.emit(QPixmap())  # 右键取消
+            self.finished.emit(QPixmap(), 0.0)  # 右键取消
 
     def mouseMoveEvent(self, event):
         if self.is_selecting:
@@ -77,19 +81,21 @@ class SnipperOverlay(QWidget):
             # 防误触
             if rect.width() < 5 or rect.height() < 5:
                 # 认为是取消
-                self.finished.emit(QPixmap())
+                self.finished.emit(QPixmap(), 0.0)
                 return
 
             # 2. ✅ 核心修复：直接截取当前屏幕的指定逻辑区域
             # Qt会自动处理 DPI 换算，不需要我们手动乘 ratio 了
             # grabWindow 的参数是 (windowId, x, y, w, h)
+            t0 = time.perf_counter()
             cropped_pixmap = self.screen_handle.grabWindow(
                 0,
                 rect.x(), rect.y(), rect.width(), rect.height()
             )
+            grab_ms = (time.perf_counter() - t0) * 1000
 
             # 发送截图结果给管理器
-            self.finished.emit(cropped_pixmap)
+            self.finished.emit(cropped_pixmap, grab_ms)
 
     def paintEvent(self, event):
         """绘图逻辑 (和之前一样，挖空法)"""
@@ -113,11 +119,14 @@ class SnipperOverlay(QWidget):
 # 管理器类 (对外提供接口)
 # ==========================================
 class SnipperManager(QObject):
-    # 对外的信号：传出最终的 bytes
-    captured = pyqtSignal(bytes)
+    # 对外的信号：传出灰度像素数组 (numpy)，序列化失败时退回 PNG bytes；第二个参数是 RequestTrace
+    captured = pyqtSignal(object, object)
+    # 整屏识别：鼠标所在屏幕的整张截图 (灰度像素数组, RequestTrace)
+    page_captured = pyqtSignal(object, object)
 
-    def __init__(self):
+    def __init__(self, config):
         super().__init__()
+        self.cfg = config
         self.overlays = []  # 存放所有屏幕的遮罩窗口
 
     def start(self):
@@ -136,6 +145,24 @@ class SnipperManager(QObject):
             overlay.raise_()
             self.overlays.append(overlay)
 
+    def grab_page(self, delay_ms=250):
+        """整屏识别：等托盘菜单收起来再截取鼠标所在的整个屏幕"""
+        QTimer.singleShot(delay_ms, self._grab_page)
+
+    def _grab_page(self):
+        screen = QApplication.screenAt(QCursor.pos()) or QApplication.primaryScreen()
+        trace = RequestTrace("page")
+        with trace.stage("capture"):
+            pixmap = screen.grabWindow(0)
+            image = pixmap.toImage()
+        if pixmap.isNull():
+            print("❌ 整屏截图失败")
+            return
+        trace.meta["dpr"] = pixmap.devicePixelRatio()
+        with trace.stage("serialize"):
+            pixels = qimage_to_gray(image)
+        self.page_captured.emit(pixels, trace)
+
     def cleanup(self):
         """关闭并清理所有遮罩"""
         for overlay in self.overlays:
@@ -143,7 +170,7 @@ class SnipperManager(QObject):
             overlay.deleteLater()
         self.overlays.clear()
 
-    def _on_overlay_finished(self, pixmap):
+    def _on_overlay_finished(self, pixmap, grab_ms):
         """当任何一个遮罩完成截图（或取消）时触发"""
         # 1. 不管成功失败，先清理所有屏幕的遮罩
         self.cleanup()
@@ -153,20 +180,35 @@ class SnipperManager(QObject):
             print("截图已取消")
             return
 
-        # ✅ 【调试复活】保存图片看看对不对
-        debug_path = r"temp/debug_final_capture.png"
-        pixmap.save(debug_path)
-        print(f"【调试】截图已保存到temp目录: {debug_path}")
-
-        # 3. 转 bytes 发射
-        self._emit_bytes(pixmap)
+        trace = RequestTrace("screen", elapsed_ms=grab_ms)
+        trace.add("capture", grab_ms)
+        with trace.stage("capture"):
+            image = pixmap.toImage()
+        trace.meta["dpr"] = pixmap.devicePixelRatio()
+
+        # 调试开关：后台线程保存截图，不拖慢识别
+        if self.cfg.DEBUG_DUMP_CAPTURES:
+            dump_debug_image(image, self.cfg.DATA_DIR / "debug" / "debug_final_capture.png")
+
+        # 3. 直接发射像素数组 (不做 PNG 编码)
+        self._emit_pixels(image, pixmap, trace)
+
+    def _emit_pixels(self, image, pixmap, trace):
+        """QImage -> 灰度 numpy 数组；万一失败再退回 PNG bytes"""
+        try:
+            with trace.stage("serialize"):
+                pixels = qimage_to_gray(image)
+        except Exception as e:
+            print(f"⚠️ 像素转换失败，改用 PNG: {e}")
+        else:
+            self.captured.emit(pixels, trace)
+            return
 
-    def _emit_bytes(self, pixmap):
-        """序列化 QPixmap -> bytes"""
-        ba = QBuffer()
-        ba.open(QIODevice.OpenModeFlag.WriteOnly)
-        success = pixmap.save(ba, "PNG")
+        with trace.stage("serialize"):
+            ba = QBuffer()
+            ba.open(QIODevice.OpenModeFlag.WriteOnly)
+            success = pixmap.save(ba, "PNG")
         if success:
-            self.captured.emit(bytes(ba.data()))
+            self.captured.emit(bytes(ba.data()), trace)
         else:
             print("❌ 图片序列化失败")
@@ -1,59 +1,239 @@
+import gzip
+import hashlib
 import http.server
-import socketserver
+import ipaddress
+import json
+import os
 import socket
 import threading
-import cgi
 from pathlib import Path
 from PyQt6.QtCore import QObject, pyqtSignal
+from src.core.service import InvalidImage, ServiceBusy, ServiceTimeout, ServiceUnavailable
+from src.sources.multipart import MultipartError, UploadTooLarge, parse_multipart
 
 
 class ServerSignals(QObject):
     image_received = pyqtSignal(bytes)
+    burst_received = pyqtSignal(bytes)  # 连拍模式上传的照片 (不弹编辑器，直接进流水线)
+
+
+class StaticCache:
+    """
+    静态页面的内存缓存：文件内容、gzip 压缩版本和 ETag 只在文件变化 (mtime/大小) 时重新生成
+    """
+
+    CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".js": "application/javascript; charset=utf-8",
+                     ".css": "text/css; charset=utf-8"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # 路径 -> (stat 签名, 条目)
+
+    def get(self, path: Path):
+        """返回 {"body", "gzip", "etag", "content_type"}，文件不存在时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        with open(path, "rb") as f:
+            body = f.read()
+        entry = {
+            "body": body,
+            "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+            "etag": '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"',
+            "content_type": self.CONTENT_TYPES.get(path.suffix, "application/octet-stream"),
+        }
+        with self._lock:
+            self._entries[path] = (signature, entry)
+        return entry
 
 
 class MobileHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1：支持 keep-alive (每个响应都必须带 Content-Length)
+    protocol_version = "HTTP/1.1"
+    # 慢连接 / 空闲的 keep-alive 连接最多占用一个线程这么久
+    timeout = 30
+
     # 静态变量，存储 HTML 路径
     HTML_PATH = None
+    # 下发给上传页面的压缩参数 (长边、质量、格式优先级)
+    UPLOAD_CONFIG = {}
+    # 上传请求体的大小上限 (字节)
+    MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+    STATIC = StaticCache()
+    # POST /api/recognize 背后的 RecognitionService (None 表示没开启)
+    API = None
+    API_LOOPBACK_ONLY = True
 
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-type", "text/html; charset=utf-8")
+    def _send_body(self, status, body: bytes, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
 
-        # ✅ 【调试代码】打印出它在找的绝对路径
-        # print(f"🔍 [Server] 正在寻找 HTML 文件: {self.HTML_PATH}")
-        # if self.HTML_PATH:
-        #     print(f"   -> 文件是否存在? {self.HTML_PATH.exists()}")
+    def _send_json(self, status, data, headers=None):
+        self._send_body(status, json.dumps(data).encode("utf-8"), "application/json", headers)
 
-        # ✅ 读取 HTML 文件
-        if self.HTML_PATH and self.HTML_PATH.exists():
-            with open(self.HTML_PATH, "rb") as f:
-                self.wfile.write(f.read())
-        else:
-            self.wfile.write(b"Error: HTML file not found.")
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/upload-config":
+            self._send_json(200, self.UPLOAD_CONFIG, {"Cache-Control": "no-store"})
+            return
+        if path not in ("/", "/index.html", "/upload.html"):
+            self._send_body(404, b"Not Found", "text/plain; charset=utf-8")
+            return
+
+        entry = self.STATIC.get(self.HTML_PATH) if self.HTML_PATH else None
+        if entry is None:
+            self._send_body(404, b"Error: HTML file not found.", "text/plain; charset=utf-8")
+            return
+
+        headers = {"ETag": entry["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if entry["etag"] in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = entry["body"]
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = entry["gzip"]
+            headers["Content-Encoding"] = "gzip"
+        self._send_body(200, body, entry["content_type"], headers)
+
+    do_HEAD = do_GET
 
     def do_POST(self):
-        ctype, pdict = cgi.parse_header(self.headers.get('content-type'))
-        if ctype == 'multipart/form-data':
-            pdict['boundary'] = bytes(pdict['boundary'], "utf-8")
-            fields = cgi.parse_multipart(self.rfile, pdict)
-
-            if 'file' in fields:
-                img_data = fields['file'][0]
-                if hasattr(self.server, 'signals'):
-                    self.server.signals.image_received.emit(img_data)
-
-                self.send_response(200)
-                self.end_headers()
-                self.wfile.write("OK".encode('utf-8'))
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self._send_body(411, b"Length Required", "text/plain; charset=utf-8", {"Connection": "close"})
+            return
+        if self.path.split("?", 1)[0] == "/api/recognize":
+            self._handle_api(int(length))
+            return
+
+        try:
+            form = parse_multipart(self.rfile, self.headers.get("Content-Type"), int(length),
+                                   max_size=self.MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            # 请求体没读完，这个连接不能再复用
+            print(f"⚠️ [Server] 上传被拒绝: {e}")
+            self.close_connection = True
+            self._send_json(413, {"ok": False, "error": "图片太大"}, {"Connection": "close"})
+            return
+        except MultipartError as e:
+            print(f"⚠️ [Server] 上传格式错误: {e}")
+            self.close_connection = True
+            try:
+                self._send_json(400, {"ok": False, "error": str(e)}, {"Connection": "close"})
+            except OSError:
+                pass  # 手机那边已经断开了
+            return
+        except OSError as e:
+            # 读超时 (手机网络断了) 或连接被重置
+            print(f"⚠️ [Server] 上传中断: {e}")
+            self.close_connection = True
+            return
+
+        with form:
+            part = form.get("file")
+            if part is None or part.filename is None:
+                self._send_json(400, {"ok": False, "error": "缺少 file 字段"})
                 return
+            img_data = part.read()
+            report = self._upload_report(form, len(img_data))
+            burst = form.value("burst") == "1"
 
-        self.send_response(400)
-        self.end_headers()
+        if hasattr(self.server, 'signals'):
+            if burst:
+                self.server.signals.burst_received.emit(img_data)
+            else:
+                self.server.signals.image_received.emit(img_data)
+        self._send_json(200, report)
+
+    def _handle_api(self, length):
+        """请求体是图片原始字节；返回 {"latex", "timings", "meta"}，失败时 {"error"}"""
+        if self.API is None:
+            self.close_connection = True
+            self._send_json(404, {"error": "识别接口未开启"}, {"Connection": "close"})
+            return
+        if self.API_LOOPBACK_ONLY and not ipaddress.ip_address(self.client_address[0]).is_loopback:
+            self.close_connection = True
+            self._send_json(403, {"error": "只接受本机请求"}, {"Connection": "close"})
+            return
+        if length > self.MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": "图片太大"}, {"Connection": "close"})
+            return
+        try:
+            data = self.rfile.read(length)
+        except OSError as e:
+            print(f"⚠️ [API] 请求中断: {e}")
+            self.close_connection = True
+            return
+        if len(data) < length:
+            self.close_connection = True
+            return
+        if not data:
+            self._send_json(400, {"error": "请求体为空"})
+            return
+
+        try:
+            deadline_ms = float(self.headers.get("X-Deadline-Ms", 0)) or None
+        except ValueError:
+            deadline_ms = None
+        try:
+            result = self.API.recognize(data, deadline_ms)
+        except ServiceBusy as e:
+            self._send_json(429, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except ServiceTimeout as e:
+            self._send_json(504, {"error": str(e)})
+            return
+        except ServiceUnavailable as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "5"})
+            return
+        except InvalidImage as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"❌ [API] 识别异常: {e}")
+            self._send_json(500, {"error": f"识别过程异常: {e}"})
+            return
+        self._send_json(200 if "latex" in result else 422, result)
+
+    @staticmethod
+    def _upload_report(form, received):
+        """页面会带上原图大小 (original_size)，算出手机端压缩省下的流量"""
+        try:
+            original = int(form.value("original_size", "0"))
+        except ValueError:
+            original = 0
+        original = max(original, received)
+        saved = original - received
+        if saved > 0:
+            print(f"📉 [Server] 收到 {received / 1024:.0f}KB "
+                  f"({form.value('format', '?')})，原图 {original / 1024:.0f}KB，节省 {saved / 1024:.0f}KB")
+        else:
+            print(f"📥 [Server] 收到原图 {received / 1024:.0f}KB")
+        return {"ok": True, "received": received, "original": original, "saved": saved}
 
 
 class BridgeServer:
-    def __init__(self, templates_dir: Path, port=8989):
+    def __init__(self, templates_dir: Path, port=8989, upload_config=None, max_upload_bytes=None):
         self.port = port
         self.signals = ServerSignals()
         self.httpd = None
@@ -61,6 +241,13 @@ class BridgeServer:
 
         # ✅ 把 HTML 路径传给 Handler 类
         MobileHandler.HTML_PATH = templates_dir / "upload.html"
+        MobileHandler.UPLOAD_CONFIG = upload_config or {}
+        if max_upload_bytes:
+            MobileHandler.MAX_UPLOAD_BYTES = max_upload_bytes
+
+    def enable_api(self, service, loopback_only=True):
+        MobileHandler.API = service
+        MobileHandler.API_LOOPBACK_ONLY = loopback_only
 
     def get_local_ip(self):
         try:
@@ -76,8 +263,10 @@ class BridgeServer:
         if self.httpd:
             return self._get_url()
 
-        socketserver.TCPServer.allow_reuse_address = True
-        self.httpd = socketserver.TCPServer(("", self.port), MobileHandler)
+        # 每个连接一个线程：一台网速慢的手机不会卡住别的请求
+        http.server.ThreadingHTTPServer.allow_reuse_address = True
+        self.httpd = http.server.ThreadingHTTPServer(("", self.port), MobileHandler)
+        self.httpd.daemon_threads = True
         self.httpd.signals = self.signals
 
         self.thread = threading.Thread(target=self.httpd.serve_forever)
@@ -94,4 +283,4 @@ class BridgeServer:
         if self.httpd:
             self.httpd.shutdown()
             self.httpd.server_close()
-            self.httpd = None
\ No newline at end of file
+            self.httpd = None
@@ -0,0 +1,118 @@
+import time
+
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QListWidget,
+                             QListWidgetItem, QPushButton)
+from PyQt6.QtCore import Qt, QSize, QTimer
+from PyQt6.QtGui import QImage, QPixmap, QIcon
+
+SOURCE_TEXT = {"screen": "截图", "mobile": "手机", "burst": "连拍", "page": "整屏"}
+
+
+def _icon(thumbnail):
+    width, height, data = thumbnail
+    image = QImage(data, width, height, width, QImage.Format.Format_Grayscale8)
+    return QIcon(QPixmap.fromImage(image))  # fromImage 会复制像素，data 可以释放
+
+
+class HistoryWindow(QWidget):
+    """
+    识别历史：输入框搜索 (停止输入 200ms 后才查)，列表滚到底时再加载下一页。
+    查询走索引、每页只取 page_size 条，十几万条记录也不会卡界面
+    """
+
+    def __init__(self, store, page_size=50, thumb_height=40):
+        super().__init__()
+        self.store = store
+        self.page_size = page_size
+        self.setWindowTitle("识别历史 - TeXFE")
+        self.resize(640, 560)
+        self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint)
+
+        self._query = ""
+        self._last_id = None  # keyset 分页的游标
+        self._exhausted = False
+
+        layout = QVBoxLayout()
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("🔍 搜索 LaTeX (比如 \\frac、x^2)")
+        self.search.setClearButtonEnabled(True)
+        layout.addWidget(self.search)
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(200)
+        self._debounce.timeout.connect(self.reload)
+        self.search.textChanged.connect(lambda _: self._debounce.start())
+
+        self.list = QListWidget()
+        self.list.setIconSize(QSize(thumb_height * 6, thumb_height))
+        self.list.setUniformItemSizes(True)
+        self.list.itemDoubleClicked.connect(self._copy)
+        self.list.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        layout.addWidget(self.list, 1)
+
+        bottom = QHBoxLayout()
+        self.lbl_status = QLabel()
+        self.lbl_status.setStyleSheet("color: #666; font-size: 12px;")
+        btn_copy = QPushButton("📋 复制")
+        btn_copy.clicked.connect(lambda: self._copy(self.list.currentItem()))
+        bottom.addWidget(self.lbl_status, 1)
+        bottom.addWidget(btn_copy)
+        layout.addLayout(bottom)
+        self.setLayout(layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 每次打开都从最新的开始 (期间可能又识别了新公式)
+        self.reload()
+        self.search.setFocus()
+
+    def reload(self):
+        self._query = self.search.text().strip()
+        self._last_id = None
+        self._exhausted = False
+        self.list.clear()
+        self._load_more()
+
+    def _load_more(self):
+        if self._exhausted:
+            return
+        t0 = time.perf_counter()
+        entries = self.store.page(self._query, before_id=self._last_id, limit=self.page_size)
+        for entry in entries:
+            created = time.strftime("%m-%d %H:%M", time.localtime(entry.created))
+            row = QListWidgetItem(f"{created} · {SOURCE_TEXT.get(entry.source, entry.source)}\n{entry.latex}")
+            row.setData(Qt.ItemDataRole.UserRole, entry.latex)
+            row.setToolTip(entry.latex)
+            if entry.thumbnail is not None:
+                row.setIcon(_icon(entry.thumbnail))
+            self.list.addItem(row)
+        if entries:
+            self._last_id = entries[-1].id
+        self._exhausted = len(entries) < self.page_size
+
+        ms = (time.perf_counter() - t0) * 1000
+        scope = f"匹配 \"{self._query}\"" if self._query else f"共 {self.store.count()} 条"
+        self.lbl_status.setText(f"{scope}，已加载 {self.list.count()} 条 ({ms:.0f}ms)")
+
+    def _on_scroll(self, value):
+        if value >= self.list.verticalScrollBar().maximum() - 2:
+            self._load_more()
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            self._copy(self.list.currentItem() or self.list.item(0))
+        elif event.key() == Qt.Key.Key_Escape:
+            self.close()
+        elif event.key() == Qt.Key.Key_Down and self.search.hasFocus():
+            self.list.setFocus()
+            self.list.setCurrentRow(0)
+        else:
+            super().keyPressEvent(event)
+
+    def _copy(self, row):
+        if row is None:
+            return
+        import pyperclip
+        pyperclip.copy(row.data(Qt.ItemDataRole.UserRole))
+        self.lbl_status.setText("✅ 已复制到剪贴板")
@@ -1,29 +1,84 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
-                             QPushButton, QScrollArea, QSizePolicy)
-from PyQt6.QtCore import Qt, pyqtSignal, QBuffer, QIODevice, QRect, QPoint, QSize
-from PyQt6.QtGui import QPixmap, QTransform, QPainter, QColor, QPen
+                             QPushButton, QSizePolicy)
+from PyQt6.QtCore import Qt, pyqtSignal, QRect, QObject, QRunnable, QThreadPool
+from PyQt6.QtGui import QPixmap, QPainter, QColor, QPen
+from src.core.image_utils import qimage_to_gray, read_qimage, ImageEdits
+from src.core.timing import RequestTrace
+
+# 预览图的长边上限：手机原图动辄 4000 像素以上，预览用不着
+PREVIEW_MAX_SIDE = 1600
+
+
+class _TaskSignals(QObject):
+    preview_ready = pyqtSignal(int, object)  # (图片序号, 预览 QImage 或 None)
+    final_ready = pyqtSignal(int, object, object)  # (图片序号, 灰度像素数组或 None, RequestTrace)
+
+
+class _PreviewTask(QRunnable):
+    """后台线程：按预览尺寸解码 (同时按 EXIF 转正)"""
+
+    def __init__(self, signals, generation, data):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.data = data
+
+    def run(self):
+        image = read_qimage(self.data, PREVIEW_MAX_SIDE)
+        self.signals.preview_ready.emit(self.generation, image)
+
+
+class _FinalTask(QRunnable):
+    """后台线程：确认时全尺寸解码一次，套用编辑列表 (先裁小再旋转)，转成灰度像素"""
+
+    def __init__(self, signals, generation, data, edits, trace):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.data = data
+        self.edits = edits
+        self.trace = trace
+
+    def run(self):
+        pixels = None
+        try:
+            with self.trace.stage("capture"):
+                image = read_qimage(self.data)
+                if image is not None:
+                    image = self.edits.apply(image)
+            if image is not None:
+                # 直接转灰度像素，不再 PNG 编码一遍 (引擎那边也就不用再解码)
+                with self.trace.stage("serialize"):
+                    pixels = qimage_to_gray(image)
+        except Exception as e:
+            print(f"❌ [Editor] 处理原图失败: {e}")
+        self.signals.final_ready.emit(self.generation, pixels, self.trace)
 
 
 class CropLabel(QLabel):
     """
     一个支持鼠标画框的 Label
+    只显示预览图；缩放到控件大小的 QPixmap 缓存起来，只在预览图或控件尺寸变化时重建
     """
 
     def __init__(self):
         super().__init__()
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        # 存原始高清大图
-        self.original_pixmap = None
+        # 预览图 (QImage，已经套用了旋转)
+        self.preview = None
+        # 缓存：缩放好的显示图和它在 Label 里的位置
+        self._display_pixmap = None
+        self._display_rect = QRect()
         # 选框状态
         self.start_pos = None
         self.end_pos = None
         self.is_selecting = False
         self.selection_rect = QRect()
 
-    def set_original_pixmap(self, pixmap):
-        self.original_pixmap = pixmap
+    def set_preview(self, image):
+        self.preview = image
+        self._display_pixmap = None
         self.reset_selection()
-        self.refresh_display()
 
     def reset_selection(self):
         self.start_pos = None
@@ -31,54 +86,40 @@ class CropLabel(QLabel):
         self.selection_rect = QRect()
         self.update()
 
-    def refresh_display(self):
-        """根据窗口大小，缩放显示图片"""
-        if not self.original_pixmap: return
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._display_pixmap = None
 
-        # 限制显示大小，不要撑爆屏幕
-        # 这里实际上利用了 Label 的 resizeEvent，但为了简单，我们让它跟随父容器
-        # 实际上我们在 paintEvent 里画图，这里只做个占位
-        self.update()
-
-    def paintEvent(self, event):
-        if not self.original_pixmap:
-            super().paintEvent(event)
+    def _ensure_display(self):
+        """按当前控件大小缩放预览图 (保持长宽比、居中)"""
+        if self._display_pixmap is not None or self.preview is None:
             return
-
-        painter = QPainter(self)
-
-        # 1. 计算缩放比例，保持长宽比显示
-        # 目标尺寸（Label 的当前尺寸）
         target_size = self.size()
-        # 按照 KeepAspectRatio 缩放
-        scaled_pixmap = self.original_pixmap.scaled(
+        scaled = self.preview.scaled(
             target_size,
             Qt.AspectRatioMode.KeepAspectRatio,
             Qt.TransformationMode.SmoothTransformation
         )
+        x_offset = (target_size.width() - scaled.width()) // 2
+        y_offset = (target_size.height() - scaled.height()) // 2
+        self._display_pixmap = QPixmap.fromImage(scaled)
+        self._display_rect = QRect(x_offset, y_offset, scaled.width(), scaled.height())
 
-        # 计算图片在 Label 里的偏移量（居中）
-        x_offset = (target_size.width() - scaled_pixmap.width()) // 2
-        y_offset = (target_size.height() - scaled_pixmap.height()) // 2
+    def paintEvent(self, event):
+        if self.preview is None:
+            super().paintEvent(event)
+            return
 
-        # 绘制图片
-        painter.drawPixmap(x_offset, y_offset, scaled_pixmap)
+        self._ensure_display()
+        painter = QPainter(self)
+        painter.drawPixmap(self._display_rect.topLeft(), self._display_pixmap)
 
-        # 2. 绘制选框
+        # 绘制选框
         if not self.selection_rect.isEmpty():
             painter.setPen(QPen(QColor(0, 120, 215), 2))  # 蓝色边框
             painter.setBrush(QColor(0, 120, 215, 50))  # 半透明填充
             painter.drawRect(self.selection_rect)
 
-        # 存一下当前的缩放参数，供裁剪计算用
-        self._current_scale_info = {
-            'ratio': self.original_pixmap.width() / scaled_pixmap.width(),
-            'x_offset': x_offset,
-            'y_offset': y_offset,
-            'scaled_w': scaled_pixmap.width(),
-            'scaled_h': scaled_pixmap.height()
-        }
-
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
             self.is_selecting = True
@@ -89,7 +130,6 @@ class CropLabel(QLabel):
     def mouseMoveEvent(self, event):
         if self.is_selecting:
             self.end_pos = event.pos()
-            # 限制选框在 Label 范围内
             self.selection_rect = QRect(self.start_pos, self.end_pos).normalized()
             self.update()
 
@@ -97,40 +137,22 @@ class CropLabel(QLabel):
         if event.button() == Qt.MouseButton.LeftButton:
             self.is_selecting = False
 
-    def get_cropped_image(self):
-        """核心逻辑：把屏幕上的选框，映射回原始高清大图"""
-        if not self.original_pixmap: return None
-
-        # 如果没有选框，返回原图
+    def selection_fraction(self):
+        """屏幕上的选框 -> 相对当前图片的比例坐标 (x, y, w, h)；没有选框时返回 None"""
         if self.selection_rect.isEmpty() or self.selection_rect.width() < 10:
-            return self.original_pixmap
-
-        info = self._current_scale_info
-        ratio = info['ratio']
-
-        # 1. 减去偏移量 (把 Label 坐标 转为 图片显示区域坐标)
-        x = self.selection_rect.x() - info['x_offset']
-        y = self.selection_rect.y() - info['y_offset']
-        w = self.selection_rect.width()
-        h = self.selection_rect.height()
-
-        # 2. 乘上缩放比例 (把 显示坐标 转为 原始图片坐标)
-        real_x = int(x * ratio)
-        real_y = int(y * ratio)
-        real_w = int(w * ratio)
-        real_h = int(h * ratio)
-
-        # 3. 边界检查
-        real_rect = QRect(real_x, real_y, real_w, real_h)
-        # 和原图取交集，防止截出去
-        img_rect = self.original_pixmap.rect()
-        final_rect = real_rect.intersected(img_rect)
-
-        return self.original_pixmap.copy(final_rect)
+            return None
+        display = self._display_rect
+        rect = self.selection_rect.intersected(display)
+        if rect.isEmpty() or display.isEmpty():
+            return None
+        return ((rect.x() - display.x()) / display.width(),
+                (rect.y() - display.y()) / display.height(),
+                rect.width() / display.width(),
+                rect.height() / display.height())
 
 
 class ImageEditor(QDialog):
-    confirmed = pyqtSignal(bytes)
+    confirmed = pyqtSignal(object, object)  # 灰度像素数组 (numpy), RequestTrace
 
     def __init__(self):
         super().__init__()
@@ -138,6 +160,16 @@ class ImageEditor(QDialog):
         self.resize(800, 600)  # 窗口大一点
         self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint)
 
+        # 原图只保存编码后的 bytes，确认时才全尺寸解码一次
+        self.source_image = None
+        self.base_preview = None  # 没有套用编辑的预览图
+        self.edits = ImageEdits()
+        self._generation = 0  # 每张新图片 +1，丢弃旧图片迟到的解码结果
+        self._busy = False
+        self._signals = _TaskSignals()
+        self._signals.preview_ready.connect(self._on_preview_ready)
+        self._signals.final_ready.connect(self._on_final_ready)
+
         layout = QVBoxLayout()
 
         # 1. 顶部提示
@@ -147,7 +179,7 @@ class ImageEditor(QDialog):
 
         # 2. 自定义图片控件
         self.image_label = CropLabel()
-        self.image_label.setStyleSheet("background-color: #333;")
+        self.image_label.setStyleSheet("background-color: #333; color: #ccc;")
         # 让 Label 可以收缩，这一步很关键，否则大图会撑大窗口
         self.image_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         layout.addWidget(self.image_label, 1)  # 权重1，占满空间
@@ -164,50 +196,86 @@ class ImageEditor(QDialog):
         btn_cancel = QPushButton("丢弃")
         btn_cancel.clicked.connect(self.close)
 
-        btn_ok = QPushButton("⚡ 确认并识别 (Enter)")
-        btn_ok.setStyleSheet("background-color: #0078d7; color: white; font-weight: bold; padding: 8px 20px;")
-        btn_ok.clicked.connect(self.on_confirm)
+        self.btn_ok = QPushButton("⚡ 确认并识别 (Enter)")
+        self.btn_ok.setStyleSheet("background-color: #0078d7; color: white; font-weight: bold; padding: 8px 20px;")
+        self.btn_ok.clicked.connect(self.on_confirm)
 
         btn_layout.addWidget(btn_rotate)
         btn_layout.addWidget(btn_reset)
         btn_layout.addStretch()
         btn_layout.addWidget(btn_cancel)
-        btn_layout.addWidget(btn_ok)
+        btn_layout.addWidget(self.btn_ok)
 
         layout.addLayout(btn_layout)
         self.setLayout(layout)
 
-    def set_image(self, img_bytes):
-        pixmap = QPixmap()
-        pixmap.loadFromData(img_bytes)
-        self.image_label.set_original_pixmap(pixmap)
+    def set_image(self, image):
+        """收到新图片 (编码后的 bytes 或灰度像素数组)：先显示窗口，预览图在后台线程按缩小尺寸解码"""
+        self._generation += 1
+        self._busy = False
+        self.btn_ok.setEnabled(True)
+        self.source_image = image
+        self.base_preview = None
+        self.edits.clear()
+        self.image_label.set_preview(None)
+        self.image_label.setText("⏳ 正在加载图片...")
+        QThreadPool.globalInstance().start(_PreviewTask(self._signals, self._generation, image))
         self.show()
         self.activateWindow()
 
+    def _on_preview_ready(self, generation, image):
+        if generation != self._generation:
+            return
+        if image is None:
+            self.image_label.setText("❌ 无法解码图片")
+            return
+        self.image_label.setText("")
+        self.base_preview = image
+        self._refresh_preview()
+
+    def _refresh_preview(self):
+        """编辑列表变化后重建预览 (只对小尺寸预览图操作)"""
+        if self.base_preview is not None:
+            self.image_label.set_preview(self.edits.apply(self.base_preview))
+
     def rotate(self):
-        if not self.image_label.original_pixmap: return
-        transform = QTransform().rotate(-90)
-        new_pix = self.image_label.original_pixmap.transformed(transform)
-        self.image_label.set_original_pixmap(new_pix)
+        if self.base_preview is None or self._busy: return
+        self.edits.rotate()
+        self._refresh_preview()
 
     def reset_view(self):
-        self.image_label.reset_selection()
+        if self._busy: return
+        self.edits.clear()
+        self._refresh_preview()
 
     def on_confirm(self):
-        # 获取最终处理过的图片（裁剪后）
-        final_pixmap = self.image_label.get_cropped_image()
-        if not final_pixmap: return
-
-        ba = QBuffer()
-        ba.open(QIODevice.OpenModeFlag.WriteOnly)
-        final_pixmap.save(ba, "PNG")
-
+        if self.source_image is None or self.base_preview is None or self._busy:
+            return
+        # 选框记成最后一步裁剪 (记在副本上，处理失败时可以重新框选)；原图在后台线程解码并套用整个编辑列表
+        edits = self.edits.copy()
+        crop = self.image_label.selection_fraction()
+        if crop is not None:
+            edits.crop(crop)
+        self._busy = True
+        self.btn_ok.setEnabled(False)
+        trace = RequestTrace("mobile")
+        QThreadPool.globalInstance().start(
+            _FinalTask(self._signals, self._generation, self.source_image, edits, trace))
+
+    def _on_final_ready(self, generation, pixels, trace):
+        if generation != self._generation:
+            return
+        self._busy = False
+        self.btn_ok.setEnabled(True)
+        if pixels is None:
+            self.image_label.setText("❌ 处理原图失败")
+            return
         # 关闭窗口，发出信号
-        self.confirmed.emit(ba.data().data())
+        self.confirmed.emit(pixels, trace)
         self.close()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter:
             self.on_confirm()
         elif event.key() == Qt.Key.Key_Escape:
-            self.close()
\ No newline at end of file
+            self.close()
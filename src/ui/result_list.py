@@ -0,0 +1,140 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QListWidget, QListWidgetItem,
+                             QPushButton)
+from PyQt6.QtCore import Qt, QSize, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QIcon
+from src.core import pipeline
+
+THUMB_HEIGHT = 48
+
+STATUS_TEXT = {
+    pipeline.DECODING: "⏳ 解码中...",
+    pipeline.PREPROCESSING: "⏳ 预处理中...",
+    pipeline.RECOGNIZING: "🤔 识别中...",
+}
+
+
+def _thumbnail(pixels):
+    """预处理后的灰度像素 -> 列表里的缩略图"""
+    h, w = pixels.shape
+    image = QImage(pixels.tobytes(), w, h, w, QImage.Format.Format_Grayscale8)
+    image = image.scaledToHeight(THUMB_HEIGHT, Qt.TransformationMode.SmoothTransformation)
+    return QIcon(QPixmap.fromImage(image))
+
+
+class ResultListWindow(QWidget):
+    """
+    连拍 / 整屏识别的结果列表：照片 (或截图里检测出的区域) 按到达顺序排列，识别完一张就更新一行。
+    item_updated 可以在任何线程里 emit (BurstPipeline 的 on_update)，界面更新在 GUI 线程里做
+    """
+    item_updated = pyqtSignal(object)  # BurstItem
+    edit_requested = pyqtSignal(int)  # 照片 ID
+    removed = pyqtSignal(int)  # 照片 ID
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("连拍识别 - TeXFE")
+        self.resize(560, 480)
+        self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint)
+
+        self._rows = {}  # 照片 ID -> QListWidgetItem
+        self._items = {}  # 照片 ID -> BurstItem
+        self._thumb_source = {}  # 照片 ID -> 当前缩略图对应的像素数组 (编辑后重新识别会换)
+        self.item_updated.connect(self._on_item_updated)
+
+        layout = QVBoxLayout()
+        self.lbl_progress = QLabel()
+        self.lbl_progress.setStyleSheet("color: #666; font-size: 12px;")
+        layout.addWidget(self.lbl_progress)
+
+        self.list = QListWidget()
+        self.list.setIconSize(QSize(THUMB_HEIGHT * 4, THUMB_HEIGHT))
+        self.list.setWordWrap(True)
+        self.list.itemDoubleClicked.connect(lambda row: self._copy([row.data(Qt.ItemDataRole.UserRole)]))
+        layout.addWidget(self.list, 1)
+
+        btn_layout = QHBoxLayout()
+        btn_edit = QPushButton("✂️ 编辑")
+        btn_edit.clicked.connect(self._on_edit)
+        btn_remove = QPushButton("删除")
+        btn_remove.clicked.connect(self._on_remove)
+        btn_copy = QPushButton("复制")
+        btn_copy.clicked.connect(lambda: self._copy(self._selected_ids()))
+        btn_copy_all = QPushButton("📋 复制全部")
+        btn_copy_all.setStyleSheet("background-color: #0078d7; color: white; font-weight: bold; padding: 6px 16px;")
+        btn_copy_all.clicked.connect(lambda: self._copy(list(self._rows)))
+
+        btn_layout.addWidget(btn_edit)
+        btn_layout.addWidget(btn_remove)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_copy)
+        btn_layout.addWidget(btn_copy_all)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+    def add_item(self, item):
+        """GUI 线程调用：新照片先占一行"""
+        row = QListWidgetItem()
+        row.setData(Qt.ItemDataRole.UserRole, item.id)
+        self.list.addItem(row)
+        self._rows[item.id] = row
+        self._items[item.id] = item
+        self._render(item)
+        if not self.isVisible():
+            self.show()
+        self.activateWindow()
+
+    def _on_item_updated(self, item):
+        if item.id in self._rows:
+            self._render(item)
+
+    def _render(self, item):
+        row = self._rows[item.id]
+        label = f"#{item.id}"
+        if item.box is not None:
+            x, y, w, h = item.box
+            label += f" ({x},{y} {w}x{h})"
+        if item.status == pipeline.DONE:
+            text = f"{label}  ✅ {item.latex}"
+        elif item.status == pipeline.FAILED:
+            text = f"{label}  ❌ {item.error}"
+        else:
+            text = f"{label}  {STATUS_TEXT.get(item.status, item.status)}"
+        row.setText(text)
+        row.setToolTip(item.latex or item.error or "")
+        if item.pixels is not None and self._thumb_source.get(item.id) is not item.pixels:
+            self._thumb_source[item.id] = item.pixels
+            row.setIcon(_thumbnail(item.pixels))
+        self._update_progress()
+
+    def _update_progress(self):
+        finished = sum(item.status in (pipeline.DONE, pipeline.FAILED) for item in self._items.values())
+        failed = sum(item.status == pipeline.FAILED for item in self._items.values())
+        text = f"已完成 {finished}/{len(self._items)}"
+        if failed:
+            text += f"，{failed} 张失败 (选中后点 编辑 框选公式重新识别)"
+        self.lbl_progress.setText(text)
+
+    def _selected_ids(self):
+        return [row.data(Qt.ItemDataRole.UserRole) for row in self.list.selectedItems()]
+
+    def _copy(self, item_ids):
+        """按列表顺序复制识别成功的结果，一行一个公式"""
+        latex = [self._items[i].latex for i in item_ids if self._items[i].status == pipeline.DONE]
+        if latex:
+            import pyperclip
+            pyperclip.copy("\n".join(latex))
+            self.lbl_progress.setText(f"已复制 {len(latex)} 个公式")
+
+    def _on_edit(self):
+        ids = self._selected_ids()
+        if ids:
+            self.edit_requested.emit(ids[0])
+
+    def _on_remove(self):
+        for item_id in self._selected_ids():
+            row = self._rows.pop(item_id)
+            self._items.pop(item_id)
+            self._thumb_source.pop(item_id, None)
+            self.list.takeItem(self.list.row(row))
+            self.removed.emit(item_id)
+        self._update_progress()
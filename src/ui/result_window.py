@@ -1,13 +1,16 @@
 import json
+import time
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QStackedLayout, QApplication
-from PyQt6.QtCore import QUrl, Qt
+from PyQt6.QtCore import QUrl, Qt, pyqtSignal, QTimer
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtWebEngineCore import QWebEngineSettings
-import pyperclip
 from ..config import AppConfig
 
 
 class ResultWindow(QWidget):
+    # 公式在页面上渲染完成 (请求ID, 从 set_content 到渲染完的耗时 ms，包括等页面加载的时间；页面加载失败时为 -1)
+    rendered = pyqtSignal(int, float)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("TeXFE")
@@ -53,13 +56,60 @@ class ResultWindow(QWidget):
         self.stack.addWidget(self.loading_label)  # Index 1
 
         self.page_ready = False
+        # 页面加载好之前要执行的 JS：种类 -> 代码，同一种只留最新的 (比如部分结果只留最后一次)
+        self._pending_js = {}
+        self._prewarming = False
+        # 当前正在等待的请求 ID，用来丢弃旧请求的迟到结果
+        self.request_id = None
+        self._render_started = {}  # 请求ID -> set_content 的时间
 
     def _on_loaded(self, ok):
         self.page_ready = ok
         if ok:
             print("✅ [UI] 结果页面加载完毕")
+            pending, self._pending_js = self._pending_js, {}
+            if "latex" in pending:
+                self.stack.setCurrentIndex(0)
+            for js in pending.values():
+                self.webview.page().runJavaScript(js)
+            if not self.isVisible():
+                self._prewarm()
         else:
             print("❌ [UI] 结果页面加载失败，请检查 templates/index.html 路径")
+            self._pending_js.clear()
+            for render_id in list(self._render_started):
+                self._render_started.pop(render_id)
+                self.rendered.emit(render_id, -1.0)
+
+    def _prewarm(self):
+        """
+        网页的渲染进程和合成层要等窗口第一次显示时才创建，第一次弹出结果会明显卡一下。
+        页面加载完以后趁空闲在屏幕外显示一次再隐藏，把这部分开销提前做掉
+        """
+        self._prewarming = True
+        self.setAttribute(Qt.WidgetAttribute.WA_DontShowOnScreen, True)
+        self.show()
+        # 留几帧的时间让页面真正画一次 (预热的公式、字体)
+        QTimer.singleShot(300, self._end_prewarm)
+
+    def _end_prewarm(self):
+        if self._prewarming:
+            self._prewarming = False
+            self.hide()
+            self.setAttribute(Qt.WidgetAttribute.WA_DontShowOnScreen, False)
+
+    def _present(self):
+        # 预热还没结束时用户就要看结果：先结束预热，不然窗口显示在屏幕外
+        self._end_prewarm()
+        self.show()
+
+    def _run_js(self, kind, js):
+        """页面加载好了就直接执行，否则先存起来，加载完按顺序补上"""
+        if self.page_ready:
+            self.webview.page().runJavaScript(js)
+        else:
+            self._pending_js.pop(kind, None)  # 重新插入，排到最后
+            self._pending_js[kind] = js
 
         # 1. 新增：根据参考点（鼠标位置），把窗口移动到那个屏幕的正中间
     def move_to_screen_center_at(self, ref_pos):
@@ -78,44 +128,85 @@ class ResultWindow(QWidget):
         self.move(x, y)
 
     # 2. 修改：接收一个可选的位置参数，用来定位屏幕
-    def show_loading(self, ref_pos=None):
+    def show_loading(self, ref_pos=None, request_id=None):
+        self.request_id = request_id
+        self.loading_label.setText("🤔 正在识别中...")
         self.stack.setCurrentIndex(1)
 
         # 如果传了鼠标位置，就根据鼠标位置找屏幕，并居中
         if ref_pos:
             self.move_to_screen_center_at(ref_pos)
 
-        self.show()
+        self._present()
         self.activateWindow()
         self.repaint()
 
-    def set_content(self, latex_code):
+    def _is_stale(self, request_id):
+        return request_id is not None and self.request_id is not None and request_id != self.request_id
+
+    def show_partial(self, latex_code, request_id=None):
+        """解码过程中显示部分结果：第一次调用时从 Loading 切到浏览器页面，之后只刷新公式"""
+        if self._is_stale(request_id):
+            return
+        if self.page_ready and self.stack.currentIndex() != 0:
+            self.stack.setCurrentIndex(0)
+        self._run_js("latex", f"setPartialLatex({json.dumps(latex_code)});")
+
+    def set_content(self, latex_code, request_id=None):
         """切换回浏览器页面并注入数据"""
-        self.show()
-        self.activateWindow()
+        if self._is_stale(request_id):
+            print(f"⏭️ [UI] 忽略过期结果 #{request_id}")
+            return
 
-        # 1. 切换回浏览器 (Index 0)
-        self.stack.setCurrentIndex(0)
+        self._present()
+        self.activateWindow()
 
-        # 2. 注入数据 (仅当页面加载好时)
+        # 1. 切换回浏览器 (Index 0)；页面还没加载好时先留在 Loading 页，加载完再切
         if self.page_ready:
-            js = f"setLatex({json.dumps(latex_code)});"
-            self.webview.page().runJavaScript(js)
+            self.stack.setCurrentIndex(0)
+
+        # 2. 注入数据 (页面还没加载好时排队，加载完立即显示)
+        render_id = request_id or 0
+        if not self.page_ready:
+            print("⏳ [UI] 页面还没加载好，公式加载完后显示")
+            self.loading_label.setText("✅ 识别完成，正在打开结果窗口...")
+            # 排队中的旧结果被这个顶掉了，不会再渲染
+            for old_id in [r for r in self._render_started if r != render_id]:
+                self._render_started.pop(old_id)
+                self.rendered.emit(old_id, -1.0)
+        self._render_started[render_id] = time.perf_counter()
+        self._run_js("latex", f"setLatex({json.dumps(latex_code)}, {render_id});")
+
+    def show_timings(self, text, request_id=None):
+        """在结果页右下角 (或错误提示下方) 显示本次请求的耗时"""
+        if self._is_stale(request_id):
+            return
+        if self.stack.currentIndex() == 1 and "latex" not in self._pending_js:
+            self.loading_label.setText(f"{self.loading_label.text()}\n\n{text}")
         else:
-            print("⚠️ [UI] 页面还没加载好，无法显示公式")
+            self._run_js("timings", f"setTimings({json.dumps(text)});")
 
-    def show_error(self, error_msg):
+    def show_error(self, error_msg, request_id=None):
         """显示错误信息"""
-        self.show()
+        if self._is_stale(request_id):
+            return
+
+        self._present()
         self.loading_label.setText(f"❌ 识别失败\n{error_msg}")
         self.stack.setCurrentIndex(1)  # 复用 Loading 页面显示错误
 
     def handle_js_command(self, title):
-        if title.startswith("CMD:CLOSE"):
+        if title.startswith("EVT:RENDERED:"):
+            render_id = int(title.split(":", 2)[2])
+            started = self._render_started.pop(render_id, None)
+            if started is not None:
+                self.rendered.emit(render_id, (time.perf_counter() - started) * 1000)
+        elif title.startswith("CMD:CLOSE"):
             self.hide()
         elif title.startswith("CMD:COPY:"):
             try:
                 content = title.split(":", 2)[2]
+                import pyperclip
                 pyperclip.copy(content)
                 self.hide()
             except:
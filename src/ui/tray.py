@@ -6,11 +6,13 @@ from src.ui.icon import get_fox_icon
 
 
 class FoxTray(QSystemTrayIcon):
-    def __init__(self, parent=None, on_capture=None, on_mobile=None):
+    def __init__(self, parent=None, on_capture=None, on_mobile=None, on_page=None, on_history=None):
         super().__init__(get_fox_icon(), parent)
 
         self.on_capture = on_capture
         self.on_mobile = on_mobile
+        self.on_page = on_page
+        self.on_history = on_history
 
         # 设置提示文字
         self.setToolTip("TeXFE - 数学公式识别")
@@ -28,6 +30,16 @@ class FoxTray(QSystemTrayIcon):
         action_capture.triggered.connect(self.trigger_capture)
         self.menu.addAction(action_capture)
 
+        # 整屏识别：自动找出屏幕上所有公式
+        action_page = QAction("整屏识别公式", self)
+        action_page.triggered.connect(self.trigger_page)
+        self.menu.addAction(action_page)
+
+        # 以前的识别结果：搜索、重新复制
+        action_history = QAction("识别历史", self)
+        action_history.triggered.connect(self.trigger_history)
+        self.menu.addAction(action_history)
+
         self.menu.addSeparator()
 
         # 退出动作
@@ -50,6 +62,14 @@ class FoxTray(QSystemTrayIcon):
         if self.on_mobile:
             self.on_mobile()
 
+    def trigger_page(self):
+        if self.on_page:
+            self.on_page()
+
+    def trigger_history(self):
+        if self.on_history:
+            self.on_history()
+
     def on_activated(self, reason):
         if reason == QSystemTrayIcon.ActivationReason.Trigger:
             self.trigger_capture()
\ No newline at end of file
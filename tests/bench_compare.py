@@ -0,0 +1,121 @@
+"""
+对比两次 bench_engine.py 的结果，找出性能回退。
+
+用法:
+    python tests/bench_compare.py temp/bench_baseline.json temp/bench.json
+    python tests/bench_compare.py base.json new.json --threshold 5 --fail-on-output-change
+
+某个指标比基线差了 --threshold 百分比以上 (且绝对差值超过 --min-abs，过滤掉零点几毫秒的抖动) 就算回退，
+有回退时退出码为 1，可以直接放进 CI。
+"""
+import argparse
+import json
+import sys
+
+# (指标路径, 越小越好?)
+METRICS = [
+    (("end_to_end_ms", "p50"), True),
+    (("end_to_end_ms", "p95"), True),
+    (("throughput_per_s",), False),
+    (("peak_rss_mb",), True),
+    (("load_ms",), True),
+]
+STAGE_PERCENTILES = ("p50", "p95")
+
+
+def _get(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def _metric_paths(base, cur):
+    yield from METRICS
+    stages = set(base.get("stages_ms", {})) & set(cur.get("stages_ms", {}))
+    for name in sorted(stages):
+        for q in STAGE_PERCENTILES:
+            yield ("stages_ms", name, q), True
+
+
+def compare(baseline: dict, current: dict, threshold=10.0, min_abs=1.0):
+    """
+    返回每个 (引擎, 指标) 的对比行:
+    {"engine", "metric", "base", "current", "change_pct", "regression"}
+    change_pct 为正表示变差
+    """
+    rows = []
+    for engine in sorted(set(baseline["engines"]) & set(current["engines"])):
+        base, cur = baseline["engines"][engine], current["engines"][engine]
+        for path, lower_is_better in _metric_paths(base, cur):
+            b, c = _get(base, path), _get(cur, path)
+            if b is None or c is None:
+                continue
+            worse = (c - b) if lower_is_better else (b - c)
+            change_pct = worse / b * 100 if b else 0.0
+            rows.append({
+                "engine": engine,
+                "metric": ".".join(path),
+                "base": b,
+                "current": c,
+                "change_pct": round(change_pct, 2),
+                "regression": change_pct > threshold and abs(c - b) > min_abs,
+            })
+    return rows
+
+
+def changed_outputs(baseline: dict, current: dict):
+    """识别结果和基线不一样的图片 {引擎: [文件名, ...]}"""
+    changed = {}
+    for engine in sorted(set(baseline["engines"]) & set(current["engines"])):
+        base_out = baseline["engines"][engine].get("outputs", {})
+        cur_out = current["engines"][engine].get("outputs", {})
+        diff = [name for name in sorted(set(base_out) & set(cur_out)) if base_out[name] != cur_out[name]]
+        if diff:
+            changed[engine] = diff
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比压测结果，检测性能回退")
+    parser.add_argument("baseline", help="基线结果 JSON")
+    parser.add_argument("current", help="本次结果 JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="变差超过多少百分比算回退")
+    parser.add_argument("--min-abs", type=float, default=1.0, help="绝对差值小于这个数 (ms/MB/张每秒) 时忽略")
+    parser.add_argument("--fail-on-output-change", action="store_true", help="识别结果有变化也算失败")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline.get("corpus") != current.get("corpus") or baseline.get("settings") != current.get("settings"):
+        print("⚠️ 两次压测的语料或参数不同，结果可能不可比")
+    if baseline.get("environment") != current.get("environment"):
+        print("⚠️ 两次压测的运行环境不同 (机器 / Python / onnxruntime 版本)")
+
+    rows = compare(baseline, current, args.threshold, args.min_abs)
+    print(f"{'engine':<12}{'metric':<28}{'base':>10}{'current':>10}{'change':>9}")
+    for row in rows:
+        mark = "  ❌" if row["regression"] else ""
+        print(f"{row['engine']:<12}{row['metric']:<28}{row['base']:>10.2f}{row['current']:>10.2f}"
+              f"{row['change_pct']:>+8.1f}%{mark}")
+
+    changed = changed_outputs(baseline, current)
+    for engine, names in changed.items():
+        print(f"⚠️ {engine}: {len(names)} 张图的识别结果和基线不同，例如 {', '.join(names[:3])}")
+
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} 项指标回退超过 {args.threshold}%")
+        return 1
+    if changed and args.fail_on_output_change:
+        return 1
+    print("\n✅ 没有发现回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
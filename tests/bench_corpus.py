@@ -0,0 +1,307 @@
+"""
+压测用的合成公式语料：用 Qt 在本地排版渲染，种子固定，每次生成的图片都一样。
+
+用法:
+    python tests/bench_corpus.py temp/bench_corpus
+    python tests/bench_corpus.py temp/bench_corpus --per-bucket 16 --seed 1
+
+按 尺寸 (small / medium / large 字号) x 复杂度 (simple / medium / complex) 分桶，
+每张图同时记下对应的 LaTeX，写在 corpus.json 里。
+这里只做一个很小的排版器 (上下标、分式、根号、求和)，目的是让图片的尺寸和笔画分布接近真实截图，
+不追求和 LaTeX 排版一模一样。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+CORPUS_VERSION = 1
+MANIFEST = "corpus.json"
+
+SIZES = {"small": 16, "medium": 24, "large": 36}  # 字号 (像素)
+COMPLEXITIES = ("simple", "medium", "complex")
+
+LETTERS = ["x", "y", "z", "a", "b", "c", "n", "k", "t"]
+GREEK = [("α", r"\alpha"), ("β", r"\beta"), ("θ", r"\theta"), ("λ", r"\lambda"), ("π", r"\pi")]
+OPERATORS = [("+", "+"), ("−", "-"), ("·", r"\cdot")]
+
+FONT_FILES = ("KaTeX_Main-Regular.woff2", "KaTeX_Math-Italic.woff2")
+
+
+# ---------------- 排版 ----------------
+
+class Box:
+    """排版盒子：宽度、基线以上高度、基线以下深度，draw 在 (x, 基线 y) 处画出来"""
+
+    def __init__(self, width, ascent, descent, painter_fn, latex):
+        self.width = width
+        self.ascent = ascent
+        self.descent = descent
+        self._paint = painter_fn
+        self.latex = latex
+
+    def draw(self, painter, x, y):
+        self._paint(painter, x, y)
+
+
+class Typesetter:
+    def __init__(self, family):
+        self.family = family
+
+    def font(self, px, italic=False):
+        from PyQt6.QtGui import QFont
+
+        font = QFont(self.family)
+        font.setPixelSize(max(6, int(round(px))))
+        font.setItalic(italic)
+        font.setStyleHint(QFont.StyleHint.Serif)
+        return font
+
+    def text(self, s, px, latex=None, italic=False):
+        from PyQt6.QtGui import QFontMetricsF
+
+        font = self.font(px, italic)
+        fm = QFontMetricsF(font)
+
+        def paint(p, x, y):
+            p.setFont(font)
+            p.drawText(int(round(x)), int(round(y)), s)
+
+        return Box(fm.horizontalAdvance(s), fm.ascent(), fm.descent(), paint, latex if latex is not None else s)
+
+    def row(self, boxes, gap=0.0):
+        width = sum(b.width for b in boxes) + gap * max(0, len(boxes) - 1)
+
+        def paint(p, x, y):
+            for b in boxes:
+                b.draw(p, x, y)
+                x += b.width + gap
+
+        latex = " ".join(b.latex for b in boxes)
+        return Box(width, max(b.ascent for b in boxes), max(b.descent for b in boxes), paint, latex)
+
+    def script(self, base, px, sup=None, sub=None):
+        """上下标：sup / sub 已经按较小字号排好"""
+        shift_up = base.ascent * 0.55
+        shift_down = px * 0.25
+        extra = max(sup.width if sup else 0, sub.width if sub else 0)
+        ascent = max(base.ascent, (sup.ascent + shift_up) if sup else 0)
+        descent = max(base.descent, (sub.descent + shift_down) if sub else 0)
+
+        def paint(p, x, y):
+            base.draw(p, x, y)
+            if sup:
+                sup.draw(p, x + base.width + 1, y - shift_up)
+            if sub:
+                sub.draw(p, x + base.width + 1, y + shift_down)
+
+        latex = f"{{{base.latex}}}"
+        if sub:
+            latex += f"_{{{sub.latex}}}"
+        if sup:
+            latex += f"^{{{sup.latex}}}"
+        return Box(base.width + extra + 2, ascent, descent, paint, latex)
+
+    def frac(self, num, den, px):
+        axis = px * 0.3  # 分数线在基线上方的高度
+        gap = max(2.0, px * 0.15)
+        thickness = max(1.0, px / 18)
+        width = max(num.width, den.width) + px * 0.4
+
+        def paint(p, x, y):
+            from PyQt6.QtCore import QRectF
+
+            bar_y = y - axis
+            num.draw(p, x + (width - num.width) / 2, bar_y - gap - num.descent)
+            den.draw(p, x + (width - den.width) / 2, bar_y + gap + den.ascent)
+            p.fillRect(QRectF(x, bar_y - thickness / 2, width, thickness), p.pen().color())
+
+        ascent = axis + gap + num.ascent + num.descent
+        descent = gap + den.ascent + den.descent - axis
+        return Box(width, ascent, descent, paint, rf"\frac{{{num.latex}}}{{{den.latex}}}")
+
+    def sqrt(self, inner, px):
+        pad = max(2.0, px * 0.12)
+        hook = px * 0.5
+        thickness = max(1.0, px / 18)
+
+        def paint(p, x, y):
+            from PyQt6.QtCore import QPointF
+            from PyQt6.QtGui import QPen
+
+            pen = QPen(p.pen().color())
+            pen.setWidthF(thickness)
+            p.setPen(pen)
+            top = y - inner.ascent - pad
+            bottom = y + inner.descent
+            p.drawPolyline([
+                QPointF(x, y - inner.ascent * 0.4),
+                QPointF(x + hook * 0.3, y - inner.ascent * 0.5),
+                QPointF(x + hook * 0.6, bottom),
+                QPointF(x + hook, top),
+                QPointF(x + hook + inner.width + pad, top),
+            ])
+            inner.draw(p, x + hook + pad / 2, y)
+
+        return Box(inner.width + hook + pad, inner.ascent + pad + thickness, inner.descent, paint,
+                   rf"\sqrt{{{inner.latex}}}")
+
+
+# ---------------- 随机公式 ----------------
+
+class FormulaBuilder:
+    def __init__(self, ts: Typesetter, rng: random.Random):
+        self.ts = ts
+        self.rng = rng
+
+    def atom(self, px):
+        r = self.rng.random()
+        if r < 0.5:
+            return self.ts.text(self.rng.choice(LETTERS), px, italic=True)
+        if r < 0.75:
+            return self.ts.text(str(self.rng.randint(1, 99)), px)
+        char, latex = self.rng.choice(GREEK)
+        return self.ts.text(char, px, latex=latex, italic=True)
+
+    def term(self, px, depth):
+        """一个项：原子，或 (depth > 0 时) 带上下标 / 分式 / 根号的结构"""
+        if depth <= 0:
+            base = self.atom(px)
+            if self.rng.random() < 0.3:
+                return self.ts.script(base, px, sup=self.atom(px * 0.7))
+            return base
+
+        kind = self.rng.choice(["script", "frac", "frac", "sqrt", "sum"])
+        if kind == "script":
+            return self.ts.script(self.atom(px), px, sup=self.expr(px * 0.7, depth - 1, 2),
+                                  sub=self.atom(px * 0.7) if self.rng.random() < 0.5 else None)
+        if kind == "frac":
+            return self.ts.frac(self.expr(px * 0.9, depth - 1, 3), self.expr(px * 0.9, depth - 1, 3), px)
+        if kind == "sqrt":
+            return self.ts.sqrt(self.expr(px, depth - 1, 2), px)
+        sigma = self.ts.text("∑", px * 1.4, latex=r"\sum")
+        return self.ts.row([self.ts.script(sigma, px, sup=self.ts.text("n", px * 0.7, italic=True),
+                                           sub=self.ts.text("k=1", px * 0.7, latex="k=1")),
+                            self.term(px, depth - 1)], gap=px * 0.15)
+
+    def expr(self, px, depth, max_terms):
+        n = self.rng.randint(1, max_terms)
+        parts = [self.term(px, depth if self.rng.random() < 0.6 else 0)]
+        for _ in range(n - 1):
+            char, latex = self.rng.choice(OPERATORS)
+            parts.append(self.ts.text(char, px, latex=latex))
+            parts.append(self.term(px, depth if self.rng.random() < 0.6 else 0))
+        return self.ts.row(parts, gap=px * 0.2)
+
+    def formula(self, px, complexity):
+        if complexity == "simple":
+            lhs, rhs = self.expr(px, 0, 2), self.expr(px, 0, 3)
+        elif complexity == "medium":
+            lhs, rhs = self.expr(px, 0, 1), self.expr(px, 1, 3)
+        else:
+            lhs, rhs = self.expr(px, 1, 2), self.expr(px, 2, 4)
+        return self.ts.row([lhs, self.ts.text("=", px), rhs], gap=px * 0.3)
+
+
+# ---------------- 生成 / 读取 ----------------
+
+def _ensure_app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtGui import QGuiApplication
+
+    return QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+
+
+def _load_family():
+    """优先用项目自带的 KaTeX 字体，保证不同机器渲染一致；加载不了再退回系统衬线字体"""
+    from PyQt6.QtGui import QFontDatabase
+
+    fonts_dir = ROOT / "assets" / "templates" / "fonts"
+    for name in FONT_FILES:
+        font_id = QFontDatabase.addApplicationFont(str(fonts_dir / name))
+        if font_id >= 0:
+            families = QFontDatabase.applicationFontFamilies(font_id)
+            if families:
+                return families[0]
+    return "serif"
+
+
+def render(box: Box, margin: int):
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QColor, QImage, QPainter
+
+    width = int(box.width + 2 * margin + 0.999)
+    height = int(box.ascent + box.descent + 2 * margin + 0.999)
+    image = QImage(width, height, QImage.Format.Format_Grayscale8)
+    image.fill(QColor("white"))
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+    painter.setPen(QColor(Qt.GlobalColor.black))
+    box.draw(painter, margin, margin + box.ascent)
+    painter.end()
+    return image
+
+
+def generate_corpus(out_dir, seed=0, per_bucket=8):
+    """生成语料到 out_dir，返回 manifest (同时写入 out_dir/corpus.json)"""
+    app = _ensure_app()  # noqa: F841  渲染期间保持 QGuiApplication 存活
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    family = _load_family()
+    builder = FormulaBuilder(Typesetter(family), random.Random(seed))
+    items = []
+    for size_name, px in SIZES.items():
+        for complexity in COMPLEXITIES:
+            for i in range(per_bucket):
+                box = builder.formula(px, complexity)
+                image = render(box, margin=max(4, px // 2))
+                name = f"{size_name}-{complexity}-{i:03d}.png"
+                image.save(str(out_dir / name))
+                items.append({
+                    "file": name,
+                    "size": size_name,
+                    "complexity": complexity,
+                    "latex": box.latex,
+                    "width": image.width(),
+                    "height": image.height(),
+                })
+
+    manifest = {"version": CORPUS_VERSION, "seed": seed, "per_bucket": per_bucket, "font": family, "items": items}
+    with open(out_dir / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_corpus(out_dir, seed=0, per_bucket=8):
+    """读取已有语料；不存在或参数 / 版本不一致时重新生成"""
+    manifest_path = Path(out_dir) / MANIFEST
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest["version"], manifest["seed"], manifest["per_bucket"]) == (CORPUS_VERSION, seed, per_bucket):
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    return generate_corpus(out_dir, seed, per_bucket)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成压测用的合成公式语料")
+    parser.add_argument("out_dir", nargs="?", default=str(ROOT / "temp" / "bench_corpus"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--per-bucket", type=int, default=8, help="每个 尺寸 x 复杂度 组合生成几张")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.out_dir, args.seed, args.per_bucket)
+    print(f"✅ 已生成 {len(manifest['items'])} 张图片到 {args.out_dir} (字体: {manifest['font']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+引擎压测：在固定的合成公式语料上测各阶段耗时、端到端延迟、吞吐和内存峰值，结果写成 JSON。
+
+用法:
+    python tests/bench_engine.py -o temp/bench.json
+    python tests/bench_engine.py --engines rapid rapid-int8 --threads 2 --repeat 3 -o temp/bench.json
+    python tests/bench_compare.py temp/bench_baseline.json temp/bench.json
+
+每个引擎在单独的子进程里跑，这样模型加载时间和内存峰值互不干扰。
+语料第一次运行时由 tests/bench_corpus.py 生成到 --corpus 目录，之后复用。
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+RESULT_VERSION = 1
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values):
+    return {
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+    }
+
+
+def peak_rss_mb():
+    """进程内存峰值 (MB)"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 2 ** 20
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+# ---------------- 子进程：跑一个引擎 ----------------
+
+def run_child(engine_type, corpus_dir, repeat, threads, batch_size=1):
+    import numpy as np
+    from PIL import Image
+
+    from src.config import AppConfig
+    from src.core.factory import create_engine
+    from src.core.timing import StageTimings
+
+    # 引擎日志走 stderr，stdout 只留结果 JSON
+    real_stdout, sys.stdout = sys.stdout, sys.stderr
+
+    with open(Path(corpus_dir) / "corpus.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    # 和截图一样直接传灰度像素，读图不计入耗时
+    images = [(item, np.asarray(Image.open(Path(corpus_dir) / item["file"]).convert("L")))
+              for item in manifest["items"]]
+
+    cfg = AppConfig()
+    if threads:
+        from src.core.engines.ort_session import override_options
+        options = override_options(cfg.ORT_OPTIONS, intra_op_num_threads=threads, inter_op_num_threads=1)
+        cfg = dataclasses.replace(cfg, ORT_OPTIONS=options)
+
+    t0 = time.perf_counter()
+    engine = create_engine(engine_type, cfg)
+    load_ms = (time.perf_counter() - t0) * 1000
+    engine.warmup(cfg.WARMUP_SIZES, rounds=cfg.WARMUP_ROUNDS, decode_steps=cfg.WARMUP_DECODE_STEPS)
+
+    stages, e2e, steps, outputs, buckets = {}, [], [], {}, {}
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        # batch_size > 1 时按语料顺序每 batch_size 张一起调用 recognize_batch，端到端耗时是整批的耗时
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            chunk_timings = [StageTimings() for _ in chunk]
+            t1 = time.perf_counter()
+            if batch_size > 1:
+                texts = engine.recognize_batch([pixels for _, pixels in chunk], chunk_timings)
+            else:
+                texts = [engine.recognize(chunk[0][1], chunk_timings[0])]
+            ms = (time.perf_counter() - t1) * 1000
+
+            for (item, _), text, timings in zip(chunk, texts, chunk_timings):
+                outputs[item["file"]] = text
+                e2e.append(ms)
+                buckets.setdefault(f"{item['size']}/{item['complexity']}", []).append(ms)
+                steps.append(timings.meta.get("decode_steps", 0))
+                for name, stage_ms in timings.stages.items():
+                    stages.setdefault(name, []).append(stage_ms)
+    elapsed = time.perf_counter() - t_start
+
+    result = {
+        "load_ms": round(load_ms, 1),
+        "runs": len(e2e),
+        "end_to_end_ms": summarize(e2e),
+        "throughput_per_s": round(len(e2e) / elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "decode_steps_mean": round(statistics.mean(steps), 2),
+        "stages_ms": {name: summarize(values) for name, values in stages.items()},
+        "buckets_p50_ms": {name: round(percentile(values, 50), 3) for name, values in buckets.items()},
+        "outputs": outputs,
+    }
+    real_stdout.write(json.dumps(result, ensure_ascii=False))
+    real_stdout.flush()
+
+
+# ---------------- 主进程 ----------------
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import onnxruntime
+        info["onnxruntime"] = onnxruntime.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def main():
+    from bench_corpus import load_corpus
+
+    parser = argparse.ArgumentParser(description="TeXFE 引擎压测")
+    parser.add_argument("--engines", nargs="+", default=["rapid"], help="要测的引擎类型 (create_engine 的参数)")
+    parser.add_argument("--corpus", default=str(ROOT / "temp" / "bench_corpus"), help="语料目录")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    parser.add_argument("--per-bucket", type=int, default=8, help="每个 尺寸 x 复杂度 组合的图片数")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图识别几次")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op 线程数，0 为自动")
+    parser.add_argument("--batch-size", type=int, default=1, help="大于 1 时用 recognize_batch 测批量吞吐")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，默认只打印")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.corpus, args.repeat, args.threads, max(1, args.batch_size))
+        return 0
+
+    manifest = load_corpus(args.corpus, args.seed, args.per_bucket)
+    report = {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment_info(),
+        "corpus": {"seed": args.seed, "per_bucket": args.per_bucket, "images": len(manifest["items"]),
+                   "font": manifest["font"]},
+        "settings": {"repeat": args.repeat, "threads": args.threads, "batch_size": args.batch_size},
+        "engines": {},
+    }
+
+    for engine_type in args.engines:
+        print(f"⏳ {engine_type}: {len(manifest['items'])} 张图 x {args.repeat} 次...", file=sys.stderr)
+        cmd = [sys.executable, __file__, "--child", engine_type, "--corpus", args.corpus,
+               "--repeat", str(args.repeat), "--threads", str(args.threads), "--batch-size", str(args.batch_size)]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, cwd=ROOT)
+        if proc.returncode != 0:
+            print(f"❌ {engine_type} 压测失败 (退出码 {proc.returncode})", file=sys.stderr)
+            continue
+        result = json.loads(proc.stdout)
+        report["engines"][engine_type] = result
+
+        e2e = result["end_to_end_ms"]
+        print(f"✅ {engine_type}: p50 {e2e['p50']:.1f}ms  p95 {e2e['p95']:.1f}ms  "
+              f"{result['throughput_per_s']:.2f} 张/秒  峰值内存 {result['peak_rss_mb']:.0f}MB", file=sys.stderr)
+        for name, stage in result["stages_ms"].items():
+            print(f"     {name:<14} p50 {stage['p50']:8.2f}ms  p95 {stage['p95']:8.2f}ms", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"📝 已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0 if len(report["engines"]) == len(args.engines) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
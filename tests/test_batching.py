@@ -0,0 +1,105 @@
+import threading
+import time
+
+from src.core.batching import MicroBatcher, group_by_shape
+
+
+def test_group_by_shape_respects_tolerance_and_batch_size():
+    shapes = [(64, 320), (64, 288), (192, 640), (64, 320), (96, 320), (64, 320)]
+    groups = group_by_shape(shapes, max_batch_size=3, tolerance=32)
+
+    assert sorted(i for g in groups for i in g) == list(range(len(shapes)))
+    assert all(len(g) <= 3 for g in groups)
+    for g in groups:
+        hs = [shapes[i][0] for i in g]
+        ws = [shapes[i][1] for i in g]
+        assert max(hs) - min(hs) <= 32 and max(ws) - min(ws) <= 32
+    # 大图单独一组
+    assert [2] in groups
+
+
+def test_group_by_shape_exact_match_only():
+    groups = group_by_shape([(32, 64), (32, 96), (32, 64)], max_batch_size=8, tolerance=0)
+    assert sorted(map(sorted, groups)) == [[0, 2], [1]]
+
+
+def test_micro_batcher_runs_single_request_without_waiting():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(items) or [x * 2 for x in items], max_wait_ms=500)
+    t0 = time.perf_counter()
+    assert batcher.submit(21).result(timeout=2) == 42
+    assert time.perf_counter() - t0 < 0.4
+    batcher.close()
+    assert batches == [[21]]
+
+
+def test_micro_batcher_groups_queued_requests():
+    started = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def run(items):
+        batches.append(list(items))
+        if len(batches) == 1:
+            started.set()
+            release.wait(2)
+        return [x + 1 for x in items]
+
+    batcher = MicroBatcher(run, max_batch_size=3, max_wait_ms=1)
+    first = batcher.submit(0)
+    started.wait(2)
+    # 第一批在跑的时候又来了 5 个请求：应该被攒成 3 + 2 两批
+    futures = [batcher.submit(i) for i in range(1, 6)]
+    release.set()
+
+    assert first.result(2) == 1
+    assert [f.result(2) for f in futures] == [2, 3, 4, 5, 6]
+    batcher.close()
+    assert batches == [[0], [1, 2, 3], [4, 5]]
+
+
+def test_group_by_shape_height_only():
+    # 宽度容差放到最大：同样高度的行不管多宽都进一批
+    shapes = [(64, 640), (64, 96), (96, 320), (64, 320)]
+    groups = group_by_shape(shapes, max_batch_size=8, tolerance=0, width_tolerance=672)
+    assert sorted(map(sorted, groups)) == [[0, 1, 3], [2]]
+
+
+def test_micro_batcher_keeps_submit_many_together():
+    started = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def run(items):
+        batches.append(list(items))
+        if len(batches) == 1:
+            started.set()
+            release.wait(2)
+        return items
+
+    batcher = MicroBatcher(run, max_batch_size=2, max_wait_ms=500)
+    batcher.submit("a")
+    started.wait(2)
+    futures = batcher.submit_many(["r1", "r2", "r3"])
+    release.set()
+    t0 = time.perf_counter()
+    assert [f.result(2) for f in futures] == ["r1", "r2", "r3"]
+    # 一组请求本身就是完整的一批：不拆开、也不再等凑批
+    assert time.perf_counter() - t0 < 0.4
+    batcher.close()
+    assert batches == [["a"], ["r1", "r2", "r3"]]
+
+
+def test_micro_batcher_propagates_errors():
+    def run(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(run)
+    future = batcher.submit(1)
+    try:
+        future.result(2)
+    except ValueError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("expected ValueError")
+    batcher.close()
@@ -0,0 +1,43 @@
+from bench_compare import changed_outputs, compare
+
+
+def _report(p50, throughput, encode_p50, outputs):
+    return {
+        "engines": {
+            "rapid": {
+                "end_to_end_ms": {"mean": p50, "p50": p50, "p95": p50 * 2},
+                "throughput_per_s": throughput,
+                "stages_ms": {"encode": {"mean": encode_p50, "p50": encode_p50, "p95": encode_p50}},
+                "outputs": outputs,
+            }
+        }
+    }
+
+
+def test_compare_flags_regressions_in_both_directions():
+    base = _report(100.0, 10.0, 40.0, {})
+    cur = _report(130.0, 7.0, 40.5, {})
+    rows = {row["metric"]: row for row in compare(base, cur, threshold=10, min_abs=1.0)}
+
+    assert rows["end_to_end_ms.p50"]["regression"]
+    assert rows["end_to_end_ms.p50"]["change_pct"] == 30.0
+    # 吞吐是越大越好
+    assert rows["throughput_per_s"]["regression"]
+    assert rows["throughput_per_s"]["change_pct"] == 30.0
+    # 变化在阈值以内
+    assert not rows["stages_ms.encode.p50"]["regression"]
+
+
+def test_compare_ignores_small_absolute_changes_and_improvements():
+    base = _report(2.0, 10.0, 1.0, {})
+    cur = _report(2.5, 20.0, 1.5, {})
+    rows = {row["metric"]: row for row in compare(base, cur, threshold=10, min_abs=1.0)}
+
+    assert not rows["end_to_end_ms.p50"]["regression"]  # +25%，但只差 0.5ms
+    assert not rows["throughput_per_s"]["regression"]  # 变快了
+
+
+def test_changed_outputs():
+    base = _report(1, 1, 1, {"a.png": "x^2", "b.png": "y"})
+    cur = _report(1, 1, 1, {"a.png": "x^{2}", "b.png": "y"})
+    assert changed_outputs(base, cur) == {"rapid": ["a.png"]}
@@ -0,0 +1,95 @@
+# test_cache.py
+import numpy as np
+
+from src.core.cache import RecognitionCache
+
+
+def make_formula(seed=0, h=48, w=160):
+    """造一张白底黑字的假公式图"""
+    rng = np.random.default_rng(seed)
+    img = np.full((h, w), 255, dtype=np.uint8)
+    for _ in range(6):
+        y, x = rng.integers(4, h - 20), rng.integers(4, w - 20)
+        img[y:y + 16, x:x + 3] = 0
+    return img
+
+
+def test_memory_and_disk_hit(tmp_path):
+    db = tmp_path / "cache.sqlite3"
+    img = make_formula()
+
+    cache = RecognitionCache(db_path=db)
+    key = cache.make_key(img)
+    assert cache.get(key) is None
+    cache.put(key, r"x^2")
+    assert cache.get(key) == r"x^2"
+    cache.close()
+
+    # 重新打开：内存是空的，应该从磁盘命中
+    cache = RecognitionCache(db_path=db)
+    assert cache.get(cache.make_key(img.copy())) == r"x^2"
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 0
+    cache.close()
+
+
+def test_namespace_separates_engines(tmp_path):
+    img = make_formula()
+    a = RecognitionCache(db_path=tmp_path / "c.sqlite3", namespace="rapid")
+    a.put(a.make_key(img), "a")
+    a.close()
+
+    b = RecognitionCache(db_path=tmp_path / "c.sqlite3", namespace="rapid-int8")
+    assert b.get(b.make_key(img)) is None
+
+
+def test_memory_lru_bound():
+    cache = RecognitionCache(memory_entries=2)
+    keys = [cache.make_key(make_formula(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, str(i))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == "2"
+
+
+def test_prune_by_size(tmp_path):
+    cache = RecognitionCache(db_path=tmp_path / "c.sqlite3", disk_entries=3, memory_entries=1)
+    for i in range(5):
+        cache.put(cache.make_key(make_formula(i)), str(i))
+    cache.prune()
+    assert cache.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 3
+
+
+def test_perceptual_hit(tmp_path):
+    img = make_formula()
+    noisy = img.copy()
+    noisy[0, 0] = 200  # 一个像素的差别，精确哈希不同，感知哈希相同
+
+    cache = RecognitionCache(db_path=tmp_path / "c.sqlite3", memory_entries=1, perceptual=True)
+    cache.put(cache.make_key(img), "x")
+    cache.put(cache.make_key(make_formula(99)), "y")  # 把第一条挤出内存
+    assert cache.get(cache.make_key(noisy)) == "x"
+    assert cache.stats()["perceptual_hits"] == 1
+
+    # 关闭感知哈希时不应该命中
+    strict = RecognitionCache(db_path=tmp_path / "c.sqlite3")
+    assert strict.get(strict.make_key(noisy)) is None
+
+    # 换了 namespace (模型或配置变了) 的近似查询也不应该命中旧结果
+    other = RecognitionCache(db_path=tmp_path / "c.sqlite3", namespace="new-model", perceptual=True)
+    assert other.get(other.make_key(noisy)) is None
+
+
+def test_old_database_gets_namespace_column(tmp_path):
+    import sqlite3
+    db = sqlite3.connect(str(tmp_path / "c.sqlite3"))
+    db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, latex TEXT NOT NULL, width INTEGER NOT NULL, "
+               "height INTEGER NOT NULL, phash TEXT, b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, "
+               "created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)")
+    db.close()
+
+    cache = RecognitionCache(db_path=tmp_path / "c.sqlite3", namespace="rapid", perceptual=True)
+    assert cache.db is not None
+    cache.put(cache.make_key(make_formula()), "x")
+    cache._memory.clear()
+    assert cache.get(cache.make_key(make_formula())) == "x"
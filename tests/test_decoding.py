@@ -0,0 +1,109 @@
+import numpy as np
+
+from src.core.engines.decoding import (LoopGuard, STOP_BUDGET, STOP_EOS, STOP_LOOP, beam_decode, find_loop,
+                                       greedy_decode, token_budget)
+
+PAD, BOS, EOS, V = 0, 1, 2, 16
+
+
+def scripted_step(scripts, calls=None):
+    """假 decoder：第 r 行 (按 context[r, 0] 索引) 第 t 步输出 scripts[r][t]，之后一直输出 EOS"""
+
+    def step(x, mask, context):
+        assert x.shape == mask.shape and x.dtype == np.int64 and mask.dtype == bool
+        if calls is not None:
+            calls.append(len(x))
+        logits = np.zeros((len(x), x.shape[1], V), dtype=np.float32)
+        t = x.shape[1] - 1
+        for r, row in enumerate(context[:, 0].astype(int)):
+            script = scripts[row]
+            logits[r, -1, script[t] if t < len(script) else EOS] = 1.0
+        return logits
+
+    return step
+
+
+def contexts(n):
+    return np.arange(n, dtype=np.float32)[:, None]
+
+
+def test_greedy_batch_stops_each_row_at_eos_and_shrinks_batch():
+    calls = []
+    step = scripted_step({0: [5, 6, 7], 1: [5], 2: [8, 9]}, calls)
+    tokens, reasons = greedy_decode(step, contexts(3), 100, BOS, EOS, PAD)
+
+    assert reasons == [STOP_EOS] * 3
+    assert tokens.tolist() == [[5, 6, 7, EOS], [5, EOS, PAD, PAD], [8, 9, EOS, PAD]]
+    assert calls == [3, 3, 2, 1]
+
+
+def test_greedy_respects_per_row_budget():
+    step = scripted_step({0: [5] * 50, 1: [6, 7]})
+    tokens, reasons = greedy_decode(step, contexts(2), [4, 10], BOS, EOS, PAD, loop_guard=None)
+
+    assert reasons == [STOP_BUDGET, STOP_EOS]
+    assert tokens[0].tolist() == [5, 5, 5, 5]
+    assert tokens[1].tolist() == [6, 7, EOS, PAD]
+
+
+def test_greedy_without_eos_stop_runs_fixed_steps():
+    step = scripted_step({0: [5]})
+    tokens, _ = greedy_decode(step, contexts(1), 6, BOS, EOS, PAD, stop_at_eos=False)
+    assert tokens.shape == (1, 6)
+
+
+def test_greedy_stops_repetition_loops():
+    script = [3, 4] + [7, 8, 9] * 30
+    step = scripted_step({0: script})
+    tokens, reasons = greedy_decode(step, contexts(1), 200, BOS, EOS, PAD, loop_guard=LoopGuard(min_span=12))
+
+    assert reasons == [STOP_LOOP]
+    assert tokens[0].tolist() == [3, 4, 7, 8, 9]
+
+
+def test_find_loop():
+    assert find_loop(np.array([1, 2, 3] + [4] * 30)) == 4
+    assert find_loop(np.array([1, 2, 3, 4, 5, 6])) is None
+    # 短的重复 (比如矩阵里的 0 & 0 & 0) 不算循环
+    assert find_loop(np.array([9, 5, 6, 5, 6, 5, 6, 3])) is None
+
+
+def test_token_budget_grows_with_image_and_is_capped():
+    small = token_budget(32, 64)
+    large = token_budget(192, 672)
+    assert 48 <= small < large <= 512
+    assert token_budget(10000, 10000) == 512
+    # 不满一格按一格算：33~63 像素高的单行公式不会只拿到一行格子的额度
+    assert token_budget(40, 672) == token_budget(64, 672) > token_budget(32, 672) >= 77
+
+
+def test_beam_prefers_higher_total_probability():
+    # 第一步 5 稍微更可能，但走 5 之后很不确定；走 6 之后几乎确定 -> beam 应该选 6 那条
+    def step(x, mask, context):
+        logits = np.full((len(x), x.shape[1], V), -10.0, dtype=np.float32)
+        for r, seq in enumerate(x):
+            last = seq[-1]
+            if last == BOS:
+                logits[r, -1, 5], logits[r, -1, 6] = 1.0, 0.9
+            elif last == 5:
+                logits[r, -1, 9:16] = 0.0
+            elif last in (6, 10):
+                logits[r, -1, 10 if last == 6 else EOS] = 10.0
+            else:
+                logits[r, -1, EOS] = 10.0
+        return logits
+
+    greedy, _ = greedy_decode(step, contexts(1), 10, BOS, EOS, PAD)
+    beam, reasons = beam_decode(step, contexts(1), 10, 3, BOS, EOS, PAD)
+    assert greedy[0, 0] == 5
+    assert beam[0].tolist()[:2] == [6, 10]
+    assert reasons == [STOP_EOS]
+
+
+def test_greedy_streams_each_step_for_single_image():
+    seen = []
+    step = scripted_step({0: [5, 6, 7]})
+    tokens, _ = greedy_decode(step, contexts(1), 100, BOS, EOS, PAD, on_step=lambda t: seen.append(t.tolist()))
+
+    assert seen == [[5], [5, 6], [5, 6, 7], [5, 6, 7, EOS]]
+    assert tokens[0].tolist() == seen[-1]
@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.core.detection import Region, RegionDetector, crop, ink_mask
+
+
+def page(h=400, w=600, background=250):
+    return np.full((h, w), background, dtype=np.uint8)
+
+
+def ink(img, x, y, w, h, value=0):
+    """画一块 "笔迹" (竖条纹，填充率不到一半，像文字而不是色块)"""
+    img[y:y + h, x:x + w:2] = value
+
+
+def test_separate_lines_and_columns():
+    img = page()
+    ink(img, 40, 40, 120, 30)  # 第一行左边
+    ink(img, 400, 40, 100, 30)  # 第一行右边，隔得很远
+    ink(img, 40, 200, 200, 30)  # 第二行
+
+    regions = RegionDetector(margin=0)(img)
+    assert regions == [Region(40, 40, 119, 30), Region(400, 40, 99, 30), Region(40, 200, 199, 30)]
+
+
+def test_fraction_parts_are_one_region():
+    img = page()
+    ink(img, 100, 100, 60, 24)  # 分子
+    img[134:136, 90:170] = 0  # 分数线 (很细)
+    ink(img, 100, 146, 60, 24)  # 分母
+    ink(img, 100, 300, 60, 24)  # 下面隔得远的另一行
+
+    regions = RegionDetector(margin=0)(img)
+    assert len(regions) == 2
+    assert regions[0] == Region(90, 100, 80, 70)
+
+
+def test_noise_and_solid_blocks_are_dropped():
+    img = page()
+    img[10:13, 580:583] = 0  # 噪点
+    ink(img, 40, 100, 100, 30)
+    img[250:390, 300:500] = 20  # 实心色块 (照片、图标)
+
+    assert RegionDetector(margin=0)(img) == [Region(40, 100, 99, 30)]
+
+
+def test_dark_background_and_margin():
+    img = page(background=30)
+    ink(img, 50, 50, 80, 20, value=230)
+
+    mask = ink_mask(img)
+    assert mask[50, 50] and not mask[0, 0]
+    region = RegionDetector(margin=6)(img)[0]
+    assert region == Region(44, 44, 91, 32)
+    assert crop(img, region).shape == (32, 91)
+
+
+def test_blank_page_has_no_regions():
+    assert RegionDetector()(page()) == []
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.core.history import HistoryStore, make_thumbnail
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", max_thumbnails=3)
+    yield store
+    store.close()
+
+
+def fill(store, latexes, image=None):
+    for i, latex in enumerate(latexes):
+        store.add(latex, "screen", image, created=1000.0 + i)
+    store.flush()
+
+
+def test_newest_first_with_keyset_paging(store):
+    fill(store, [f"x_{{{i}}}" for i in range(7)])
+    first = store.page(limit=3)
+    assert [e.latex for e in first] == ["x_{6}", "x_{5}", "x_{4}"]
+    second = store.page(before_id=first[-1].id, limit=3)
+    assert [e.latex for e in second] == ["x_{3}", "x_{2}", "x_{1}"]
+    assert [e.latex for e in store.page(before_id=second[-1].id, limit=3)] == ["x_{0}"]
+    assert store.count() == 7
+
+
+def test_full_text_and_short_queries(store):
+    fill(store, [r"\frac{a}{b}", r"\sqrt{2}", r"a \frac{1}{2} + b", "a_%", "ab"])
+    assert [e.latex for e in store.page(r"\frac")] == [r"a \frac{1}{2} + b", r"\frac{a}{b}"]
+    # 多个词是 AND
+    assert [e.latex for e in store.page(r"\frac {1}")] == [r"a \frac{1}{2} + b"]
+    # 不到 3 个字符走 LIKE，% 和 _ 按字面匹配
+    assert [e.latex for e in store.page("_%")] == ["a_%"]
+    assert [e.latex for e in store.page("ab")] == ["ab"]
+
+
+def test_thumbnails_are_bounded(store):
+    image = np.full((120, 300), 255, dtype=np.uint8)
+    image[40:80, 20:280:2] = 0
+    fill(store, [str(i) for i in range(6)], image)
+    store._prune(store._connect())
+
+    entries = store.page()
+    assert [e.thumbnail is not None for e in entries] == [True] * 3 + [False] * 3
+    width, height, data = entries[0].thumbnail
+    assert (width, height, len(data)) == (100, 40, 100 * 40)
+
+
+def test_old_entries_are_pruned(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", max_entries=5)
+    store.PRUNE_EVERY = 1 << 30  # 只在下面手动清理，结果不受写入线程怎么分批影响
+    fill(store, [f"\\beta_{{{i}}}" for i in range(10)])
+    store._prune(store._connect())
+    assert [e.id for e in store.page()] == [10, 9, 8, 7, 6]
+    assert store.count() == 5
+
+    fill(store, ["\\alpha one", "\\alpha two"])
+    store._prune(store._connect())
+    assert [e.id for e in store.page()] == [12, 11, 10, 9, 8]
+    # 删掉的也从全文索引里删掉了
+    assert [e.id for e in store.page("\\beta")] == [10, 9, 8]
+    assert [e.latex for e in store.page("\\alpha")] == ["\\alpha two", "\\alpha one"]
+    store.close()
+
+
+def test_make_thumbnail_keeps_aspect_and_caps_width():
+    width, height, _ = make_thumbnail(np.zeros((400, 8000), dtype=np.uint8), height=40, max_width=400)
+    assert (width, height) == (400, 40)
@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("PyQt6.QtGui")
+
+from PyQt6.QtCore import QBuffer, QIODevice
+from PyQt6.QtGui import QColor, QImage
+
+import numpy as np
+
+from src.core.image_utils import ImageEdits, qimage_to_gray, read_qimage
+
+
+def quadrants(w=200, h=100):
+    """左上红、右上绿、左下蓝、右下黑"""
+    image = QImage(w, h, QImage.Format.Format_RGB32)
+    colors = [[QColor("red"), QColor("green")], [QColor("blue"), QColor("black")]]
+    for y in range(h):
+        for x in range(w):
+            image.setPixelColor(x, y, colors[y >= h // 2][x >= w // 2])
+    return image
+
+
+def encode(image, fmt="PNG"):
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, fmt)
+    return bytes(buffer.data())
+
+
+def test_read_qimage_scales_while_decoding():
+    data = encode(quadrants(400, 200))
+    assert read_qimage(data).size().width() == 400
+    preview = read_qimage(data, max_side=100)
+    assert (preview.width(), preview.height()) == (100, 50)
+    assert read_qimage(b"not an image") is None
+
+
+def test_read_qimage_accepts_gray_pixels():
+    # 整屏识别裁出的区域 (不连续的数组视图) 直接给编辑器，不用先编码
+    pixels = (np.arange(60 * 100) % 251).astype(np.uint8).reshape(60, 100)[:, 10:90]
+    assert np.array_equal(qimage_to_gray(read_qimage(pixels)), pixels)
+    preview = read_qimage(pixels, max_side=40)
+    assert (preview.width(), preview.height()) == (40, 30)
+
+
+def test_rotate_then_crop_matches_destructive_edits():
+    image = quadrants()
+    edits = ImageEdits()
+    edits.rotate()  # 逆时针 90°：右上的绿色转到左上
+    edits.crop((0.0, 0.0, 0.5, 0.5))  # 转完以后的左上角
+
+    (x, y, w, h), turns = edits.net_effect()
+    assert turns == 1
+    assert (x, y, w, h) == (0.5, 0.0, 0.5, 0.5)
+
+    result = edits.apply(image)
+    assert (result.width(), result.height()) == (50, 100)
+    assert result.pixelColor(10, 10) == QColor("green")
+
+
+def test_crop_applies_to_any_resolution():
+    edits = ImageEdits()
+    edits.crop((0.5, 0.5, 0.5, 0.5))
+    for scale in (1, 3):
+        result = edits.apply(quadrants(200 * scale, 100 * scale))
+        assert (result.width(), result.height()) == (100 * scale, 50 * scale)
+        assert result.pixelColor(0, 0) == QColor("black")
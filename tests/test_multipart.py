@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from src.sources.multipart import MultipartError, UploadTooLarge, parse_header, parse_multipart
+
+BOUNDARY = "----TeXFEboundary7MA4YWxk"
+CTYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def body(fields, files):
+    out = []
+    for name, value in fields.items():
+        out.append(f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode() + value)
+    for name, (filename, data) in files.items():
+        out.append(f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                   f"Content-Type: image/webp\r\n\r\n".encode() + data)
+    return b"\r\n".join(out) + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_parses_fields_and_files_across_chunk_boundaries(chunk_size):
+    # 文件内容里故意放上像分隔符的字节
+    data = bytes(range(256)) * 40 + b"\r\n--" + BOUNDARY[:-1].encode() + b"\r\n"
+    raw = body({"original_size": b"123456", "format": b"image/webp"}, {"file": ("a.webp", data)})
+    stream = io.BytesIO(raw + b"next request")
+
+    with parse_multipart(stream, CTYPE, len(raw), max_size=1 << 20, spool_size=1024,
+                         chunk_size=chunk_size) as form:
+        assert form.value("original_size") == "123456"
+        assert form.value("format") == "image/webp"
+        part = form.get("file")
+        assert part.filename == "a.webp" and part.content_type == "image/webp"
+        assert part.read() == data
+        assert form.get("missing") is None
+    # 只读 Content-Length 个字节，keep-alive 连接上的下一个请求不受影响
+    assert stream.read() == b"next request"
+
+
+def test_rejects_oversized_body_without_reading_it():
+    raw = body({}, {"file": ("a.jpg", b"x" * 1000)})
+    stream = io.BytesIO(raw)
+    with pytest.raises(UploadTooLarge):
+        parse_multipart(stream, CTYPE, len(raw), max_size=500)
+    assert stream.tell() == 0
+
+
+@pytest.mark.parametrize("raw, ctype", [
+    (b"no boundary here at all", CTYPE),
+    (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"a\"\r\n\r\nvalue".encode(), CTYPE),
+    (b"", "application/json"),
+])
+def test_malformed_bodies_raise(raw, ctype):
+    with pytest.raises(MultipartError):
+        parse_multipart(io.BytesIO(raw), ctype, len(raw), max_size=1 << 20)
+
+
+def test_parse_header():
+    assert parse_header(CTYPE) == ("multipart/form-data", {"boundary": BOUNDARY})
+    assert parse_header('form-data; name="file"; filename="公式.png"')[1]["filename"] == "公式.png"
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+from onnx import TensorProto, helper, numpy_helper
+
+from src.core.engines import ort_session
+from src.core.engines.ort_session import OptimizedModelCache, OrtSession
+
+OPTIONS = {"graph_optimization_level": "all", "intra_op_num_threads": 1}
+
+
+def save_model(path, bias=1.0):
+    """y = relu(x + bias)：够小，又有能被优化掉的节点"""
+    x = helper.make_tensor_value_info("x", TensorProto.FLOAT, [None, 4])
+    y = helper.make_tensor_value_info("y", TensorProto.FLOAT, [None, 4])
+    nodes = [helper.make_node("Add", ["x", "b"], ["s"]), helper.make_node("Relu", ["s"], ["y"])]
+    init = [numpy_helper.from_array(np.full(4, bias, dtype=np.float32), "b")]
+    model = helper.make_model(helper.make_graph(nodes, "tiny", [x], [y], init),
+                              opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return path
+
+
+def run(session):
+    return session([np.array([[-2, -1, 0, 1]], dtype=np.float32)])[0]
+
+
+def test_second_load_uses_cache_and_leaves_no_temp_files(tmp_path):
+    model = save_model(tmp_path / "tiny.onnx")
+    cache = OptimizedModelCache(tmp_path / "cache")
+
+    first = OrtSession(model, OPTIONS, cache)
+    assert not first.loaded_from_cache
+    cached = cache.cached_path(model, OPTIONS)
+    assert cached.exists()
+    assert not list(cache.cache_dir.glob("*.tmp"))
+
+    second = OrtSession(model, OPTIONS, cache)
+    assert second.loaded_from_cache
+    np.testing.assert_array_equal(run(second), [[0, 0, 1, 2]])
+
+
+def test_corrupt_cache_falls_back_and_is_rebuilt(tmp_path):
+    model = save_model(tmp_path / "tiny.onnx")
+    cache = OptimizedModelCache(tmp_path / "cache")
+    OrtSession(model, OPTIONS, cache)
+    cached = cache.cached_path(model, OPTIONS)
+    cached.write_bytes(b"not a model")
+
+    session = OrtSession(model, OPTIONS, cache)
+    assert not session.loaded_from_cache
+    np.testing.assert_array_equal(run(session), [[0, 0, 1, 2]])
+    # 重建的缓存可以正常加载
+    assert OrtSession(model, OPTIONS, cache).loaded_from_cache
+
+
+def test_changed_model_invalidates_and_prunes_old_cache(tmp_path):
+    model = save_model(tmp_path / "tiny.onnx")
+    cache = OptimizedModelCache(tmp_path / "cache")
+    OrtSession(model, OPTIONS, cache)
+    old = cache.cached_path(model, OPTIONS)
+
+    mtime = model.stat().st_mtime_ns
+    save_model(model, bias=2.0)
+    # 大小没变；哈希索引按 (大小, 修改时间) 判断，保证修改时间确实变了 (有的文件系统时间精度很粗)
+    os.utime(model, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    session = OrtSession(model, OPTIONS, cache)
+    assert not session.loaded_from_cache
+    np.testing.assert_array_equal(run(session), [[0, 1, 2, 3]])
+    assert not old.exists()
+    assert list(cache.cache_dir.glob("tiny-*.ort")) == [cache.cached_path(model, OPTIONS)]
+
+
+def test_key_depends_on_cpu_and_optimization_level(tmp_path, monkeypatch):
+    model = save_model(tmp_path / "tiny.onnx")
+    cache = OptimizedModelCache(tmp_path / "cache")
+    path = cache.cached_path(model, OPTIONS)
+    assert cache.cached_path(model, {**OPTIONS, "graph_optimization_level": "extended"}) != path
+
+    monkeypatch.setattr(ort_session, "cpu_fingerprint", lambda: "x86_64_other")
+    assert cache.cached_path(model, OPTIONS) != path
+
+
+def test_unusable_cache_dir_still_loads_model(tmp_path):
+    model = save_model(tmp_path / "tiny.onnx")
+    blocker = tmp_path / "cache"
+    blocker.write_text("a file where the cache directory should be")
+
+    session = OrtSession(model, OPTIONS, OptimizedModelCache(blocker))
+    assert not session.loaded_from_cache
+    np.testing.assert_array_equal(run(session), [[0, 0, 1, 2]])
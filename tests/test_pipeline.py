@@ -0,0 +1,157 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from src.core import pipeline
+from src.core.pipeline import BurstPipeline
+
+
+class Recorder:
+    """收集 on_update 回调，可以等某张照片到达某个状态"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.events = []
+
+    def __call__(self, item):
+        with self.cond:
+            self.events.append((item.id, item.status))
+            self.cond.notify_all()
+
+    def wait(self, item_id, status, timeout=2):
+        with self.cond:
+            return self.cond.wait_for(lambda: (item_id, status) in self.events, timeout)
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def decode(data):
+    if data == b"bad":
+        raise ValueError("not an image")
+    return np.full((4, 4), int(data), dtype=np.uint8)
+
+
+def test_photos_overlap_and_finish_out_of_order():
+    futures = {}
+    second_decoded = threading.Event()
+
+    def infer(pixels, timings):
+        future = Future()
+        futures[int(pixels[0, 0])] = future
+        return future
+
+    def slow_decode(data):
+        if data == b"2":
+            second_decoded.set()
+        return decode(data)
+
+    updates = Recorder()
+    pipe = BurstPipeline(slow_decode, None, infer, updates, decode_workers=2)
+    first, second = pipe.add(b"1"), pipe.add(b"2")
+    # 第 1 张还在推理时第 2 张已经解码完，也送进了推理
+    assert second_decoded.wait(2)
+    assert wait_until(lambda: len(futures) == 2)
+
+    futures[2].set_result("b")
+    assert updates.wait(second.id, pipeline.DONE)
+    assert first.status == pipeline.RECOGNIZING
+    futures[1].set_result("a")
+    assert updates.wait(first.id, pipeline.DONE)
+    assert (first.latex, second.latex) == ("a", "b")
+    assert "image_decode" in first.timings.stages
+    pipe.close()
+
+
+def test_prepare_runs_between_decode_and_infer():
+    seen = []
+
+    def prepare(pixels, meta):
+        meta["prepared"] = True
+        return pixels + 1
+
+    def infer(pixels, timings):
+        seen.append(int(pixels[0, 0]))
+        future = Future()
+        future.set_result("x")
+        return future
+
+    updates = Recorder()
+    pipe = BurstPipeline(decode, prepare, infer, updates)
+    item = pipe.add(b"7")
+    assert updates.wait(item.id, pipeline.DONE)
+    assert seen == [8] and item.timings.meta["prepared"]
+    pipe.close()
+
+
+def test_failures_are_reported_per_photo():
+    def infer(pixels, timings):
+        future = Future()
+        future.set_result("识别核心错误: boom" if pixels[0, 0] == 3 else "")
+        return future
+
+    updates = Recorder()
+    pipe = BurstPipeline(decode, None, infer, updates)
+    bad, error, empty = pipe.add(b"bad"), pipe.add(b"3"), pipe.add(b"4")
+    for item in (bad, error, empty):
+        assert updates.wait(item.id, pipeline.FAILED)
+    assert bad.error.startswith("无法解码图片")
+    assert error.error.startswith("识别核心错误")
+    assert empty.error == "未能识别出公式"
+    pipe.close()
+
+
+def test_resubmit_drops_the_stale_result():
+    futures = []
+
+    def infer(pixels, timings):
+        future = Future()
+        futures.append(future)
+        return future
+
+    updates = Recorder()
+    pipe = BurstPipeline(decode, None, infer, updates)
+    item = pipe.add(b"1")
+    assert wait_until(lambda: len(futures) == 1)
+
+    pipe.resubmit(item.id, np.zeros((2, 2), dtype=np.uint8))
+    assert wait_until(lambda: len(futures) == 2)
+    futures[0].set_result("old")
+    futures[1].set_result("new")
+    assert updates.wait(item.id, pipeline.DONE)
+    assert item.latex == "new"
+    assert updates.events.count((item.id, pipeline.DONE)) == 1
+    pipe.close()
+
+
+def test_regions_are_inferred_as_one_group():
+    calls = []
+
+    def infer_many(pixels_list, timings_list):
+        calls.append([int(p[0, 0]) for p in pixels_list])
+        futures = [Future() for _ in pixels_list]
+        for future, value in zip(futures, calls[-1]):
+            future.set_result(f"x_{value}")
+        return futures
+
+    def infer(pixels, timings):
+        raise AssertionError("regions should go through infer_many")
+
+    updates = Recorder()
+    pipe = BurstPipeline(decode, lambda pixels, meta: pixels + 1, infer, updates, infer_many=infer_many)
+    regions = [(np.full((4, 4), i, dtype=np.uint8), (0, i * 10, 4, 4)) for i in range(3)]
+    items = pipe.add_many(regions)
+    for item in items:
+        assert updates.wait(item.id, pipeline.DONE)
+    assert calls == [[1, 2, 3]]
+    assert [item.latex for item in items] == ["x_1", "x_2", "x_3"]
+    assert (items[0].id, pipeline.DECODING) not in updates.events
+    pipe.close()
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.core.preprocess import Preprocessor
+from src.core.synthetic import synthetic_formula
+
+
+def framed(formula, top=100, left=300, height=600, width=1400, background=255):
+    img = np.full((height, width), background, dtype=np.uint8)
+    img[top:top + formula.shape[0], left:left + formula.shape[1]] = formula
+    return img
+
+
+def test_trim_removes_blank_margins():
+    formula = synthetic_formula(64, 320, seed=0)
+    meta = {}
+    out = Preprocessor(steps=("trim",), trim_margin=4)(framed(formula), meta=meta)
+
+    ys, xs = np.nonzero(formula < 128)
+    assert out.shape == (ys.max() - ys.min() + 1 + 8, xs.max() - xs.min() + 1 + 8)
+    assert meta["preprocess"]["in"] == [600, 1400]
+    assert out.flags.c_contiguous
+
+
+def test_dark_background_and_color_are_normalized():
+    formula = synthetic_formula(64, 320, seed=1)
+    # 暗色主题：深灰背景上的浅色公式，RGB
+    dark = (255 - formula) * 0.6 + 40
+    rgb = np.repeat(dark.astype(np.uint8)[..., None], 3, axis=2)
+    meta = {}
+    out = Preprocessor()(rgb, meta=meta)
+
+    assert out.ndim == 2 and out.dtype == np.uint8
+    assert meta["preprocess"]["inverted"]
+    assert np.median(out) == 255 and out.min() == 0
+
+
+def test_downscale_photos_but_not_below_model_size():
+    photo = framed(synthetic_formula(600, 2400, seed=2), top=200, left=200, height=1200, width=3000)
+    meta = {}
+    out = Preprocessor()(photo, meta=meta)
+    assert meta["preprocess"]["downscale"] >= 2
+    assert out.shape[1] >= 672 or out.shape[0] >= 192
+
+
+@pytest.mark.parametrize("dpr, expected", [(1.0, None), (2.0, 2)])
+def test_downscale_uses_device_pixel_ratio(dpr, expected):
+    meta = {}
+    Preprocessor(steps=("downscale",))(synthetic_formula(96, 400, seed=3), dpr=dpr, meta=meta)
+    assert meta["preprocess"].get("downscale") == expected
+
+
+def test_binarize_composes_with_normalize():
+    formula = synthetic_formula(64, 320, seed=4)
+    soft = (formula * 0.5 + 100).astype(np.uint8)
+    out = Preprocessor(steps=("normalize", "binarize"))(soft)
+    assert set(np.unique(out)) == {0, 255}
+    assert np.array_equal(out == 0, formula < 128)
+
+
+def test_blank_image_is_left_alone():
+    blank = np.full((50, 80), 250, dtype=np.uint8)
+    meta = {}
+    out = Preprocessor()(blank, meta=meta)
+    assert meta["preprocess"]["blank"]
+    assert np.array_equal(out, blank)
+
+
+def test_unknown_step_is_rejected():
+    with pytest.raises(ValueError):
+        Preprocessor(steps=("grayscale", "sharpen"))
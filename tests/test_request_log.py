@@ -0,0 +1,44 @@
+import json
+import time
+
+from src.core.request_log import RequestLog
+from src.core.timing import RequestTrace
+
+
+def test_trace_record_contains_stages_and_queue_wait():
+    trace = RequestTrace("screen")
+    trace.add("capture", 2.0)
+    trace.add("capture", 1.0)
+    trace.mark_submitted(7)
+    time.sleep(0.005)
+    trace.mark_claimed()
+    with trace.stage("encode"):
+        pass
+    trace.meta["dpr"] = 2.0
+    trace.finish("ok")
+
+    record = trace.as_record()
+    assert record["request_id"] == 7
+    assert record["source"] == "screen"
+    assert record["status"] == "ok"
+    assert record["dpr"] == 2.0
+    assert list(record["stages_ms"]) == ["capture", "queue_wait", "encode"]
+    assert record["stages_ms"]["capture"] == 3.0
+    assert record["stages_ms"]["queue_wait"] >= 5.0
+    assert record["total_ms"] >= record["stages_ms"]["queue_wait"]
+    json.dumps(record)
+
+
+def test_request_log_writes_json_lines_and_rotates(tmp_path):
+    log = RequestLog(tmp_path, max_bytes=400, backup_count=2, context={"engine": "rapid"})
+    for i in range(20):
+        log.write({"request_id": i, "stages_ms": {"encode": 1.5}})
+    log.close()
+
+    lines = (tmp_path / "requests.jsonl").read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert records and records[-1]["request_id"] == 19
+    assert all(r["engine"] == "rapid" and "machine" in r for r in records)
+    # 超过 max_bytes 滚动，最多保留 backup_count 份旧文件
+    assert (tmp_path / "requests.jsonl.1").exists()
+    assert not (tmp_path / "requests.jsonl.3").exists()
@@ -0,0 +1,46 @@
+import numpy as np
+
+from src.core.engines.scale_estimate import MODE_AUDIT, MODE_ESTIMATE, MODE_MODEL, ScaleEstimator, stroke_width
+from src.core.synthetic import synthetic_formula
+
+
+def test_stroke_width_tracks_font_size():
+    # synthetic_formula 的笔画粗细是 height // 32
+    small = stroke_width(synthetic_formula(96, 480, seed=1))
+    large = stroke_width(synthetic_formula(192, 960, seed=1))
+    assert abs(small - 3) < 0.5
+    assert abs(large - 6) < 0.75
+
+
+def test_stroke_width_gives_up_on_blank_and_noise():
+    assert stroke_width(np.full((64, 256), 255, dtype=np.uint8)) is None
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 256, size=(64, 256)).astype(np.uint8)
+    assert stroke_width(noise) is None
+
+
+def test_estimator_needs_consistent_calibration():
+    img = synthetic_formula(96, 480, seed=2)
+    estimator = ScaleEstimator(min_samples=3, audit_every=0)
+    assert estimator.decide(img)[0] == MODE_MODEL
+
+    # 缩放后的笔画粗细一直是 2 像素
+    for stroke in (2.0, 4.0, 8.0):
+        estimator.observe(stroke, 2.0 / stroke, resizer_ms=10.0)
+    mode, scale, stroke = estimator.decide(img)
+    assert mode == MODE_ESTIMATE
+    assert abs(scale * stroke - 2.0) < 1e-6
+    assert estimator.expected_resizer_ms == 10.0
+
+    inconsistent = ScaleEstimator(min_samples=3, audit_every=0)
+    for stroke, scale in ((2.0, 1.0), (2.0, 2.0), (2.0, 0.5)):
+        inconsistent.observe(stroke, scale, resizer_ms=10.0)
+    assert inconsistent.decide(img)[0] == MODE_MODEL
+
+
+def test_estimator_audits_periodically():
+    img = synthetic_formula(96, 480, seed=3)
+    estimator = ScaleEstimator(min_samples=1, audit_every=3)
+    estimator.observe(3.0, 1.0, resizer_ms=5.0)
+    modes = [estimator.decide(img)[0] for _ in range(6)]
+    assert modes == [MODE_ESTIMATE, MODE_ESTIMATE, MODE_AUDIT] * 2
@@ -0,0 +1,29 @@
+# test_scheduler.py
+from src.core.worker import RequestScheduler
+
+
+def test_latest_request_wins():
+    sched = RequestScheduler()
+    ids = [sched.submit(f"img{i}".encode()) for i in range(3)]
+
+    # 前两个还没开始就被顶掉了
+    assert sched.claim(ids[0]) is None
+    assert sched.claim(ids[1]) is None
+    assert sched.claim(ids[2]) == b"img2"
+    assert sched.dropped == 2
+
+    # 同一个请求不能被处理两次
+    assert sched.claim(ids[2]) is None
+
+
+def test_running_request_becomes_stale():
+    sched = RequestScheduler()
+    first = sched.submit(b"a")
+    assert sched.claim(first) == b"a"
+    assert sched.is_latest(first)
+
+    # 推理过程中来了新请求：旧结果应被判定为过期
+    second = sched.submit(b"b")
+    assert not sched.is_latest(first)
+    assert sched.is_latest(second)
+    assert sched.dropped == 0
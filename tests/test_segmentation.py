@@ -0,0 +1,43 @@
+import numpy as np
+
+from src.core.detection import Region
+from src.core.segmentation import RowSegmenter, join_rows
+
+
+def snip(rows, width=400, background=255):
+    """rows: [(top, left, height, width)]，每块画成竖条纹的 "笔迹" """
+    img = np.full((max(t + h for t, _, h, _ in rows) + 20, width), background, dtype=np.uint8)
+    for top, left, h, w in rows:
+        img[top:top + h, left:left + w:2] = 0
+    return img
+
+
+def test_splits_rows_and_trims_each_to_its_ink():
+    img = snip([(10, 20, 30, 300), (60, 80, 30, 200), (110, 80, 30, 150)])
+    rows = RowSegmenter(margin=0)(img)
+    assert rows == [Region(20, 10, 299, 30), Region(80, 60, 199, 30), Region(80, 110, 149, 30)]
+
+
+def test_single_line_and_fraction_are_not_split():
+    segmenter = RowSegmenter()
+    assert segmenter(snip([(10, 20, 30, 300)])) == []
+    # 分子、分数线、分母
+    fraction = snip([(10, 40, 24, 60), (38, 30, 2, 80), (44, 40, 24, 60)])
+    assert segmenter(fraction) == []
+
+
+def test_tight_line_spacing_is_left_alone():
+    # 行间空白只有行高的 1/10：不切 (宁可整张识别也不要切坏)
+    assert RowSegmenter()(snip([(10, 20, 30, 300), (43, 20, 30, 300)])) == []
+
+
+def test_join_rows_aligns_on_first_top_level_relation():
+    assert join_rows(["f(x) = x^{2}", "= x \\cdot x", "\\leq 2 x"]) == (
+        r"\begin{aligned} f(x) & = x^{2} \\ & = x \cdot x \\ & \leq 2 x \end{aligned}")
+    # 花括号里的 = 和 \left 都不是对齐点
+    assert join_rows(["\\sum_{i=1} a_i \\le b", "\\left( c \\right) > d"]) == (
+        r"\begin{aligned} \sum_{i=1} a_i & \le b \\ \left( c \right) & > d \end{aligned}")
+
+
+def test_join_rows_without_relations_is_gathered():
+    assert join_rows(["a + b", "c = d"]) == r"\begin{gathered} a + b \\ c = d \end{gathered}"
@@ -0,0 +1,137 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from PIL import UnidentifiedImageError
+
+from src.core.base_engine import EngineNotReady
+from src.core.service import InvalidImage, RecognitionService, ServiceBusy, ServiceTimeout, ServiceUnavailable
+
+
+class FakeEngine:
+    """submit 返回的 Future 由测试手动完成"""
+
+    def __init__(self):
+        self.futures = []
+        self.submitted = threading.Event()
+
+    def submit(self, data, timings):
+        timings.add("decode", 1.0)
+        future = Future()
+        self.futures.append((data, future))
+        self.submitted.set()
+        return future
+
+
+def run_in_thread(fn):
+    box = {}
+
+    def target():
+        try:
+            box["result"] = fn()
+        except Exception as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, box
+
+
+def test_returns_latex_and_timings():
+    engine = FakeEngine()
+    service = RecognitionService(engine.submit)
+    thread, box = run_in_thread(lambda: service.recognize(b"img"))
+    assert engine.submitted.wait(1)
+    engine.futures[0][1].set_result("x^2")
+    thread.join(1)
+
+    assert box["result"]["latex"] == "x^2"
+    assert {"queue_wait", "decode", "total_ms"} <= set(box["result"]["timings"])
+    assert service.stats()["completed"] == 1
+
+
+def test_error_text_is_reported_not_returned_as_latex():
+    service = RecognitionService(lambda data, t: _done("识别核心错误: boom"))
+    result = service.recognize(b"img")
+    assert "latex" not in result and result["error"].startswith("识别核心错误")
+
+
+def test_rejects_when_running_and_queue_are_full():
+    engine = FakeEngine()
+    service = RecognitionService(engine.submit, max_concurrency=1, max_queue=1)
+    running, _ = run_in_thread(lambda: service.recognize(b"a", deadline_ms=2000))
+    assert engine.submitted.wait(1)
+    queued, queued_box = run_in_thread(lambda: service.recognize(b"b", deadline_ms=2000))
+
+    with pytest.raises(ServiceBusy):
+        for _ in range(100):  # 排队的请求可能还没占上名额，那时只会排队超时
+            try:
+                service.recognize(b"c", deadline_ms=1)
+            except ServiceTimeout:
+                pass
+    assert service.stats()["rejected"] == 1
+
+    # 第一张跑完，排队的那张才送进引擎
+    engine.submitted.clear()
+    engine.futures[0][1].set_result("a")
+    assert engine.submitted.wait(1)
+    engine.futures[1][1].set_result("b")
+    running.join(1)
+    queued.join(1)
+    assert queued_box["result"]["latex"] == "b"
+
+
+def test_deadline_while_running_keeps_slot_until_engine_finishes():
+    engine = FakeEngine()
+    service = RecognitionService(engine.submit, max_concurrency=1, max_queue=4)
+    with pytest.raises(ServiceTimeout):
+        service.recognize(b"slow", deadline_ms=20)
+    # 引擎还在跑那张图：新请求只能排队直到超时
+    with pytest.raises(ServiceTimeout):
+        service.recognize(b"next", deadline_ms=20)
+    assert len(engine.futures) == 1
+
+    engine.futures[0][1].set_result("late")
+    thread, box = run_in_thread(lambda: service.recognize(b"next", deadline_ms=1000))
+    assert engine.submitted.wait(1)
+    engine.futures[1][1].set_result("y")
+    thread.join(1)
+    assert box["result"]["latex"] == "y"
+    assert service.stats()["timed_out"] == 2
+
+
+def test_engine_not_ready_is_unavailable():
+    def submit(data, timings):
+        raise EngineNotReady("引擎尚未初始化")
+
+    service = RecognitionService(submit, max_concurrency=1, max_queue=0)
+    for _ in range(2):  # 名额要还回去
+        with pytest.raises(ServiceUnavailable):
+            service.recognize(b"img")
+
+
+def test_undecodable_image_is_invalid_and_counted():
+    def submit(data, timings):
+        raise UnidentifiedImageError("cannot identify image file")
+
+    service = RecognitionService(submit, max_concurrency=1, max_queue=0)
+    for _ in range(2):
+        with pytest.raises(InvalidImage):
+            service.recognize(b"not an image")
+    assert service.stats()["failed"] == 2
+
+    # 其它 RuntimeError 不是 "引擎没准备好"
+    def broken(data, timings):
+        raise RuntimeError("boom")
+
+    service = RecognitionService(broken)
+    with pytest.raises(RuntimeError):
+        service.recognize(b"img")
+    assert service.stats()["failed"] == 1
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
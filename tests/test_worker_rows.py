@@ -0,0 +1,137 @@
+import dataclasses
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("rapid_latex_ocr")
+from onnx import TensorProto, helper, numpy_helper
+
+from src.config import AppConfig
+from src.core.timing import RequestTrace
+from src.core.worker import InferenceWorker
+
+TOKENIZER = Path(__file__).resolve().parent.parent / "assets" / "models" / "tokenizer.json"
+VOCAB, CTX_LEN, CTX_DIM = 1175, 4, 8
+
+
+def save(graph, path):
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+
+def make_models(models_dir):
+    """
+    和真模型输入输出一样的小模型：image_resizer 保持当前宽度，encoder 是全局平均，
+    decoder 固定输出 BOS → 50 → ... → 60 → EOS；encoder / decoder 的 batch 维是动态的
+    """
+    img = helper.make_tensor_value_info("img", TensorProto.FLOAT, [1, 1, None, None])
+    logits = helper.make_tensor_value_info("logits", TensorProto.FLOAT, [1, 22])
+    nodes = [helper.make_node("Shape", ["img"], ["shape"]),
+             helper.make_node("Gather", ["shape", "i3"], ["w"], axis=0),
+             helper.make_node("Cast", ["w"], ["wf"], to=TensorProto.FLOAT),
+             helper.make_node("Div", ["wf", "c32"], ["k"]),
+             helper.make_node("Sub", ["k", "one"], ["idx"]),
+             helper.make_node("Sub", ["arange", "idx"], ["d"]),
+             helper.make_node("Abs", ["d"], ["ad"]),
+             helper.make_node("Neg", ["ad"], ["neg"]),
+             helper.make_node("Unsqueeze", ["neg", "ax0"], ["logits"])]
+    inits = [numpy_helper.from_array(np.array(3, dtype=np.int64), "i3"),
+             numpy_helper.from_array(np.array(32, dtype=np.float32), "c32"),
+             numpy_helper.from_array(np.array(1, dtype=np.float32), "one"),
+             numpy_helper.from_array(np.arange(22, dtype=np.float32), "arange"),
+             numpy_helper.from_array(np.array([0], dtype=np.int64), "ax0")]
+    save(helper.make_graph(nodes, "resizer", [img], [logits], inits), models_dir / "image_resizer.onnx")
+
+    img = helper.make_tensor_value_info("img", TensorProto.FLOAT, [None, 1, None, None])
+    ctx = helper.make_tensor_value_info("ctx", TensorProto.FLOAT, [None, CTX_LEN, CTX_DIM])
+    nodes = [helper.make_node("GlobalAveragePool", ["img"], ["pooled"]),
+             helper.make_node("Reshape", ["pooled", "shape"], ["r"]),
+             helper.make_node("Mul", ["r", "ones"], ["ctx"])]
+    inits = [numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape"),
+             numpy_helper.from_array(np.ones((1, CTX_LEN, CTX_DIM), dtype=np.float32), "ones")]
+    save(helper.make_graph(nodes, "encoder", [img], [ctx], inits), models_dir / "encoder.onnx")
+
+    weights = np.full((VOCAB, VOCAB), -5.0, dtype=np.float32)
+    weights[1, 50] = 5
+    for i in range(50, 60):
+        weights[i, i + 1] = 5
+    weights[60:, 2] = 5
+    weights[2:50, 2] = 5
+    x = helper.make_tensor_value_info("x", TensorProto.INT64, [None, None])
+    mask = helper.make_tensor_value_info("mask", TensorProto.BOOL, [None, None])
+    context = helper.make_tensor_value_info("context", TensorProto.FLOAT, [None, CTX_LEN, CTX_DIM])
+    out = helper.make_tensor_value_info("out", TensorProto.FLOAT, [None, None, VOCAB])
+    nodes = [helper.make_node("Gather", ["W", "x"], ["g"], axis=0),
+             helper.make_node("ReduceMean", ["context"], ["cm"], keepdims=0),
+             helper.make_node("Mul", ["cm", "zero"], ["cz"]),
+             helper.make_node("Add", ["g", "cz"], ["out"])]
+    inits = [numpy_helper.from_array(weights, "W"), numpy_helper.from_array(np.array(0, dtype=np.float32), "zero")]
+    save(helper.make_graph(nodes, "decoder", [x, mask, context], [out], inits), models_dir / "decoder.onnx")
+    shutil.copy(TOKENIZER, models_dir / "tokenizer.json")
+
+
+@pytest.fixture
+def worker(tmp_path):
+    make_models(tmp_path)
+    cfg = dataclasses.replace(AppConfig(), MODELS_DIR=tmp_path, DATA_DIR=tmp_path, ENGINE_TYPE="rapid",
+                              MODEL_CACHE_ENABLED=False, MODEL_CACHE_DIR=tmp_path / "model_cache", CACHE_ENABLED=False, WARMUP_ENABLED=False,
+                              STREAM_PARTIAL_ENABLED=False, SEGMENT_ENABLED=True)
+    worker = InferenceWorker(cfg)
+    worker.init_engine()
+    yield worker
+    worker.close()
+
+
+def three_rows():
+    """三行高度一样、宽度差得很远的 "公式"，行间空白足够大"""
+    img = np.full((200, 640), 255, dtype=np.uint8)
+    for top, width in ((20, 600), (80, 360), (140, 120)):
+        img[top:top + 36, 20:20 + width:2] = 0
+    return img
+
+
+def test_rows_of_different_widths_share_one_encoder_and_decoder_batch(worker):
+    engine = worker.engine
+    encode_batches, decode_batches = [], []
+    encode, decoder_step = engine._encode, engine._decoder_step
+    engine._encode = lambda x: encode_batches.append(x.shape[0]) or encode(x)
+    engine._decoder_step = lambda x, mask, context: decode_batches.append(x.shape[0]) or decoder_step(x, mask, context)
+
+    results = []
+    worker.finished.connect(lambda request_id, latex: results.append(latex))
+    worker.error.connect(lambda request_id, message: results.append(f"error: {message}"))
+    trace = RequestTrace("test")
+    worker.do_inference(worker.submit(three_rows(), trace))
+
+    assert trace.meta["rows"] == 3
+    assert not trace.meta.get("rows_fallback")
+    assert results and results[0].startswith(r"\begin{")
+    # 三行一次过 encoder，解码的每一步也是三行一起
+    assert encode_batches == [3]
+    assert decode_batches and set(decode_batches) == {3}
+
+
+def test_cache_namespace_follows_model_files_and_decode_settings(worker, tmp_path):
+    namespace = worker._cache_namespace()
+    assert namespace.startswith("rapid|")
+
+    worker.cfg = dataclasses.replace(worker.cfg, DECODE_TOKENS_PER_CELL=worker.cfg.DECODE_TOKENS_PER_CELL + 1)
+    assert worker._cache_namespace() != namespace
+    worker.cfg = dataclasses.replace(worker.cfg, DECODE_TOKENS_PER_CELL=worker.cfg.DECODE_TOKENS_PER_CELL - 1)
+    assert worker._cache_namespace() == namespace
+
+    # 换了模型文件 (内容不同) 重新加载：namespace 跟着变
+    decoder = tmp_path / "decoder.onnx"
+    model = onnx.load(str(decoder))
+    model.graph.initializer[-1].CopyFrom(numpy_helper.from_array(np.array(1, dtype=np.float32), "zero"))
+    mtime = decoder.stat().st_mtime_ns
+    onnx.save(model, str(decoder))
+    # 大小没变；哈希索引按 (大小, 修改时间) 判断，保证修改时间确实变了
+    os.utime(decoder, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    worker.engine.load_model(tmp_path)
+    assert worker._cache_namespace() != namespace